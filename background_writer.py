@@ -0,0 +1,173 @@
+# Background writer that keeps workbook saves off the Tk event thread.
+#
+# Callers mark the data dirty with request_save(); the writer thread waits for
+# requests to stop arriving (up to a maximum delay) and then performs a single
+# save for the whole burst. Status changes are reported through a callback
+# invoked on the writer thread.
+
+import logging
+import threading
+import time
+
+from metrics import count
+
+DIRTY = "dirty"
+SAVING = "saving"
+SAVED = "saved"
+ERROR = "error"
+
+
+class BackgroundWriter:
+    """
+    Runs `save()` on a dedicated thread, coalescing save requests that arrive
+    within `coalesce_delay` seconds of each other (but never postponing a save
+    more than `max_delay` seconds after the first request).
+
+    `on_status(status, error)` is called from the writer thread with one of
+    DIRTY, SAVING, SAVED or ERROR; error is the exception for ERROR, else None.
+    """
+
+    def __init__(self, save, coalesce_delay=2.0, max_delay=60.0, on_status=None, name="background-writer"):
+        self.save = save
+        self.coalesce_delay = coalesce_delay
+        self.max_delay = max_delay
+        self.on_status = on_status
+        self.name = name
+        self.status = SAVED
+        self.last_error = None
+        self._cond = threading.Condition()
+        self._requested = 0  # Save requests so far
+        self._saved = 0  # Requests covered by the last successful save
+        self._first_request = None
+        self._last_request = None
+        self._retry_at = 0.0
+        self._flush = False
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def request_save(self):
+        """
+        Mark the data dirty. Cheap; safe to call from any thread.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self._requested == self._saved:
+                self._first_request = now
+            self._requested += 1
+            self._last_request = now
+            became_dirty = self.status != DIRTY
+            self.status = DIRTY
+            self._cond.notify()
+        if became_dirty:
+            self._report(DIRTY)
+
+    def flush(self, timeout=None):
+        """
+        Save now (skipping the coalescing delay) and wait until every request
+        made so far is on disk. Re-raises the save error, if any.
+        """
+        if self._thread is None:
+            self._save_inline()
+            return
+        with self._cond:
+            target = self._requested
+            if self._saved >= target:
+                return
+            self._flush = True
+            self.last_error = None
+            self._retry_at = 0.0
+            self._cond.notify()
+            finished = self._cond.wait_for(lambda: self._saved >= target or self.last_error is not None, timeout)
+            if self.last_error is not None:
+                raise self.last_error
+            if not finished:
+                raise TimeoutError(f"Save did not finish within {timeout} seconds")
+
+    def close(self):
+        """
+        Write any outstanding changes and stop the thread. Re-raises the save
+        error, if any, so the caller can tell the user before exiting.
+        """
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._stop = True
+                self._cond.notify()
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+    # --- Internals ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._requested == self._saved and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                # Coalesce: wait for the burst of requests to settle
+                while not self._flush and not self._stop:
+                    deadline = min(self._last_request + self.coalesce_delay, self._first_request + self.max_delay)
+                    deadline = max(deadline, self._retry_at)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stop:
+                    return
+                target = self._requested
+                self._flush = False
+                self.status = SAVING
+            self._report(SAVING)
+
+            try:
+                self.save()
+            except Exception as e:
+                logging.error(f"Background save failed: {e}")
+                count('writer.save_errors')
+                with self._cond:
+                    self.status = ERROR
+                    self.last_error = e
+                    self._retry_at = time.monotonic() + self.max_delay  # Back off before retrying
+                    self._cond.notify_all()
+                self._report(ERROR, e)
+                continue
+
+            count('writer.saves')
+            with self._cond:
+                self._saved = target
+                self.last_error = None
+                done = self._saved == self._requested
+                if done:
+                    self.status = SAVED
+                else:
+                    self._first_request = time.monotonic()  # Requests made during the save start a new burst
+                self._cond.notify_all()
+            self._report(SAVED if done else DIRTY)
+
+    def _save_inline(self):
+        self._report(SAVING)
+        try:
+            self.save()
+        except Exception as e:
+            self.last_error = e
+            self._report(ERROR, e)
+            raise
+        with self._cond:
+            self._saved = self._requested
+            self.status = SAVED
+        self._report(SAVED)
+
+    def _report(self, status, error=None):
+        if self.on_status is not None:
+            try:
+                self.on_status(status, error)
+            except Exception as e:
+                logging.error(f"Save status callback failed: {e}")
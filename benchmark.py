@@ -0,0 +1,364 @@
+# Benchmark suite for the tracker's hot paths on synthetic workbooks.
+#
+# For every size a synthetic workbook (synthetic_workbook.py) is generated
+# once under benchmarks/workbooks/ and copied to a scratch directory. The
+# benchmarks then run the headless code behind the GUI actions against each
+# storage backend (through inventory_core, as the GUI does), plus the plot
+# engine and the web-app seed extractor, and
+# the timings are written as JSON under benchmarks/results/ so runs can be
+# compared over time.
+#
+# Usage:
+#   python benchmark.py [--sizes 1k,10k,100k] [--backends xlsx,sqlite] [--only update_count,plots]
+#   python benchmark.py --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from inventory_core import THRESHOLD_LOCATIONS, Inventory, is_san_item
+from storage import LOCATION_SHEETS, import_workbook
+from synthetic_workbook import DEFAULT_OUT_DIR, STANDARD_SIZES, ensure_workbook, parse_size
+
+ROOT = Path(__file__).parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+EXTRACTOR_PATH = ROOT / "web-app" / "scripts" / "extract-excel-data.py"
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = ['1k', '10k', '100k']  # 1M is opt-in: the xlsx backend holds the whole workbook in memory
+BACKENDS = ['xlsx', 'sqlite']
+LOG_PAGE_SIZE = 200  # As in the GUI
+
+
+def _load_extractor():
+    spec = importlib.util.spec_from_file_location("extract_excel_data", EXTRACTOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Swallow the progress output of the code under test."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class Timer:
+    """Collects one result dict per timed block."""
+
+    def __init__(self, size, rows):
+        self.size = size
+        self.rows = rows
+        self.results = []
+
+    @contextlib.contextmanager
+    def time(self, benchmark, backend=None, ops=1):
+        start = time.perf_counter()
+        yield
+        self.record(benchmark, backend, time.perf_counter() - start, ops)
+
+    def record(self, benchmark, backend, elapsed, ops=1):
+        result = {
+            'benchmark': benchmark,
+            'size': self.size,
+            'rows': self.rows,
+            'backend': backend,
+            'ops': ops,
+            'seconds': elapsed,
+            'ops_per_sec': ops / elapsed if elapsed > 0 else None,
+        }
+        self.results.append(result)
+        print(f"  {benchmark:<24} {backend or '-':<7} {elapsed * 1000:>11.1f} ms"
+              + (f"  ({result['ops_per_sec']:,.0f} ops/s)" if ops > 1 and elapsed > 0 else ""))
+
+
+# --- Startup ---
+
+# The GUI's startup minus Tk, in a fresh interpreter: core imports, the first
+# location's items (drawn before the load finishes) and the full open
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from inventory_core import Inventory, preview_items
+imported = time.perf_counter()
+preview_items(sys.argv[1], '4.2')
+first_items = time.perf_counter()
+Inventory.open(sys.argv[1], compact_interval=3600, save_delay=3600)
+print(imported - start, first_items - start, time.perf_counter() - start)
+"""
+
+
+def bench_startup(timer, backend, path):
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, str(path)], cwd=ROOT, capture_output=True,
+                            text=True, check=True).stdout
+    imported, first_items, ready = (float(value) for value in output.split())
+    timer.record('startup_imports', backend, imported)
+    timer.record('startup_first_items', backend, first_items)
+    timer.record('startup_ready', backend, ready)
+
+
+# --- Storage benchmarks (headless equivalents of the GUI actions) ---
+
+def bench_storage(timer, backend, workbook_path, scratch_dir, selected):
+    if backend == 'sqlite':
+        db_path = Path(scratch_dir) / "bench.db"
+        with timer.time('import_workbook', backend):
+            import_workbook(workbook_path, db_path)
+        path = db_path
+    else:
+        path = workbook_path
+
+    if 'startup' in selected:
+        bench_startup(timer, backend, path)
+
+    with timer.time('open', backend):
+        inventory = Inventory.open(path, compact_interval=3600, save_delay=3600)
+    rng = random.Random(0)
+
+    # update_log_view(): the first page of every location's log (sorts on first use)
+    if 'log_view' in selected:
+        with timer.time('log_view_first_page', backend, ops=len(LOCATION_SHEETS)):
+            for location in LOCATION_SHEETS:
+                inventory.log_page(location, 0, LOG_PAGE_SIZE)
+        with timer.time('log_view_scroll', backend, ops=10 * len(LOCATION_SHEETS)):
+            for page in range(1, 11):
+                for location in LOCATION_SHEETS:
+                    inventory.log_page(location, page * LOG_PAGE_SIZE, LOG_PAGE_SIZE)
+
+    # is_san_unique(): half the lookups hit SANs in stock
+    if 'is_san_unique' in selected:
+        in_stock = [row[0] for row in inventory.all_sans()] or ['SAN100000']
+        lookups = [rng.choice(in_stock) if i % 2 else f"SAN{rng.randrange(100000, 1000000)}" for i in range(10_000)]
+        with timer.time('is_san_unique', backend, ops=len(lookups)):
+            for san_number in lookups:
+                inventory.is_san_unique(san_number)
+
+    # update_all_sans_location()
+    if 'update_all_sans_location' in selected:
+        with timer.time('update_all_sans_location', backend):
+            inventory.refresh_san_locations()
+
+    # check_restock_threshold()
+    if 'check_restock_threshold' in selected:
+        with timer.time('check_restock_threshold', backend, ops=100):
+            for _ in range(100):
+                inventory.low_stock(THRESHOLD_LOCATIONS)
+
+    # show_consumption_forecast(): parse every log once, then fold in the rows logged since
+    if 'consumption_forecast' in selected:
+        with timer.time('consumption_first', backend):
+            inventory.consumption_forecast()
+        location, item = next((location, row[0]) for location in LOCATION_SHEETS for row in inventory.items(location)
+                              if row[0] and not is_san_item(row[0]))
+        with timer.time('consumption_incremental', backend, ops=20):
+            for _ in range(20):
+                inventory.update_count(location, item, 'subtract', 1)
+                inventory.consumption_forecast()
+
+    # Movement reports from the daily rollups: one month for one location, and every week on record
+    if 'movement_report' in selected:
+        with timer.time('movement_month', backend, ops=100):
+            for _ in range(100):
+                inventory.movement_totals('2024-03-01', '2024-03-31', 'BR', 'G10')
+        with timer.time('movement_weekly', backend, ops=10):
+            for _ in range(10):
+                inventory.movement_series('week')
+
+    # update_count() for items without SANs: count change plus log row
+    if 'update_count' in selected:
+        targets = [(location, row[0]) for location in LOCATION_SHEETS for row in inventory.items(location)
+                   if row[0] and not is_san_item(row[0])]
+        n_ops = 500
+        with timer.time('update_count', backend, ops=n_ops):
+            for i in range(n_ops):
+                location, item = targets[i % len(targets)]
+                inventory.update_count(location, item, 'add', 1)
+
+    # Exit flush: the xlsx backend saves the whole workbook here
+    with timer.time('save_on_close', backend):
+        inventory.close()
+
+    if 'service' in selected:
+        bench_service(timer, backend, path)
+
+
+# --- Inventory service under concurrent clients ---
+
+SERVICE_LOAD = [(1, 1), (4, 1), (16, 1), (4, 50)]  # (clients, operations per request)
+SERVICE_START_TIMEOUT = 120  # Seconds for the service to open the workbook
+
+
+def bench_service(timer, backend, path):
+    from inventory_client import RemoteInventory, find_service, load_test
+
+    process = subprocess.Popen([sys.executable, str(ROOT / "inventory_service.py"), str(path), '--port', '0'],
+                               cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.perf_counter() + SERVICE_START_TIMEOUT
+        service = None
+        while service is None:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                raise RuntimeError(f"Inventory service did not start on {path}")
+            time.sleep(0.1)
+            service = find_service(path)
+        url, token = service
+        for clients, batch_size in SERVICE_LOAD:
+            result = load_test(url, clients, 1000, batch_size, token=token)
+            name = f"service_c{clients}" + (f"_batch{batch_size}" if batch_size > 1 else "")
+            timer.record(name, backend, result['seconds'], result['ops'])
+        with RemoteInventory(url, token) as client:
+            client.connection.request('POST', '/api/shutdown', {})
+        process.wait(timeout=SERVICE_START_TIMEOUT)
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+# --- Read-only consumers ---
+
+def bench_readers(timer, workbook_path, scratch_dir, selected):
+    from snapshot_cache import open_snapshot
+
+    with timer.time('snapshot_build'):
+        open_snapshot(workbook_path)
+
+    if 'plots' in selected:
+        import plot_engine
+
+        with timer.time('plots'):
+            results = plot_engine.render_all(workbook_path, Path(scratch_dir) / "plots", workers=1)
+        errors = [error for _, _, error in results if error is not None]
+        if errors:
+            raise RuntimeError(f"Plot rendering failed: {errors[0]}")
+
+    if 'extract_data' in selected:
+        extractor = _load_extractor()
+        with timer.time('extract_data_full'), _quiet():
+            extractor.extract_data(str(workbook_path), use_cache=False)
+        with _quiet():
+            extractor.extract_data(str(workbook_path))  # Fill the record cache
+        with timer.time('extract_data_cached'), _quiet():
+            extractor.extract_data(str(workbook_path))
+
+
+BENCHMARK_GROUPS = ['startup', 'log_view', 'is_san_unique', 'update_all_sans_location', 'check_restock_threshold',
+                    'consumption_forecast', 'movement_report', 'update_count', 'service', 'plots', 'extract_data']
+
+
+def run_suite(sizes, backends, selected, workbook_dir=None, seed=0):
+    results = []
+    for size in sizes:
+        start = time.perf_counter()
+        source = ensure_workbook(size, workbook_dir or DEFAULT_OUT_DIR, seed)
+        print(f"\n{size} transactions ({source.name}, ready in {time.perf_counter() - start:.1f} s)")
+        timer = Timer(size, parse_size(size))
+        with tempfile.TemporaryDirectory(prefix='euc-bench-') as scratch_dir:
+            for backend in backends:
+                workbook_path = Path(scratch_dir) / f"{backend}_EUC_Perth_Assets.xlsx"
+                shutil.copyfile(source, workbook_path)
+                bench_storage(timer, backend, workbook_path, scratch_dir, selected)
+            workbook_path = Path(scratch_dir) / "EUC_Perth_Assets.xlsx"
+            shutil.copyfile(source, workbook_path)
+            bench_readers(timer, workbook_path, scratch_dir, selected)
+        results.extend(timer.results)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(results, output_path):
+    report = {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return output_path
+
+
+def compare(old_path, new_path):
+    """
+    Print the timings of two result files side by side. The change column
+    is old time / new time, so above 1x means the new run is faster.
+    """
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    def key(result):
+        return result['benchmark'], result['size'], result['backend']
+
+    old_results = {key(result): result for result in old['results']}
+    print(f"{'benchmark':<24} {'size':>5} {'backend':<7} {'old ms':>11} {'new ms':>11} {'change':>8}")
+    for result in new['results']:
+        previous = old_results.get(key(result))
+        new_ms = result['seconds'] * 1000
+        if previous is None:
+            print(f"{result['benchmark']:<24} {result['size']:>5} {result['backend'] or '-':<7} "
+                  f"{'-':>11} {new_ms:>11.1f} {'new':>8}")
+            continue
+        old_ms = previous['seconds'] * 1000
+        change = f"{old_ms / new_ms:.2f}x" if new_ms > 0 else "-"
+        print(f"{result['benchmark']:<24} {result['size']:>5} {result['backend'] or '-':<7} "
+              f"{old_ms:>11.1f} {new_ms:>11.1f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EUC asset tracker's hot paths.")
+    parser.add_argument("--sizes", default=','.join(DEFAULT_SIZES),
+                        help=f"Comma-separated transaction row counts (default {','.join(DEFAULT_SIZES)}; "
+                             f"standard sizes are {','.join(STANDARD_SIZES)})")
+    parser.add_argument("--backends", default=','.join(BACKENDS), help="Comma-separated storage backends")
+    parser.add_argument("--only", help=f"Comma-separated benchmarks to run (of {','.join(BENCHMARK_GROUPS)})")
+    parser.add_argument("--workbook-dir", help="Where synthetic workbooks are generated and reused")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic workbook seed")
+    parser.add_argument("--output", help="Results JSON (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    selected = set(args.only.split(',')) if args.only else set(BENCHMARK_GROUPS)
+    unknown = selected - set(BENCHMARK_GROUPS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    backends = args.backends.split(',')
+    if set(backends) - set(BACKENDS):
+        parser.error(f"Backends must be among {', '.join(BACKENDS)}")
+
+    results = run_suite(args.sizes.split(','), backends, selected, args.workbook_dir, args.seed)
+    output_path = args.output or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    print(f"\nResults written to {write_results(results, output_path)}")
+
+
+if __name__ == '__main__':
+    main()
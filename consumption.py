@@ -0,0 +1,229 @@
+# Consumption analytics: burn rates and days-until-stockout from the *_Timestamps logs.
+#
+# A location's log is parsed in bulk with pandas. Action texts are factorized
+# first, so only the few distinct strings ('add', 'subtract 3', ...) go through
+# the regex, and the timestamps are converted in one vectorized call. Rows are
+# reduced to units used and added per (location, item, day), which is all a
+# forecast needs; refresh() parses only the rows logged since the last call
+# and folds their daily totals into that cache.
+#
+# Rows are counted as inventory_core.logged_units() counts them one at a time:
+# 'subtract N' moves N units, a bare 'add' one, and SAN-tracked items one per
+# row with a SAN (their SAN-less 'add N' rows repeat the batch total).
+#
+# Usage:
+#   python consumption.py --file EUC_Perth_Assets.xlsx --window 28
+
+import argparse
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from inventory_core import LOCATIONS, TIMESTAMP_FORMAT, Inventory, is_san_item, parse_action
+from metrics import timed, timer
+from storage import LOCATION_SHEETS
+
+DEFAULT_WINDOW_DAYS = 28
+
+DAILY_COLUMNS = ['used', 'added']
+FORECAST_COLUMNS = ['location', 'item', 'count', 'threshold', 'daily_burn', 'weekly_burn',
+                    'days_to_threshold', 'days_to_zero']
+
+
+def _empty_daily(levels=('item', 'day')):
+    index = pd.MultiIndex.from_arrays([[]] * len(levels), names=list(levels))
+    return pd.DataFrame({column: pd.Series(dtype='int64') for column in DAILY_COLUMNS}, index=index)
+
+
+def _parse_actions(action_texts):
+    """
+    (sign, units) arrays for distinct Action texts: +1 add, -1 subtract, 0 unreadable.
+    One extra trailing (0, 0) entry, so a factorize code of -1 (empty cell) reads as unreadable.
+    """
+    signs = np.zeros(len(action_texts) + 1, dtype=np.int64)
+    units = np.zeros(len(action_texts) + 1, dtype=np.int64)
+    for code, text in enumerate(action_texts):
+        parsed = parse_action(text)
+        if parsed is not None:
+            signs[code] = 1 if parsed[0] == 'add' else -1
+            units[code] = parsed[1]
+    return signs, units
+
+
+def parse_log(rows):
+    """
+    Units used and added per (item, day) in (Timestamp, Item, Action, SAN #)
+    rows, as a DataFrame indexed by (item, day number since 1970-01-01).
+    Rows without a readable timestamp, item or action are skipped.
+    """
+    if not rows:
+        return _empty_daily()
+    timestamps, items, actions, sans = (np.asarray(column, dtype=object) for column in zip(*rows))
+
+    action_codes, action_texts = pd.factorize(actions)
+    signs, units = _parse_actions(action_texts)
+    item_codes, item_names = pd.factorize(items)
+    san_items = np.array([is_san_item(str(name)) for name in item_names] + [False])
+
+    # Cells are "%Y-%m-%d %H:%M:%S" text or datetimes if Excel converted them
+    stamps = pd.to_datetime(pd.Series(timestamps), format=TIMESTAMP_FORMAT, errors='coerce')
+    valid = stamps.notna().to_numpy()
+    days = stamps.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+    has_san = pd.notna(sans) & (sans != '')
+    row_units = np.where(san_items[item_codes], has_san, units[action_codes])
+    row_signs = signs[action_codes]
+    keep = valid & (item_codes >= 0) & (row_signs != 0) & (row_units > 0)
+
+    row_units, row_signs = row_units[keep], row_signs[keep]
+    frame = pd.DataFrame({
+        'item': item_codes[keep],
+        'day': days[keep],
+        'used': np.where(row_signs < 0, row_units, 0),
+        'added': np.where(row_signs > 0, row_units, 0),
+    })
+    daily = frame.groupby(['item', 'day'], sort=False).sum()
+    codes = daily.index.get_level_values('item')
+    daily.index = pd.MultiIndex.from_arrays(
+        [np.asarray(item_names, dtype=object)[codes], daily.index.get_level_values('day')], names=['item', 'day'])
+    return daily
+
+
+def _day_number(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+class ConsumptionAnalytics:
+    """
+    location -> units used and added per (item, day), kept current by refresh().
+    Burn rates are cached per (window, day) until new rows arrive.
+    """
+
+    def __init__(self, locations=LOCATIONS):
+        self.locations = list(locations)
+        self.lock = threading.Lock()
+        self._daily = {location: _empty_daily() for location in self.locations}
+        self._markers = {location: 0 for location in self.locations}
+        self._rates = {}
+
+    @timed('analytics.refresh')
+    def refresh(self, storage):
+        """
+        Fold in the rows logged since the last refresh. Returns how many there were.
+        """
+        new_rows = 0
+        with self.lock:
+            for location in self.locations:
+                rows, marker = storage.log_since(location, self._markers[location])
+                self._markers[location] = marker
+                if not rows:
+                    continue
+                with timer('analytics.parse'):
+                    daily = parse_log(rows)
+                self._daily[location] = pd.concat([self._daily[location], daily]).groupby(level=[0, 1]).sum()
+                new_rows += len(rows)
+            if new_rows:
+                self._rates.clear()
+        return new_rows
+
+    def daily(self):
+        """
+        Units used and added, indexed by (location, item, day number).
+        """
+        with self.lock:
+            frames = [self._daily[location] for location in self.locations]
+        if not any(len(frame) for frame in frames):
+            return _empty_daily(('location', 'item', 'day'))
+        return pd.concat(frames, keys=self.locations, names=['location'])
+
+    def last_day(self):
+        """
+        Day number of the newest row logged anywhere, or None for empty logs.
+        """
+        days = self.daily().index.get_level_values('day')
+        return int(days.max()) if len(days) else None
+
+    def burn_rates(self, window_days=DEFAULT_WINDOW_DAYS, as_of=None):
+        """
+        Units used and added per (location, item) over the `window_days` days up
+        to `as_of` (a date or 'YYYY-MM-DD'; default the last day logged), with
+        the daily and weekly burn. Items first logged inside the window are
+        averaged over the days since then, so a new item isn't under-counted.
+        """
+        end = _day_number(as_of) if as_of is not None else self.last_day()
+        key = (window_days, end)
+        cached = self._rates.get(key)
+        if cached is not None:
+            return cached
+
+        daily = self.daily()
+        if end is not None:
+            daily = daily[daily.index.get_level_values('day') <= end]
+        if daily.empty:
+            rates = pd.DataFrame(columns=DAILY_COLUMNS + ['days', 'daily_burn', 'weekly_burn'],
+                                 index=pd.MultiIndex.from_arrays([[], []], names=['location', 'item']))
+        else:
+            days = daily.index.get_level_values('day')
+            first_day = pd.Series(days, index=daily.index).groupby(level=[0, 1]).min()
+            in_window = daily[days > end - window_days].groupby(level=[0, 1]).sum()
+            rates = in_window.reindex(first_day.index, fill_value=0)
+            rates['days'] = np.clip(end - first_day + 1, 1, window_days)
+            rates['daily_burn'] = rates['used'] / rates['days']
+            rates['weekly_burn'] = rates['daily_burn'] * 7
+        self._rates[key] = rates
+        return rates
+
+    def forecast(self, levels, window_days=DEFAULT_WINDOW_DAYS, as_of=None):
+        """
+        Days until each item reaches its threshold and zero at its current burn.
+        `levels` is (location, item, count, threshold) rows, e.g.
+        RestockIndex.entries(). Days are 0 for an item already there and NaN
+        for one with no use in the window (or no threshold); most urgent first.
+        """
+        frame = pd.DataFrame(list(levels), columns=FORECAST_COLUMNS[:4])
+        rates = self.burn_rates(window_days, as_of)
+        frame = frame.join(rates[['daily_burn', 'weekly_burn']], on=['location', 'item'])
+        frame[['daily_burn', 'weekly_burn']] = frame[['daily_burn', 'weekly_burn']].fillna(0.0)
+
+        count = pd.to_numeric(frame['count'], errors='coerce')
+        threshold = pd.to_numeric(frame['threshold'], errors='coerce')
+        burn = frame['daily_burn'].where(frame['daily_burn'] > 0)
+        frame['days_to_threshold'] = ((count - threshold).clip(lower=0) / burn).mask(count <= threshold, 0.0)
+        frame['days_to_zero'] = (count.clip(lower=0) / burn).mask(count <= 0, 0.0)
+        return frame.sort_values(['days_to_threshold', 'days_to_zero'], kind='stable',
+                                 na_position='last').reset_index(drop=True)
+
+    def usage(self, freq='W'):
+        """
+        Units used per period ('D' days or 'W' weeks), one row per (location,
+        item) and one column per period.
+        """
+        daily = self.daily()
+        periods = pd.to_datetime(daily.index.get_level_values('day'), unit='D').to_period(freq)
+        return (daily['used']
+                .groupby([daily.index.get_level_values('location'), daily.index.get_level_values('item'), periods])
+                .sum()
+                .unstack(fill_value=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Burn rates and days until restock from the transaction logs.")
+    parser.add_argument("--file", help="Workbook or SQLite database to read (default: the GUI's last spreadsheet)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_DAYS, help="Days of history per burn rate")
+    parser.add_argument("--as-of", help="Last day of the window, YYYY-MM-DD (default: the last day logged)")
+    parser.add_argument("--location", action="append", choices=list(LOCATION_SHEETS),
+                        help="Only this location (repeatable)")
+    args = parser.parse_args()
+
+    with Inventory.open(args.file) as inventory:
+        forecast = inventory.consumption_forecast(args.window, args.as_of, args.location)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(forecast.round(1).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,10 @@
 
 # To-Do: Standardise the X axis across plots to 200
 
+import time
+STARTUP_START = time.perf_counter()  # Startup timings (startup.* metrics) are measured from here
+
+import ast
 import logging.config
 from pathlib import Path
 from tkinter import Menu
@@ -10,12 +14,41 @@ import customtkinter as ctk
 import os
 import tkinter as tk
 from tkinter import ttk
-from openpyxl import load_workbook, Workbook
 from datetime import datetime
 import subprocess
 from tkinter import filedialog
 from tkinter import messagebox
-import pandas as pd  # Ensure pandas is imported for date operations
+from tkinter import simpledialog
+import atexit
+import queue
+import threading
+from metrics import METRICS, MetricsExporter, count, timer
+from restock import LOW
+from inventory_core import (InventoryError, DEFAULT_THRESHOLD, THRESHOLD_LOCATIONS, is_san_item,
+                            is_valid_san, log_row_matches, preview_items)
+from inventory_client import ServiceError, is_service_url, open_inventory
+from log_archive import DEFAULT_KEEP_DAYS
+from storage import LOCATION_SHEETS, SQLITE_SUFFIXES
+from san_search import SANSearchIndex
+from san_index import normalise_san
+
+# Seconds between background folds of the change journal into the workbook (xlsx storage)
+JOURNAL_COMPACT_INTERVAL = 60
+
+# Seconds of inactivity after a change before the background writer saves the workbook
+SAVE_DELAY = 2.0
+SAVE_STATUS_POLL_MS = 200  # How often the UI picks up status updates from the writer thread
+
+# Processes used by "Save Plots" (None = one per chart, up to the CPU count)
+PLOT_WORKERS = None
+
+# Hot-path metrics export, next to this script: .json, or .prom for Prometheus text format (None disables)
+METRICS_EXPORT_FILE = 'metrics.json'
+METRICS_EXPORT_INTERVAL = 30  # Seconds between exports
+METRICS_REFRESH_MS = 1000  # How often the Performance Metrics window redraws
+
+LOAD_POLL_MS = 50  # How often the UI checks on the background workbook load
+SERVICE_POLL_MS = 1000  # How often a client of the inventory service picks up other stations' changes
 
 
 # Function to save the workbook path to config.py
@@ -24,6 +57,25 @@ def save_config(workbook_path):
         config_file.write(f"workbook_path = r'{workbook_path}'\n")
 
 
+def load_config():
+    """
+    The workbook path last saved by save_config(), or None. config.py is
+    parsed rather than imported so a stale or broken file can't stop startup.
+    """
+    try:
+        with open('config.py', encoding='utf-8') as config_file:
+            tree = ast.parse(config_file.read())
+    except (OSError, SyntaxError, ValueError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, 'id', None) == 'workbook_path' for target in node.targets):
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                return None
+    return None
+
+
 logging_conf_path = Path('logging.conf')
 if logging_conf_path.exists() and logging_conf_path.stat().st_size > 0:
     try:
@@ -34,31 +86,27 @@ else:
     logging.basicConfig(level=logging.DEBUG)
 
 
-def run_inventory_script(script_name, output_prefix, success_message):
+def show_inventory_plot(location, success_message):
     """
-    Generalized function to run an inventory script and handle its output.
+    Render one location's chart ('combined' for the combined one) in this
+    process from the workbook, save it under Plots/ and show it.
     """
-    script_path = script_directory / script_name
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")  # Generate a timestamp
-    output_path = script_directory / "Plots" / f"{output_prefix}_{timestamp}.png"
+    import plot_engine  # Imported on first use: it pulls in pandas and matplotlib
 
-    # Ensure the output directory exists
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")  # Generate a timestamp
+    output_path = script_directory / "Plots" / f"{plot_engine.output_prefix(location)}_{timestamp}.png"
+    try:
+        plot_engine.render_one(inventory.spreadsheet_path(), location, str(output_path))
+    except Exception as e:
+        logging.error(f"Error while rendering {success_message}: {e}")
+        tk.messagebox.showerror("Error", f"Failed to render the {success_message.lower()}: {e}")
+        return
 
-    if script_path.exists():
-        try:
-            subprocess.run(
-                ["python", str(script_path), "--output", str(output_path)],
-                check=True,
-            )
-            messagebox.showinfo("Success", f"{success_message} saved to {output_path}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error running {script_name}: {e}")
-            tk.messagebox.showerror("Error", f"Failed to run the script: {e}")
-    else:
-        tk.messagebox.showerror(
-            "Error", f"The script '{script_name}' does not exist in the directory."
-        )
+    plot_window = tk.Toplevel(root)
+    plot_window.title(success_message)
+    plot_window.image = tk.PhotoImage(file=str(output_path))  # Keep a reference or Tk drops the image
+    tk.Label(plot_window, image=plot_window.image).pack()
+    tk.Label(plot_window, text=f"Saved to {output_path}").pack(pady=5)
 
 
 def set_item_threshold():
@@ -70,9 +118,10 @@ def set_item_threshold():
     threshold_window.geometry("500x400")
 
     # Select sheet dropdown
+    sheet_locations = {items_sheet: location for location, (items_sheet, _) in LOCATION_SHEETS.items()}
     tk.Label(threshold_window, text="Select Sheet:").pack(pady=5)
     sheet_var = tk.StringVar(value='4.2_Items')
-    sheet_dropdown = ttk.Combobox(threshold_window, textvariable=sheet_var, values=['4.2_Items', 'BR_Items', 'Darwin_Items'])
+    sheet_dropdown = ttk.Combobox(threshold_window, textvariable=sheet_var, values=list(sheet_locations))
     sheet_dropdown.pack(pady=5)
 
     # Select item dropdown
@@ -83,11 +132,9 @@ def set_item_threshold():
 
     # Update item list when sheet changes
     def update_item_list(*args):
-        sheet_name = sheet_var.get()
-        if sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            items = [row[0] for row in sheet.iter_rows(min_row=2, max_col=1, values_only=True) if row[0]]
-            item_dropdown['values'] = items
+        location = sheet_locations.get(sheet_var.get())
+        if location is not None:
+            item_dropdown['values'] = [row[0] for row in inventory.items(location)]
 
     sheet_var.trace("w", update_item_list)
     update_item_list()
@@ -108,50 +155,30 @@ def set_item_threshold():
             tk.messagebox.showerror("Error", "All fields are required.", parent=threshold_window)
             return
 
-        if sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                if row[0] == item_name:
-                    row_idx = row[0].row
-                    threshold_col_idx = sheet.max_column  # Assume last column is Threshold
-                    sheet.cell(row=row_idx, column=threshold_col_idx, value=threshold_value)
-                    workbook.save(workbook_path)
-                    tk.messagebox.showinfo("Success", f"Threshold for '{item_name}' set to {threshold_value}.", parent=threshold_window)
-                    break
-            else:
-                tk.messagebox.showerror("Error", f"Item '{item_name}' not found in {sheet_name}.", parent=threshold_window)
+        location = sheet_locations.get(sheet_name)
+        if location is not None:
+            try:
+                inventory.set_threshold(location, item_name, threshold_value)
+            except InventoryError as e:
+                tk.messagebox.showerror("Error", str(e), parent=threshold_window)
+                return
+            tk.messagebox.showinfo("Success", f"Threshold for '{item_name}' set to {threshold_value}.", parent=threshold_window)
 
     tk.Button(threshold_window, text="Save Threshold", command=save_threshold).pack(pady=10)
 
 
-# Use the generalized function for specific scripts
+# Chart of each location, drawn by plot_engine
 def run_basement_4_2_inventory():
-    run_inventory_script(
-        script_name="inventory-levels_4.2v3.py",
-        output_prefix="Basement_4.2_inventory",
-        success_message="Basement 4.2 inventory plot"
-    )
+    show_inventory_plot('4.2', "Basement 4.2 inventory plot")
 
 def run_build_room_inventory():
-    run_inventory_script(
-        script_name="inventory-levels_BRv2.3.py",
-        output_prefix="Build_Room_inventory",
-        success_message="Build Room inventory plot"
-    )
+    show_inventory_plot('BR', "Build Room inventory plot")
 
 def run_darwin_inventory():
-    run_inventory_script(
-        script_name="inventory-levels_darwin.v2.py",
-        output_prefix="Darwin_inventory",
-        success_message="Darwin inventory plot"
-    )
+    show_inventory_plot('Darwin', "Darwin inventory plot")
 
 def run_combined_inventory():
-    run_inventory_script(
-        script_name="inventory-levels_combinedv1.5.py",
-        output_prefix="Combined_inventory",
-        success_message="Combined inventory plot"
-    )
+    show_inventory_plot('combined', "Combined inventory plot")
 
 
 def save_plots():
@@ -164,32 +191,21 @@ def save_plots():
     save_dir = plots_dir / f"All_{timestamp}"
     save_dir.mkdir(parents=True, exist_ok=True)  # Ensure the directory exists
 
-    # Define the scripts and their corresponding output prefixes and success messages
-    inventory_scripts = [
-        ("inventory-levels_4.2v3.py", "Basement_4.2_inventory", "Basement 4.2 inventory plot"),
-        ("inventory-levels_BRv2.3.py", "Build_Room_inventory", "Build Room inventory plot"),
-        ("inventory-levels_darwin.v2.py", "Darwin_inventory", "Darwin inventory plot"),
-        ("inventory-levels_combinedv1.5.py", "Combined_inventory", "Combined inventory plot"),
-    ]
-
-    # Loop through each script and generate plots
-    for script_name, output_prefix, success_message in inventory_scripts:
-        script_path = script_directory / script_name
-        if script_path.exists():
-            try:
-                output_path = save_dir / f"{output_prefix}.png"
-                subprocess.run(
-                    ["python", str(script_path), "--output", str(output_path)],
-                    check=True,
-                    env={**os.environ, "MPLBACKEND": "Agg"}  # Headless matplotlib
-                )
-                logging.info(f"{success_message} saved to {output_path}")
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Error while saving {success_message}: {e}")
-                tk.messagebox.showerror("Error", f"Error while saving {success_message}: {e}")
+    # Parse the workbook once and render every location chart plus the combined chart in parallel
+    try:
+        import plot_engine  # Imported on first use: it pulls in pandas and matplotlib
+        results = plot_engine.render_all(inventory.spreadsheet_path(), str(save_dir), workers=PLOT_WORKERS)
+    except Exception as e:
+        logging.error(f"Error while loading inventory data for plots: {e}")
+        tk.messagebox.showerror("Error", f"Error while loading inventory data for plots: {e}")
+        return
+
+    for title, output_path, error in results:
+        if error is None:
+            logging.info(f"{title} plot saved to {output_path}")
         else:
-            logging.error(f"Script '{script_name}' not found!")
-            tk.messagebox.showerror("Error", f"Script '{script_name}' not found!")
+            logging.error(f"Error while saving {title} plot: {error}")
+            tk.messagebox.showerror("Error", f"Error while saving {title} plot: {error}")
 
     # Open the folder with saved plots
     open_folder_prompt(save_dir)
@@ -219,63 +235,29 @@ def open_folder_prompt(folder_path):
 
 def open_spreadsheet():
     try:
+        spreadsheet_path = inventory.spreadsheet_path()  # Make sure the file on disk has every logged change
         if os.name == 'nt':
-            os.startfile(workbook_path)
+            os.startfile(spreadsheet_path)
         else:
             opener = "open" if sys.platform == "darwin" else "xdg-open"
-            subprocess.run([opener, workbook_path])
+            subprocess.run([opener, spreadsheet_path])
     except Exception as e:
         tk.messagebox.showerror("Error", f"Failed to open the spreadsheet: {e}")
 
 
 def update_all_sans_location():
     """
-    Updates the 'Location' column in the 'All_SANs' sheet based on the presence of SANs
-    in specific timestamp sheets.
+    Updates the 'Location' column in the 'All_SANs' sheet from the timestamp sheet
+    that last logged each SAN. Only cells whose location changed are written.
     """
-    # Ensure the 'All_SANs' sheet exists
-    if 'All_SANs' not in workbook.sheetnames:
-        tk.messagebox.showerror("Error", "'All_SANs' sheet not found in the workbook.")
-        return
-
-    all_sans_sheet = workbook['All_SANs']
-
-    # Ensure the Location column (D) has a header
-    if all_sans_sheet.max_column < 4:
-        all_sans_sheet.cell(row=1, column=4, value="Location")
-
-    # Mapping of sheets to short locations
-    location_mapping = {
-        '4.2_Timestamps': '4.2',
-        'BR_Timestamps': 'BR',
-        'Darwin_Timestamps': 'Darwin'
-    }
-
-    # Iterate over rows in All_SANs and update the location
-    for row_idx, row in enumerate(all_sans_sheet.iter_rows(min_row=2, values_only=True), start=2):
-        san_number = row[0]
-        location = None
-
-        # Check each timestamp sheet for the SAN
-        for sheet_name, loc in location_mapping.items():
-            if sheet_name in workbook.sheetnames:
-                timestamp_sheet = workbook[sheet_name]
-                if any(san_number == cell[0] for cell in timestamp_sheet.iter_rows(min_row=2, min_col=1, max_col=1, values_only=True)):
-                    location = loc
-                    break
-
-        # Write the location to the Location column (Column D)
-        all_sans_sheet.cell(row=row_idx, column=4, value=location)
-
-    # Save the workbook after updating
-    workbook.save(workbook_path)
+    inventory.refresh_san_locations()
 
 
 def view_all_sans_log():
     """
     Displays the updated All_SANs data in a Treeview widget with columns
     'SAN Number', 'Item', 'Time', and 'Location'.
-    Includes a search box to filter SAN numbers dynamically.
+    Includes a search box that filters on SAN number, item and location.
     """
     # Update the 'Location' column in the 'All_SANs' sheet
     update_all_sans_location()
@@ -306,26 +288,40 @@ def view_all_sans_log():
     scrollbar.pack(side="right", fill="y")
     log_tree.configure(yscrollcommand=scrollbar.set)
 
-    # Load data from the "All_SANs" sheet
+    # Index the "All_SANs" sheet once for this window
+    search_index = SANSearchIndex(inventory.all_sans())
+    if not search_index.rows:
+        tk.messagebox.showinfo("Info", "'All_SANs' sheet not found or empty.", parent=log_window)
+        return
+    pending = {'search': None, 'stream': None}
+
     def load_data(filter_text=""):
         """
-        Populates the Treeview with data, filtering by filter_text.
+        Populates the Treeview with rows matching filter_text, a chunk at a time
+        so large result sets don't block the window.
         """
-        log_tree.delete(*log_tree.get_children())  # Clear current data
-        if 'All_SANs' in workbook.sheetnames:
-            all_sans_sheet = workbook['All_SANs']
-            for row in all_sans_sheet.iter_rows(min_row=2, values_only=True):
-                san_number, item, timestamp, location = row
-                # Filter by the search text
-                if filter_text.lower() in str(san_number).lower():
-                    log_tree.insert('', 'end', values=(san_number, item, timestamp, location))
-        else:
-            tk.messagebox.showinfo("Info", "'All_SANs' sheet not found or empty.", parent=log_window)
+        if pending['stream'] is not None:
+            log_window.after_cancel(pending['stream'])
+            pending['stream'] = None
+        with timer('treeview.sans_search'):
+            log_tree.delete(*log_tree.get_children())  # Clear current data
+            results = search_index.search(filter_text)
+
+        def insert_chunk(start):
+            for row in results[start:start + SAN_SEARCH_CHUNK]:
+                log_tree.insert('', 'end', values=row)
+            if start + SAN_SEARCH_CHUNK < len(results):
+                pending['stream'] = log_window.after(1, insert_chunk, start + SAN_SEARCH_CHUNK)
+            else:
+                pending['stream'] = None
 
-    # Trigger search on text change
+        insert_chunk(0)
+
+    # Trigger search once typing pauses
     def on_search(*args):
-        filter_text = search_var.get()
-        load_data(filter_text)
+        if pending['search'] is not None:
+            log_window.after_cancel(pending['search'])
+        pending['search'] = log_window.after(SAN_SEARCH_DEBOUNCE_MS, lambda: load_data(search_var.get()))
 
     search_var.trace("w", on_search)  # Bind dynamic updates to search
 
@@ -337,13 +333,6 @@ def view_san_returns_log():
     Displays the 'SAN_Returns' sheet in a Treeview widget with columns:
     'SAN', 'Gen', 'Returned By', 'Returned To', 'Notes', and 'Timestamp'.
     """
-    # Ensure the 'SAN_Returns' sheet exists
-    if 'SAN_Returns' not in workbook.sheetnames:
-        tk.messagebox.showinfo("Info", "'SAN_Returns' sheet not found. Creating it now.")
-        san_returns_sheet = workbook.create_sheet('SAN_Returns')
-        san_returns_sheet.append(["SAN", "Gen", "Returned By", "Returned To", "Notes", "Timestamp"])  # Updated headers
-        workbook.save(workbook_path)
-
     log_window = tk.Toplevel(root)
     log_window.title("SAN Return Log")
     log_window.geometry("900x600")
@@ -478,24 +467,15 @@ def submit_san_return(san, gen, returned_by, returned_to, notes, timestamp, form
     Validates input and submits the data to the SAN_Returns sheet.
     Updates the Treeview dynamically after submission.
     """
-    # Check if required fields are filled
-    if not san or not gen or not returned_by or not returned_to or not timestamp:
-        tk.messagebox.showerror("Error", "All fields except 'Notes' are required.", parent=form_window)
+    # Append the data to the SAN_Returns sheet (created with headers if missing); every field but Notes is required
+    try:
+        if not timestamp:
+            raise InventoryError("All fields except 'Notes' are required.")
+        inventory.add_san_return(san, gen, returned_by, returned_to, notes, timestamp)
+    except InventoryError as e:
+        tk.messagebox.showerror("Error", str(e), parent=form_window)
         return
 
-    # Ensure the 'SAN_Returns' sheet exists
-    if 'SAN_Returns' not in workbook.sheetnames:
-        san_returns_sheet = workbook.create_sheet('SAN_Returns')
-        san_returns_sheet.append(["SAN", "Gen", "Returned By", "Returned To", "Notes", "Timestamp"])  # Add headers
-    else:
-        san_returns_sheet = workbook['SAN_Returns']
-
-    # Append the data to the SAN_Returns sheet
-    san_returns_sheet.append([san, gen, returned_by, returned_to, notes, timestamp])
-
-    # Save the workbook
-    workbook.save(workbook_path)
-
     # Update the Treeview dynamically
     refresh_san_returns_log(returns_tree)
 
@@ -509,10 +489,8 @@ def refresh_san_returns_log(returns_tree):
     Refreshes the Treeview with the latest data from the SAN_Returns sheet.
     """
     returns_tree.delete(*returns_tree.get_children())  # Clear current data
-    if 'SAN_Returns' in workbook.sheetnames:
-        san_returns_sheet = workbook['SAN_Returns']
-        for row in san_returns_sheet.iter_rows(min_row=2, values_only=True):
-            returns_tree.insert('', 'end', values=row)
+    for row in inventory.san_returns():
+        returns_tree.insert('', 'end', values=row)
 
 
 def view_san_returns_log():
@@ -520,13 +498,6 @@ def view_san_returns_log():
     Displays the 'SAN_Returns' sheet in a Treeview widget with columns:
     'SAN', 'Returned By', 'Returned To', 'Notes', and 'Timestamp'.
     """
-    # Ensure the 'SAN_Returns' sheet exists
-    if 'SAN_Returns' not in workbook.sheetnames:
-        tk.messagebox.showinfo("Info", "'SAN_Returns' sheet not found. Creating it now.")
-        san_returns_sheet = workbook.create_sheet('SAN_Returns')
-        san_returns_sheet.append(["SAN", "Returned By", "Returned To", "Notes", "Timestamp"])
-        workbook.save(workbook_path)
-
     log_window = tk.Toplevel(root)
     log_window.title("SAN Return List")
     log_window.geometry("800x600")
@@ -596,6 +567,137 @@ def open_san_return_form_with_tree(returns_tree):
     ).grid(row=len(fields), column=0, columnspan=2, pady=20)
 
 
+metrics_window = None
+
+
+def show_metrics_window():
+    """
+    Live view of the hot-path timers (p50/p95/max over recent calls, in ms)
+    and counters, redrawn every METRICS_REFRESH_MS while the window is open.
+    """
+    global metrics_window
+    if metrics_window is not None and metrics_window.winfo_exists():
+        metrics_window.lift()
+        return
+
+    metrics_window = window = tk.Toplevel(root)
+    window.title("Performance Metrics")
+    window.geometry("640x560")
+
+    timer_columns = ("Operation", "Count", "p50 ms", "p95 ms", "Max ms")
+    timers_tree = ttk.Treeview(window, columns=timer_columns, show="headings", height=14)
+    for col in timer_columns:
+        timers_tree.heading(col, text=col, anchor="w" if col == "Operation" else "e")
+        timers_tree.column(col, anchor="w" if col == "Operation" else "e", width=220 if col == "Operation" else 90)
+    timers_tree.pack(expand=True, fill="both", padx=10, pady=(10, 5))
+
+    counters_tree = ttk.Treeview(window, columns=("Counter", "Value"), show="headings", height=6)
+    counters_tree.heading("Counter", text="Counter", anchor="w")
+    counters_tree.heading("Value", text="Value", anchor="e")
+    counters_tree.column("Counter", anchor="w", width=220)
+    counters_tree.column("Value", anchor="e", width=90)
+    counters_tree.pack(fill="x", padx=10, pady=5)
+
+    row_ids = {timers_tree: {}, counters_tree: {}}
+
+    def sync_rows(tree_widget, values_by_name):
+        # Update rows in place so the selection and scroll position survive a redraw
+        ids = row_ids[tree_widget]
+        for name in list(ids):
+            if name not in values_by_name:
+                tree_widget.delete(ids.pop(name))
+        for name, values in values_by_name.items():
+            if name in ids:
+                tree_widget.item(ids[name], values=values)
+            else:
+                ids[name] = tree_widget.insert('', 'end', values=values)
+
+    def refresh():
+        if not window.winfo_exists():
+            return
+        snapshot = METRICS.snapshot()
+        sync_rows(timers_tree, {
+            name: (name, entry['count'], f"{entry.get('p50_ms', 0):.1f}", f"{entry.get('p95_ms', 0):.1f}",
+                   f"{entry['max_ms']:.1f}")
+            for name, entry in snapshot['timers'].items()
+        })
+        sync_rows(counters_tree, {name: (name, value) for name, value in snapshot['counters'].items()})
+        window.after(METRICS_REFRESH_MS, refresh)
+
+    button_frame = tk.Frame(window)
+    button_frame.pack(pady=5)
+    tk.Button(button_frame, text="Reset", command=METRICS.reset).pack(side="left", padx=5)
+    if metrics_exporter is not None:
+        tk.Button(button_frame, text="Export Now", command=metrics_exporter.export).pack(side="left", padx=5)
+
+    refresh()
+
+
+FORECAST_WINDOWS = (7, 28, 90)  # Days of history the burn rate can be taken over
+
+
+def format_count(value):
+    if value is None or value != value:  # Empty cell
+        return ""
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def format_days(value):
+    return "-" if value != value else f"{value:.0f}"  # NaN: no use in the window, or no threshold
+
+
+def show_consumption_forecast():
+    """
+    Burn rate of every item over the last 7/28/90 days of its log and the
+    days until it reaches its threshold and runs out, most urgent first.
+    """
+    if inventory is None:
+        return
+    forecast_window = tk.Toplevel(root)
+    forecast_window.title("Consumption Forecast")
+    forecast_window.geometry("900x500")
+
+    controls = tk.Frame(forecast_window)
+    controls.pack(fill="x", padx=10, pady=(10, 0))
+    tk.Label(controls, text="Burn rate over the last").pack(side="left")
+    window_days = tk.StringVar(value=str(FORECAST_WINDOWS[1]))
+    window_box = ttk.Combobox(controls, textvariable=window_days, values=FORECAST_WINDOWS, width=4, state="readonly")
+    window_box.pack(side="left", padx=5)
+    tk.Label(controls, text="days of each log").pack(side="left")
+
+    columns = ("Sheet", "Item", "Stock", "Threshold", "Per Day", "Per Week", "Days to Threshold", "Days to Zero")
+    forecast_tree = ttk.Treeview(forecast_window, columns=columns, show="headings", height=15)
+    for col in columns:
+        forecast_tree.heading(col, text=col, anchor="w" if col in ("Sheet", "Item") else "e")
+        forecast_tree.column(col, anchor="w" if col in ("Sheet", "Item") else "e",
+                             width=200 if col == "Item" else 100)
+    scrollbar = ttk.Scrollbar(forecast_window, orient="vertical", command=forecast_tree.yview)
+    scrollbar.pack(side="right", fill="y")
+    forecast_tree.configure(yscrollcommand=scrollbar.set)
+    forecast_tree.pack(expand=True, fill="both", padx=10, pady=10)
+
+    def refresh(event=None):
+        try:
+            forecast_window.config(cursor="watch")
+            forecast_window.update_idletasks()
+            forecast = inventory.consumption_forecast(int(window_days.get()))
+        except Exception as e:
+            logging.error(f"Error computing consumption forecast: {e}")
+            messagebox.showerror("Error", f"Failed to compute the forecast: {e}", parent=forecast_window)
+            return
+        finally:
+            forecast_window.config(cursor="")
+        forecast_tree.delete(*forecast_tree.get_children())
+        for row in forecast.itertuples(index=False):
+            forecast_tree.insert("", "end", values=(
+                LOCATION_SHEETS[row.location][0], row.item, format_count(row.count), format_count(row.threshold),
+                f"{row.daily_burn:.2f}", f"{row.weekly_burn:.1f}",
+                format_days(row.days_to_threshold), format_days(row.days_to_zero)))
+
+    window_box.bind("<<ComboboxSelected>>", refresh)
+    refresh()
+
+
 root = ctk.CTk()
 root.title("EUC Assets - WA")
 root.geometry("675x850")
@@ -638,7 +740,11 @@ plots_menu = tk.Menu(menu_bar, tearoff=0)
 plots_menu.add_cascade(label="SANs", menu=sans_menu)  # Add SANs submenu
 plots_menu.add_cascade(label="Inventory", menu=inventory_menu)  # Add Inventory submenu
 plots_menu.add_command(label="Open Spreadsheet", command=open_spreadsheet)
-plots_menu.add_command(label="Check Restock Threshold", command=lambda: check_restock_threshold(10))
+plots_menu.add_command(label="Switch Spreadsheet...", command=lambda: switch_spreadsheet())
+plots_menu.add_command(label="Check Restock Threshold", command=check_restock_threshold)
+plots_menu.add_command(label="Consumption Forecast", command=show_consumption_forecast)
+plots_menu.add_command(label="Archive Old Log Rows...", command=lambda: archive_old_log_rows())
+plots_menu.add_command(label="Performance Metrics", command=show_metrics_window)
 # plots_menu.add_command(label="Headsets In Stock", command=view_headsets_log)
 
 menu_bar.add_cascade(label="Options", menu=plots_menu)
@@ -648,128 +754,182 @@ root.config(menu=menu_bar)
 
 script_directory = Path(__file__).parent
 
-def get_file_path():
-    # Creating a temporary root window for file dialog
-    temp_root = tk.Tk()
-    temp_root.withdraw()  # Hide the temporary root window
-    file_path = filedialog.askopenfilename(
+def ask_file_path():
+    """
+    Ask for a workbook or database; returns '' if the dialog is cancelled.
+    """
+    return filedialog.askopenfilename(
+        parent=root,
         title="Select a spreadsheet file",
-        filetypes=(("Excel files", "*.xlsx"), ("All files", "*.*"))
+        filetypes=(("Excel files", "*.xlsx"), ("SQLite databases", " ".join(f"*{suffix}" for suffix in SQLITE_SUFFIXES)), ("All files", "*.*"))
     )
-    temp_root.destroy()  # Destroy the temporary root window to clean up
+
+
+def get_file_path():
+    """
+    The workbook opened last time (from config.py) if it still exists, otherwise ask for one.
+    config.py may also hold an inventory service URL with its token (see inventory_client.py).
+    """
+    file_path = load_config()
+    if file_path and (is_service_url(file_path) or Path(file_path).exists()):
+        return file_path
+    file_path = ask_file_path()
     if not file_path:
         tk.messagebox.showerror("Error", "No file selected. Exiting application.")
         raise SystemExit  # Exit the application if no file is selected
+    save_config(file_path)  # Remember it for next start
     return file_path
 
-# Get the workbook path from user
-workbook_path = get_file_path()
-save_config(workbook_path)  # Save the path to the config file immediately after getting it
-workbook = load_workbook(workbook_path)
+# Hot-path timings and counters are exported on a timer (and once more at exit, after the final save)
+metrics_exporter = None
+if METRICS_EXPORT_FILE:
+    metrics_exporter = MetricsExporter(script_directory / METRICS_EXPORT_FILE, METRICS_EXPORT_INTERVAL)
+    metrics_exporter.start()
+    atexit.register(metrics_exporter.close)
+
+# Workbook (journalled, recovered on open) or SQLite database, chosen by file extension. It is
+# opened on a background thread once the window is up (see start_loading()); until then this is None.
+inventory = None
+load_queue = queue.Queue()  # ('preview', (location, rows)) / ('ready', Inventory) / ('error', exception)
+
+# The writer thread only queues its status; the Tk thread picks it up in poll_save_status()
+save_status_queue = queue.Queue()
 
 def ensure_threshold_column():
     """
     Ensure each inventory sheet has a 'Threshold' column. Add it if missing.
     """
     try:
-        for sheet_name in ['4.2_Items', 'BR_Items', 'Darwin_Items']:
-            if sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                max_col = sheet.max_column
-                header_row = [sheet.cell(row=1, column=col).value for col in range(1, max_col + 1)]
-
-                if 'Threshold' not in header_row:
-                    sheet.cell(row=1, column=max_col + 1, value='Threshold')
-                    for row in range(2, sheet.max_row + 1):
-                        sheet.cell(row=row, column=max_col + 1, value=10)  # Default threshold value
-                    workbook.save(workbook_path)
-                    logging.info(f"Added 'Threshold' column to {sheet_name}.")
+        for sheet_name in inventory.ensure_thresholds(THRESHOLD_LOCATIONS, default=DEFAULT_THRESHOLD):
+            logging.info(f"Added 'Threshold' column to {sheet_name}.")
     except Exception as e:
         logging.error(f"Error ensuring 'Threshold' column: {e}")
         tk.messagebox.showerror("Error", f"Failed to add 'Threshold' column: {e}")
 
 
-all_sans_sheet = workbook['All_SANs']
+# Location button -> storage location code (see storage.LOCATION_SHEETS for the sheets behind each)
 sheets = {
-    'original': ('4.2_Items', '4.2_Timestamps'),
-    'backup': ('BR_Items', 'BR_Timestamps'),
-    'L17': ('L17_Items', 'L17_Timestamps'),
-    'B4.3': ('B4.3_Items', 'B4.3_Timestamps'),
-    'Darwin': ('Darwin_Items', 'Darwin_Timestamps')
+    'original': '4.2',
+    'backup': 'BR',
+    'L17': 'L17',
+    'B4.3': 'B4.3',
+    'Darwin': 'Darwin'
 }
 
-current_sheets = sheets['original']
+current_location = sheets['original']
+
+LOG_PAGE_SIZE = 200  # Log rows drawn per page; more are fetched as the view scrolls to the bottom
+LOG_FILTER_DEBOUNCE_MS = 250  # Wait for typing to pause before filtering the log view
+
+SAN_SEARCH_DEBOUNCE_MS = 250  # Wait for typing to pause before searching "SANs In Stock"
+SAN_SEARCH_CHUNK = 200  # Search results inserted per event-loop turn
 
 style = ttk.Style()
 style.configure("Treeview", font=('Helvetica', 12,))
 
 vcmd = (root.register(lambda P: P.isdigit() or P == ""), '%P')
-class SANInputDialog(tk.Toplevel):
-    def __init__(self, parent, title=None):
+class SANBatchDialog(tk.Toplevel):
+    """
+    Scan panel for SAN-tracked items. SANs are scanned (or typed, Enter after
+    each) into a list that is checked as a whole against itself and All_SANs;
+    Commit writes the batch, its log rows and the count change in one go.
+    """
+
+    def __init__(self, parent, item, operation, location, expected):
         super().__init__(parent)
         self.transient(parent)
-        self.title(title)
-        self.parent = parent
-        self.result = None
+        self.title(f"{'Add' if operation == 'add' else 'Remove'} SANs - {item}")
+        self.geometry("450x500")
+        self.item = item
+        self.operation = operation
+        self.location = location
+        self.expected = expected
+        self.san_numbers = []
+        self.problems = []
+        self.logged = []  # [(log index, log row)] once committed
         self.create_widgets()
         self.grab_set()
-        # Center the dialog window on the parent
-        self.geometry(f"+{parent.winfo_rootx() + parent.winfo_width() // 2 - 100}+{parent.winfo_rooty() + parent.winfo_height() // 2 - 50}")
-        self.after(10, self.focus_entry)  # Ensure the entry field gets focus
+        self.after(10, self.entry.focus_force)
         self.wait_window(self)
 
     def create_widgets(self):
-        # Input field
-        self.entry = ttk.Entry(self, validate="key", validatecommand=vcmd)
-        self.entry.pack(padx=5, pady=5)
-        self.entry.bind("<Return>", lambda _: self.on_submit())  # Bind Enter key to submit action
+        self.summary = tk.Label(self, font=("Helvetica", 12))
+        self.summary.pack(pady=5)
 
-        # Buttons frame
-        button_frame = tk.Frame(self)
-        button_frame.pack(pady=5)
+        self.entry = ttk.Entry(self)
+        self.entry.pack(fill='x', padx=10, pady=5)
+        self.entry.bind("<Return>", lambda _: self.on_scan())  # Scanners send Enter after each code
 
-        # Submit button
-        submit_button = ttk.Button(button_frame, text="Submit", command=self.on_submit)
-        submit_button.pack(side='left', padx=5)
+        self.scan_tree = ttk.Treeview(self, columns=("SAN", "Status"), show="headings", height=12)
+        self.scan_tree.heading("SAN", text="SAN", anchor='w')
+        self.scan_tree.heading("Status", text="Status", anchor='w')
+        self.scan_tree.column("SAN", width=120, stretch=False)
+        self.scan_tree.tag_configure('problem', foreground='red')
+        self.scan_tree.pack(expand=True, fill='both', padx=10, pady=5)
 
-        # Cancel button
-        cancel_button = ttk.Button(button_frame, text="Cancel", command=self.on_cancel)
-        cancel_button.pack(side='left', padx=5)
+        button_frame = tk.Frame(self)
+        button_frame.pack(pady=5)
+        ttk.Button(button_frame, text="Remove Selected", command=self.on_remove_selected).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Remove Flagged", command=self.on_remove_flagged).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Commit", command=self.on_commit).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.destroy).pack(side='left', padx=5)
+        self.refresh()
 
-    def focus_entry(self):
+    def refresh(self):
         """
-        Force the focus to the entry field.
+        Re-validates the whole batch and redraws the list.
         """
-        self.entry.focus_force()
-
-    def on_submit(self):
-        san_input = self.entry.get()
-        if san_input and len(san_input) >= 5 and len(san_input) <= 6:
-            self.result = san_input
+        self.problems = inventory.check_sans(self.item, self.operation, self.san_numbers)
+        self.scan_tree.delete(*self.scan_tree.get_children())
+        for san_number, problem in zip(self.san_numbers, self.problems):
+            self.scan_tree.insert('', 'end', values=(san_number, problem or "OK"), tags=(('problem',) if problem else ()))
+        flagged = sum(1 for problem in self.problems if problem)
+        self.summary.configure(text=f"Scanned {len(self.san_numbers)} of {self.expected}"
+                                    + (f" - {flagged} flagged" if flagged else ""))
+        children = self.scan_tree.get_children()
+        if children:
+            self.scan_tree.see(children[-1])
+
+    def on_scan(self):
+        san_input = self.entry.get().strip().upper()
+        self.entry.delete(0, 'end')
+        if not san_input:
+            return
+        if not is_valid_san(san_input):
+            tk.messagebox.showerror("Error", f"'{san_input}' is not a valid SAN number.", parent=self)
+            self.after(10, self.entry.focus_force)
+            return
+        self.san_numbers.append(normalise_san(san_input))
+        count('san.scanned')
+        self.refresh()
+
+    def on_remove_selected(self):
+        selected = set(self.scan_tree.selection())
+        self.san_numbers = [san_number for iid, san_number in zip(self.scan_tree.get_children(), self.san_numbers)
+                            if iid not in selected]
+        self.refresh()
+
+    def on_remove_flagged(self):
+        self.san_numbers = [san_number for san_number, problem in zip(self.san_numbers, self.problems) if not problem]
+        self.refresh()
+
+    def on_commit(self):
+        if not self.san_numbers:
             self.destroy()
-        else:
-            tk.messagebox.showerror("Error", "Please enter a valid SAN number.", parent=self)
-            self.after(10, self.focus_entry)  # Reapply focus after showing an error
-
-    def on_cancel(self):
-        self.result = None
+            return
+        if any(self.problems):
+            tk.messagebox.showerror("Error", "Remove or fix the flagged SANs before committing.", parent=self)
+            return
+        try:
+            self.logged = inventory.commit_sans(self.location, self.item, self.operation, self.san_numbers)
+        except Exception as e:
+            logging.error(f"Failed to commit SAN batch: {e}")
+            tk.messagebox.showerror("Error", f"Failed to commit SAN batch: {e}", parent=self)
+            return
+        logging.info(f"Committed {len(self.san_numbers)} SANs ({self.operation}) for {self.item} at {self.location}")
         self.destroy()
 
 
-
-
-def is_san_unique(san_number):
-    # Adjust the search to account for the 'SAN' prefix properly
-    search_string = "SAN" + san_number if not san_number.startswith("SAN") else san_number
-    unique = all(search_string != row[0] for row in all_sans_sheet.iter_rows(min_row=2, values_only=True))
-    print(f"Checking SAN {search_string}: Unique - {unique}")  # Debug print
-    return unique
-
-
-def show_san_input():
-    dialog = SANInputDialog(root, "Enter SAN Number")
-    return dialog.result
-
 frame = ctk.CTkFrame(root)
 frame.pack(padx=3, pady=3, fill='both', expand=True)
 
@@ -849,64 +1009,177 @@ for col, (text, command) in enumerate(buttons):
     button_widgets.append(btn)
 
 
+# Location currently drawn in the items Treeview, item -> Treeview row id and back
+tree_location = None
+tree_iids = {}
+tree_items = {}
+
+
 def update_treeview():
-    tree.delete(*tree.get_children())
-    workbook = load_workbook(workbook_path)
-    item_sheet = workbook[current_sheets[0]]
-    row_count = 0
-    for row in item_sheet.iter_rows(min_row=2, values_only=True):
-        if row[0] is not None:
-            if row_count % 2 == 0:
-                bg_color = 'white'
-            else:
-                bg_color = '#f0f0f0'
-            tree.insert('', 'end', values=row, tags=('oddrow' if row_count % 2 == 1 else 'evenrow'))
-            tree.tag_configure('oddrow', background='#f0f0f0')
-            tree.tag_configure('evenrow', background='white')
-            row_count += 1
-
-def log_change(item, action, san_number="", timestamp_sheet=None, volume=1):  # Added volume parameter with default value of 1
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    """
+    Draws the current location's items from storage. A location switch redraws
+    every row; otherwise only rows whose counts changed are patched.
+    """
+    global tree_location, tree_iids, tree_items
+    if inventory is None:
+        return  # Still loading; show_preview() may have drawn the first location already
+    location = current_location
+    if tree_location != location:
+        with timer('treeview.items_redraw'):
+            tree.delete(*tree.get_children())
+            inventory.pop_changed(location)  # Full redraw below covers them
+            tree_iids = {}
+            for row_count, row in enumerate(inventory.items(location)):
+                tree_iids[row[0]] = tree.insert('', 'end', values=row, tags=('oddrow' if row_count % 2 == 1 else 'evenrow'))
+            tree_items = {iid: item for item, iid in tree_iids.items()}
+            tree_location = location
+        return
+
+    with timer('treeview.items_patch'):
+        for item in inventory.pop_changed(location):
+            if item in tree_iids:
+                tree.item(tree_iids[item], values=inventory.get_item(location, item))
+
+def show_logged_row(location, log_index, log_row):
+    """
+    Puts a just-logged row on top of the log view if that location is shown.
+    """
+    global log_view_shown
+    if log_view_location == location and (not log_view_filter or log_row_matches(log_row, log_view_filter)):
+        # Newest entry goes on top; no need to redraw the rest of the log
+        log_view.insert('', 0, values=log_row, tags=(log_row_tag(log_index),))
+        log_view_shown += 1
+
+
+def log_change(item, action, san_number="", location=None, volume=1):  # Added volume parameter with default value of 1
     try:
-        if timestamp_sheet is not None:
-            san_number = f"SAN{san_number}" if san_number and not san_number.startswith('SAN') else san_number
-            
-            # Conditionally modify the action string to include volume for non-SAN items
-            if san_number == "":
-                action_text = f"{action} {volume}"
-            else:
-                action_text = action
-            
-            timestamp_sheet.append([timestamp, item, action_text, san_number])  # Use action_text instead of action
-            workbook.save(workbook_path)
-            update_log_view()
-            logging.info(f"Logged change: Time: {timestamp}, Item: {item}, Action: {action_text}, SAN: {san_number}")  # Use action_text
+        if location is not None:
+            # The action includes the volume for non-SAN items (see inventory_core.action_text)
+            log_index, log_row = inventory.log_change(location, item, action, san_number, volume)
+            show_logged_row(location, log_index, log_row)
         else:
-            logging.error("No timestamp sheet provided for logging.")
+            logging.error("No location provided for logging.")
     except Exception as e:
         logging.error(f"Failed to log change: {e}")
         tk.messagebox.showerror("Error", f"Failed to log change: {e}")
 
 def switch_sheets(sheet_type):
-    global current_sheets
-    current_sheets = sheets[sheet_type]
+    global current_location
+    current_location = sheets[sheet_type]
+    if inventory is None:
+        tree.delete(*tree.get_children())  # Drop the preview of the other location while loading
     update_treeview()
     update_log_view()
 
+# Location whose log is drawn in the log view and how many of its rows are drawn so far
+log_view_location = None
+log_view_shown = 0
+# Text the log view is filtered on ("" for every row) and whether every matching row is drawn
+log_view_filter = ""
+log_view_done = False
+
+
+def log_row_tag(log_index):
+    # Stripe by chronological position so inserting new rows on top keeps the pattern intact
+    return 'oddrow' if log_index % 2 == 1 else 'evenrow'
+
+
 def update_log_view():
-    if 'log_view' in globals():
+    """
+    Shows the newest page of the current location's log. Does nothing if that
+    log is already drawn; log_change() inserts new entries itself.
+    """
+    global log_view_location, log_view_shown, log_view_done
+    if 'log_view' in globals() and inventory is not None and log_view_location != current_location:
         log_view.delete(*log_view.get_children())
-        log_sheet = workbook[current_sheets[1]]
-        all_rows = list(log_sheet.iter_rows(min_row=2, values_only=True))
-        # Adjust the sorting to use the first column (timestamp)
-        sorted_rows = sorted(all_rows, key=lambda r: datetime.strptime(r[0], "%Y-%m-%d %H:%M:%S") if r[0] else datetime.min, reverse=True)
-        row_count = 0
-        for row in sorted_rows:
-            if row[0] is not None:
-                log_view.insert('', 'end', values=row, tags=('oddrow' if row_count % 2 == 1 else 'evenrow'))
-                log_view.tag_configure('oddrow', background='#f0f0f0')
-                log_view.tag_configure('evenrow', background='white')
-                row_count += 1
+        log_view_location = current_location
+        log_view_shown = 0
+        log_view_done = False
+        load_more_log_rows()
+
+
+def load_more_log_rows():
+    """
+    Appends the next page of older rows (or rows matching the filter) to the
+    bottom of the log view. Past the live rows the pages come from the
+    monthly log archives.
+    """
+    global log_view_shown, log_view_done
+    if log_view_location is None or log_view_done:
+        return
+    with timer('treeview.log_page'):
+        if log_view_filter:
+            page = inventory.search_log(log_view_location, log_view_filter, log_view_shown, LOG_PAGE_SIZE)
+            log_view_done = len(page) < LOG_PAGE_SIZE
+        else:
+            page = inventory.log_page(log_view_location, log_view_shown, LOG_PAGE_SIZE)
+            log_view_done = log_view_shown + len(page) >= inventory.log_count(log_view_location)
+        for log_index, row in page:
+            log_view.insert('', 'end', values=row, tags=(log_row_tag(log_index),))
+            log_view_shown += 1
+
+
+def redraw_log_view():
+    """
+    Draws the current location's log again from the newest row.
+    """
+    global log_view_location
+    log_view_location = None
+    update_log_view()
+
+
+log_filter_pending = None
+
+
+def on_log_filter(*args):
+    """
+    Filters the log view on the text typed, once typing pauses.
+    """
+    global log_filter_pending
+
+    def apply_filter():
+        global log_view_filter, log_filter_pending
+        log_filter_pending = None
+        log_view_filter = log_filter_var.get().strip()
+        redraw_log_view()
+
+    if log_filter_pending is not None:
+        root.after_cancel(log_filter_pending)
+    log_filter_pending = root.after(LOG_FILTER_DEBOUNCE_MS, apply_filter)
+
+
+def archive_old_log_rows():
+    """
+    Moves log rows older than a number of days into the monthly archive files
+    next to the spreadsheet. The log view keeps showing them.
+    """
+    if inventory is None:
+        return
+    keep_days = simpledialog.askinteger("Archive Old Log Rows", "Keep how many days of log in the spreadsheet?",
+                                        initialvalue=DEFAULT_KEEP_DAYS, minvalue=1, parent=root)
+    if keep_days is None:
+        return
+    if not tk.messagebox.askyesno("Archive Old Log Rows",
+                                  f"Move log rows older than {keep_days} days into monthly archive files?"):
+        return
+    try:
+        with timer('ui.archive_logs'):
+            moved = inventory.archive_logs(keep_days)
+    except Exception as e:
+        logging.error(f"Failed to archive log rows: {e}")
+        tk.messagebox.showerror("Error", f"Failed to archive log rows: {e}")
+        return
+    redraw_log_view()
+    tk.messagebox.showinfo("Archive Old Log Rows", f"Archived {sum(moved.values())} log rows.")
+
+
+def on_log_view_scroll(first, last):
+    """
+    Scrollbar callback for the log view: fetch another page near the bottom.
+    """
+    scrollbar_log.set(first, last)
+    if float(last) > 0.95:
+        root.after_idle(load_more_log_rows)
 
 
 def update_count(operation):
@@ -914,98 +1187,44 @@ def update_count(operation):
     Updates the inventory count and handles SAN addition/removal, including logging
     and updating the location in the 'All_SANs' sheet.
     """
-    selected_item = tree.item(tree.focus())['values'][0] if tree.focus() else None
+    if inventory is None:
+        return  # Still loading
+    # Take the item name from the model rather than the Treeview's Tcl-converted values
+    selected_item = tree_items.get(tree.focus()) if tree.focus() else None
     if selected_item:
         input_value = entry_value.get()
         if input_value.isdigit():
             input_value = int(input_value)
-            item_sheet = workbook[current_sheets[0]]
-            timestamp_sheet = workbook[current_sheets[1]]
-            san_required = any(g in selected_item for g in ["G8", "G9", "G10"])
-
-            entered_sans_count = 0  # To keep track of successfully entered SAN numbers if needed
-
-            if san_required:
-                # Loop to input each SAN for SAN-required items
-                while entered_sans_count < input_value:
-                    # Small delay to ensure dialog focus is handled correctly
-                    root.after(50)  # Ensures the UI thread processes events between dialogs
-                    san_number = show_san_input()
-                    if san_number is None:  # User cancelled the input
-                        break  # Keep the already entered SANs
-
-                    # Ensure SAN number has the 'SAN' prefix
-                    san_number = "SAN" + san_number if not san_number.startswith("SAN") else san_number
-                    
-                    # Determine the location of the SAN based on the current sheet
-                    location_mapping = {
-                        '4.2_Timestamps': '4.2',
-                        'BR_Timestamps': 'BR',
-                        'Darwin_Timestamps': 'Darwin'
-                    }
-                    current_location = None
-                    for sheet_name, loc in location_mapping.items():
-                        if current_sheets[1] == sheet_name:
-                            current_location = loc
-                            break
-
-                    if operation == 'add':
-                        if is_san_unique(san_number):
-                            # Append the SAN, Item, Timestamp, and Location to the "All_SANs" sheet
-                            all_sans_sheet.append([san_number, selected_item, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), current_location])
-                            # Log each SAN unique number immediately
-                            log_change(selected_item, operation, san_number, timestamp_sheet, volume=1)
-                            workbook.save(workbook_path)
-                            entered_sans_count += 1
-                        else:
-                            tk.messagebox.showerror("Error", "Duplicate or already used SAN number.", parent=root)
-                    elif operation == 'subtract':
-                        # Search for the SAN in all_sans_sheet and remove if found and matches the item
-                        for row in all_sans_sheet.iter_rows(min_row=2):
-                            if row[0].value == san_number and row[1].value == selected_item:
-                                all_sans_sheet.delete_rows(row[0].row)
-                                log_change(selected_item, operation, san_number, timestamp_sheet, volume=1)
-                                workbook.save(workbook_path)
-                                entered_sans_count += 1
-                                break
-                        else:  # Executed if the loop completes without breaking (SAN not found or doesn't match item)
-                            tk.messagebox.showerror("Error", f"SAN number {san_number} does not match the selected item.", parent=root)
-
-            for row in item_sheet.iter_rows(min_row=2):
-                if row[0].value == selected_item:
-                    row[1].value = row[2].value or 0  # Update LastCount to the current NewCount
-                    if operation == 'add':
-                        row[2].value = (row[2].value or 0) + (input_value if not san_required else entered_sans_count)
-                    elif operation == 'subtract':
-                        row[2].value = max((row[2].value or 0) - (input_value if not san_required else entered_sans_count), 0)
-
-            # Log volume for non-SAN items or after all entered SANs
-            if (san_required and entered_sans_count > 0) or not san_required:
-                volume_to_log = input_value if not san_required else entered_sans_count
-                log_change(selected_item, operation, "", timestamp_sheet, volume=volume_to_log)
-
-            workbook.save(workbook_path)
+            location = current_location
+            if is_san_item(selected_item):
+                # Scan the SANs into a batch; the panel validates and commits them together
+                batch_panel = SANBatchDialog(root, selected_item, operation, location, input_value)
+                for log_index, log_row in batch_panel.logged:
+                    show_logged_row(location, log_index, log_row)
+            else:
+                # Update LastCount to the current NewCount, apply the change and log it
+                try:
+                    with timer('ui.update_count'):
+                        log_index, log_row = inventory.update_count(location, selected_item, operation, input_value)
+                except InventoryError as e:
+                    tk.messagebox.showerror("Error", str(e))
+                else:
+                    show_logged_row(location, log_index, log_row)
+
             update_treeview()
             update_log_view()
 
         # **Add this line to refocus on the entry field after processing**
         entry_value.focus_set()
 
-def check_restock_threshold(threshold=10):
+def check_restock_threshold():
     """
     Display items that need restocking based on individual thresholds.
     """
     try:
-        low_stock_items = []
-
-        # Iterate through sheets to check against thresholds
-        for sheet_name in ['4.2_Items', 'BR_Items', 'Darwin_Items']:
-            if sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    item, _, new_count, item_threshold = row[:4]  # Adjust columns as necessary
-                    if new_count is not None and item_threshold is not None and new_count < item_threshold:
-                        low_stock_items.append((sheet_name, item, new_count, item_threshold))
+        # Read the restock engine's set of items below threshold at every location (no sheet scan)
+        low_stock_items = [(LOCATION_SHEETS[location][0], item, new_count, item_threshold)
+                           for location, item, new_count, item_threshold in inventory.low_stock()]
 
         # Display results
         if low_stock_items:
@@ -1044,6 +1263,8 @@ for col in columns:
     tree.column("Item", anchor='w', width=250, stretch=False)
     tree.column("LastCount", anchor='w', width=175, stretch=False)
 tree.pack(expand=True, fill="both", padx=2, pady=2)  # Minimal padding
+tree.tag_configure('oddrow', background='#f0f0f0')
+tree.tag_configure('evenrow', background='white')
 
 # Controls frame
 controls_frame = ctk.CTkFrame(root)
@@ -1053,6 +1274,15 @@ controls_frame.pack(pady=2, fill="x")  # Minimal vertical padding
 entry_controls_frame = ctk.CTkFrame(controls_frame)
 entry_controls_frame.pack(pady=2, anchor="center")  # Tighter vertical packing
 
+# Save status indicator (dirty / saving / saved / error)
+save_status_label = ctk.CTkLabel(controls_frame, text="All changes saved", font=("Helvetica", 11), text_color="gray")
+save_status_label.pack(pady=(0, 2), anchor="center")
+
+# Restock alert: the latest item to cross its threshold; click for the full list
+restock_label = ctk.CTkLabel(controls_frame, text="", font=("Helvetica", 11), text_color="gray", cursor="hand2")
+restock_label.pack(pady=(0, 2), anchor="center")
+restock_label.bind("<Button-1>", lambda _: inventory is not None and check_restock_threshold())
+
 # "-" button
 button_subtract = ctk.CTkButton(
     entry_controls_frame,
@@ -1090,6 +1320,14 @@ button_add.pack(side="left", padx=2)  # Minimal horizontal padding
 log_view_frame = ctk.CTkFrame(root)
 log_view_frame.pack(side=tk.BOTTOM, fill='both', expand=True, padx=2, pady=2)  # Minimal margins
 
+# Filter entry above the log; matches any column, including archived rows
+log_filter_frame = ctk.CTkFrame(log_view_frame)
+log_filter_frame.pack(side='top', fill='x')
+ctk.CTkLabel(log_filter_frame, text="Filter:").pack(side='left', padx=(4, 2))
+log_filter_var = tk.StringVar()
+ctk.CTkEntry(log_filter_frame, textvariable=log_filter_var, width=220).pack(side='left', padx=2, pady=2)
+log_filter_var.trace("w", on_log_filter)
+
 # Log Treeview
 log_view_columns = ("Timestamp", "Item", "Action", "SAN Number")
 log_view = ttk.Treeview(log_view_frame, columns=log_view_columns, show="headings", style="Treeview", height=15)
@@ -1101,7 +1339,9 @@ for col in log_view_columns:
 
 scrollbar_log = ttk.Scrollbar(log_view_frame, orient="vertical", command=log_view.yview)
 scrollbar_log.pack(side='right', fill='y')
-log_view.configure(yscrollcommand=scrollbar_log.set)
+log_view.configure(yscrollcommand=on_log_view_scroll)
+log_view.tag_configure('oddrow', background='#f0f0f0')
+log_view.tag_configure('evenrow', background='white')
 log_view.pack(expand=True, fill='both')
 
 
@@ -1130,7 +1370,221 @@ def add_copy_option(tree):
 add_copy_option(tree)
 add_copy_option(log_view)
 
-root.after(100, update_treeview)
-update_log_view()
+SAVE_STATUS_DISPLAY = {
+    'dirty': ("Unsaved changes", "orange"),
+    'saving': ("Saving...", "gray"),
+    'saved': ("All changes saved", "gray"),
+    'error': ("Save failed - will retry", "red"),
+}
+
+
+def poll_save_status():
+    """
+    Shows the latest status reported by the background writer and reports save
+    errors to the user. Reschedules itself with root.after.
+    """
+    latest = None
+    try:
+        while True:
+            status, error = save_status_queue.get_nowait()
+            latest = status
+            if error is not None:
+                logging.error(f"Failed to save workbook: {error}")
+                tk.messagebox.showerror("Error", f"Failed to save workbook: {error}\nChanges are kept in the journal and will be saved on the next attempt.")
+    except queue.Empty:
+        pass
+    if latest is not None:
+        text, color = SAVE_STATUS_DISPLAY[latest]
+        save_status_label.configure(text=text, text_color=color)
+    root.after(SAVE_STATUS_POLL_MS, poll_save_status)
+
+
+def on_close():
+    """
+    Save outstanding changes (folds the journal into the workbook) before the window goes away.
+    """
+    try:
+        if inventory is not None:
+            inventory.close()
+    except Exception as e:
+        logging.error(f"Failed to save workbook on exit: {e}")
+        tk.messagebox.showerror("Error", f"Failed to save workbook on exit: {e}\nChanges are kept in the journal and will be recovered next start.")
+    root.destroy()
+
+
+# --- Startup: the window draws first while the workbook loads on a background thread ---
+
+startup_recorded = set()
+
+
+def record_startup(stage):
+    """
+    Record the time from process start to a startup stage ('window',
+    'first_items', 'ready') once, as the startup.<stage> metric.
+    """
+    if stage in startup_recorded:
+        return
+    startup_recorded.add(stage)
+    elapsed = time.perf_counter() - STARTUP_START
+    METRICS.observe(f"startup.{stage}", elapsed)
+    logging.info(f"Startup: {stage} after {elapsed * 1000:.0f} ms")
+
+
+def load_inventory(path, location):
+    """
+    Loader thread: queue a preview of `location`'s items as soon as its sheet
+    is read, then the fully opened Inventory (or the error). If an inventory
+    service has the workbook open, the GUI becomes one of its clients.
+    """
+    try:
+        rows = preview_items(path, location) if not is_service_url(path) else None
+        if rows is not None:
+            load_queue.put(('preview', (location, rows)))
+    except Exception as e:
+        logging.warning(f"No quick preview of {path}: {e}")
+    try:
+        load_queue.put(('ready', open_inventory(path, compact_interval=JOURNAL_COMPACT_INTERVAL, save_delay=SAVE_DELAY)))
+    except Exception as e:
+        load_queue.put(('error', e))
+
+
+def set_controls_state(state):
+    for widget in (button_add, button_subtract):
+        widget.configure(state=state)
+    menu_bar.entryconfig("Options", state=state)
+
+
+def start_loading(path):
+    """
+    Open a workbook or database in the background; the controls stay disabled until it is ready.
+    """
+    global inventory, tree_location, log_view_location
+    inventory = None
+    tree_location = log_view_location = None
+    tree.delete(*tree.get_children())
+    log_view.delete(*log_view.get_children())
+    set_controls_state("disabled")
+    save_status_label.configure(text=f"Loading {Path(path).name}...", text_color="gray")
+    threading.Thread(target=load_inventory, args=(path, current_location), name="workbook-loader", daemon=True).start()
+    root.after(LOAD_POLL_MS, poll_loading)
+
+
+def show_preview(location, rows):
+    """
+    Draw items read straight from the sheet while the full load continues.
+    """
+    if inventory is not None or location != current_location:
+        return
+    for row_count, row in enumerate(rows):
+        tree.insert('', 'end', values=row, tags=('oddrow' if row_count % 2 == 1 else 'evenrow'))
+    record_startup('first_items')
+
+
+def show_restock_event(event):
+    """
+    Restock listener: show an item crossing its threshold under the count controls.
+    Changes are made on the Tk thread, so this runs there too.
+    """
+    kind, location, item, new_count, item_threshold = event
+    below = f"{len(inventory.restock)} items below threshold"
+    if kind == LOW:
+        restock_label.configure(text=f"Low stock: {item} in {LOCATION_SHEETS[location][0]} "
+                                     f"({new_count}, threshold {item_threshold}) - {below}", text_color="orange")
+        root.bell()
+    else:
+        restock_label.configure(text=f"Restocked: {item} in {LOCATION_SHEETS[location][0]} - {below}", text_color="gray")
+
+
+def on_inventory_loaded(loaded):
+    global inventory
+    inventory = loaded
+    inventory.start(on_status=lambda status, error: save_status_queue.put((status, error)))
+    inventory.restock.subscribe(show_restock_event)
+    restock_label.configure(text=f"{len(inventory.restock)} items below threshold" if len(inventory.restock) else "",
+                            text_color="gray")
+    tree.delete(*tree.get_children())  # Redrawn from the loaded model (the preview may be a row or two behind)
+    update_treeview()
+    update_log_view()
+    set_controls_state("normal")
+    save_status_label.configure(text=SAVE_STATUS_DISPLAY['saved'][0], text_color=SAVE_STATUS_DISPLAY['saved'][1])
+    if inventory.backend == 'service':
+        save_status_label.configure(text=f"Connected to the inventory service at {inventory.url}", text_color="gray")
+        root.after(SERVICE_POLL_MS, poll_service_changes, inventory)
+    record_startup('first_items')
+    record_startup('ready')
+
+
+def poll_service_changes(client):
+    """
+    Shows counts changed and rows logged by other stations using the inventory
+    service. Reschedules itself while `client` is the open inventory.
+    """
+    global tree_location
+    if inventory is not client:
+        return  # Switched spreadsheet
+    try:
+        if not client.sync():
+            # Too far behind to patch: draw both views again
+            tree_location = None
+            redraw_log_view()
+        for location, log_index, log_row in client.pop_logged():
+            show_logged_row(location, log_index, log_row)
+        update_treeview()
+    except ServiceError as e:
+        logging.warning(f"Inventory service not reachable: {e}")
+        save_status_label.configure(text="Inventory service not reachable - retrying", text_color="red")
+    else:
+        save_status_label.configure(text=f"Connected to the inventory service at {client.url}", text_color="gray")
+    root.after(SERVICE_POLL_MS, poll_service_changes, client)
+
+
+def poll_loading():
+    """
+    Picks up the loader thread's results on the Tk thread. Reschedules itself until the load finishes.
+    """
+    try:
+        while True:
+            kind, payload = load_queue.get_nowait()
+            if kind == 'preview':
+                show_preview(*payload)
+            elif kind == 'ready':
+                on_inventory_loaded(payload)
+                return
+            else:
+                logging.error(f"Failed to open the spreadsheet: {payload}")
+                tk.messagebox.showerror("Error", f"Failed to open the spreadsheet: {payload}")
+                file_path = ask_file_path()
+                if not file_path:
+                    root.destroy()
+                    return
+                save_config(file_path)
+                start_loading(file_path)
+                return
+    except queue.Empty:
+        pass
+    root.after(LOAD_POLL_MS, poll_loading)
+
+
+def switch_spreadsheet():
+    """
+    Save and close the current workbook or database and load another one (remembered for next start).
+    """
+    file_path = ask_file_path()
+    if not file_path or inventory is None:
+        return
+    try:
+        inventory.close()
+    except Exception as e:
+        logging.error(f"Failed to save workbook: {e}")
+        tk.messagebox.showerror("Error", f"Failed to save workbook: {e}")
+        return
+    save_config(file_path)
+    start_loading(file_path)
+
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+root.after(SAVE_STATUS_POLL_MS, poll_save_status)
+root.after_idle(record_startup, 'window')
+start_loading(get_file_path())
 
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,568 @@
+# Client of the local inventory service (inventory_service.py).
+#
+# RemoteInventory has the methods of inventory_core.Inventory that the GUI
+# and scanning stations use, carried out by the service, so the GUI runs
+# unchanged against it. Rejected changes raise InventoryError as they would
+# locally. sync() reads the service's change feed: counts changed and rows
+# logged by other clients come back through pop_changed() and pop_logged(),
+# and threshold crossings reach restock listeners.
+#
+# open_inventory() is how the GUI opens a path: a service URL, or a workbook
+# that a running service already has open, gives a RemoteInventory; anything
+# else is opened directly.
+#
+# Every request carries the service's token. For a workbook it is read from
+# the .service.json file next to it; a URL given by hand (config.py, --url)
+# carries it as http://127.0.0.1:8765/?token=... (see inventory_service.py).
+#
+# Usage:
+#   python inventory_client.py stock --location 4.2
+#   python inventory_client.py count 4.2 "Wired Mouse" subtract 2
+#   python inventory_client.py sans BR "Dell G10 Laptop" add SAN123456 SAN123457
+#   python inventory_client.py batch operations.json
+#   python inventory_client.py loadtest --clients 1,4,16 --batch 1,50   # on a throwaway synthetic workbook
+
+import argparse
+import http.client
+import json
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from inventory_core import LOCATIONS, Inventory, InventoryError, is_san_item, resolve_workbook_path
+from inventory_service import DEFAULT_PORT, SERVICE_HOST, TOKEN_HEADER, encode, serve, service_file_for
+
+CONNECT_TIMEOUT = 0.5  # Seconds to wait for a service found in a .service.json file
+REQUEST_TIMEOUT = 120  # Seconds for one call; archive_logs or an export can take a while
+LOAD_TEST_ROWS = 1000  # Log rows of the throwaway workbook the load test runs against
+SCRATCH_START_TIMEOUT = 120  # Seconds for a throwaway service to open its workbook
+
+
+class ServiceError(RuntimeError):
+    """
+    The service failed a call (not a rejected change) or could not be reached.
+    """
+
+
+def is_service_url(path):
+    return str(path).startswith(('http://', 'https://'))
+
+
+class ServiceConnection:
+    """
+    One keep-alive HTTP connection to the service, safe to share between threads.
+    `token` defaults to the one in the URL's query (?token=...).
+    """
+
+    def __init__(self, url, token=None, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(url)
+        self.url = f"{parts.scheme}://{parts.netloc}"  # Without the token, for display
+        self.token = token or parse_qs(parts.query).get('token', [''])[0]
+        self.lock = threading.Lock()
+        self._connection = http.client.HTTPConnection(parts.hostname, parts.port or DEFAULT_PORT, timeout=timeout)
+
+    def request(self, method, path, payload=None):
+        body = encode(payload) if payload is not None else None
+        headers = {TOKEN_HEADER: self.token}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        with self.lock:
+            try:
+                try:
+                    self._connection.request(method, path, body=body, headers=headers)
+                except (http.client.HTTPException, ConnectionError):
+                    # A kept-alive connection the service has since closed: the request never went out
+                    self._connection.close()
+                    self._connection.request(method, path, body=body, headers=headers)
+                # Not retried once sent: the service may have made the change
+                response = self._connection.getresponse()
+                status, data = response.status, response.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._connection.close()
+                raise ServiceError(f"Inventory service at {self.url} is not reachable: {e}") from e
+        reply = json.loads(data)
+        if status == 400 and reply.get('type') == 'InventoryError':
+            raise InventoryError(reply['error'])
+        if status >= 400:
+            raise ServiceError(f"{reply.get('type', 'Error')}: {reply.get('error')}")
+        return reply
+
+    def close(self):
+        with self.lock:
+            self._connection.close()
+
+
+def find_service(data_path):
+    """
+    (URL, token) of a running service that has `data_path` open, or None.
+    """
+    try:
+        with open(service_file_for(data_path), encoding='utf-8') as service_file:
+            service = json.load(service_file)
+        url, token = service['url'], service['token']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    connection = ServiceConnection(url, token, timeout=CONNECT_TIMEOUT)
+    try:
+        health = connection.request('GET', '/api/health')
+    except ServiceError:
+        return None  # Left behind by a service that didn't shut down cleanly
+    finally:
+        connection.close()
+    return (url, token) if health.get('path') == str(Path(data_path).resolve()) else None
+
+
+def open_inventory(path=None, **storage_options):
+    """
+    A RemoteInventory for a service URL or a workbook a service has open,
+    otherwise Inventory.open(path, **storage_options).
+    """
+    if path and is_service_url(path):
+        return RemoteInventory(path)
+    path = resolve_workbook_path(path)
+    service = find_service(path)
+    if service:
+        return RemoteInventory(*service)
+    return Inventory.open(path, **storage_options)
+
+
+class RemoteRestock:
+    """
+    Stands in for Inventory.restock: the number of items below threshold and
+    listeners for the crossings the service reports.
+    """
+
+    def __init__(self):
+        self.low_count = 0
+        self._listeners = []
+
+    def __len__(self):
+        return self.low_count
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, event):
+        for listener in list(self._listeners):
+            listener(event)
+
+
+class RemoteInventory:
+    """
+    The Inventory API carried out by the inventory service at `url`
+    (`token` as for ServiceConnection).
+    """
+
+    backend = 'service'
+
+    def __init__(self, url=f"http://{SERVICE_HOST}:{DEFAULT_PORT}", token=None):
+        self.connection = ServiceConnection(url, token)
+        self.url = self.connection.url
+        health = self.connection.request('GET', '/api/health')
+        self.path = health['path']
+        self.restock = RemoteRestock()
+        self.restock.low_count = health['low_stock']
+        self._version = health['version']
+        self._changed = {location: {} for location in LOCATIONS}  # location -> item -> row
+        self._fresh_rows = {}  # (location, item) -> row from the feed, used by the next get_item()
+        self._logged = []  # (location, index, row) logged by other clients, oldest first
+        self._own_logged = set()  # (location, index) this client logged, not repeated by pop_logged()
+
+    def call(self, method, **params):
+        return self.connection.request('POST', f"/api/{method}", params)['result']
+
+    def call_batch(self, operations):
+        """
+        Run [(method, params)] on the service in one request and one journal
+        write or transaction. Returns a result per operation, or the
+        InventoryError it was rejected with (not raised).
+        """
+        reply = self.connection.request('POST', '/api/batch', {
+            'operations': [{'method': method, 'params': params} for method, params in operations]})
+        results = []
+        for outcome in reply['results']:
+            if 'error' in outcome:
+                results.append(InventoryError(outcome['error']))
+            else:
+                results.append(outcome['result'])
+        return results
+
+    # --- Change feed ---
+
+    def sync(self):
+        """
+        Pick up changes made through the service since the last call. Returns
+        False if too many were missed to patch the views, which should then
+        be redrawn.
+        """
+        reply = self.connection.request('GET', f"/api/changes?since={self._version}")
+        self._version = reply['version']
+        self.restock.low_count = reply['low_stock']
+        if reply.get('reset'):
+            self._changed = {location: {} for location in LOCATIONS}
+            self._logged.clear()
+            return False
+        for kind, *entry in reply['changes']:
+            if kind == 'item':
+                location, item, row = entry
+                self._changed[location][item] = row
+            elif kind == 'log':
+                location, log_index, row = entry
+                if (location, log_index) in self._own_logged:
+                    self._own_logged.discard((location, log_index))
+                else:
+                    self._logged.append((location, log_index, row))
+            elif kind == 'restock':
+                self.restock.notify(tuple(entry))
+        return True
+
+    def pop_changed(self, location):
+        """
+        Items of `location` whose counts changed since the last call, by any client.
+        """
+        self.sync()
+        changed = self._changed[location]
+        self._changed[location] = {}
+        self._fresh_rows.update(((location, item), row) for item, row in changed.items())
+        return list(changed)
+
+    def pop_logged(self):
+        """
+        (location, chronological index, row) of rows other clients logged since the last call.
+        """
+        logged, self._logged = self._logged, []
+        return logged
+
+    def _own(self, location, logged):
+        self._own_logged.update((location, log_index) for log_index, _ in logged)
+        return logged
+
+    # --- Lifecycle ---
+
+    def start(self, on_status=None):
+        # The service saves; nothing runs here
+        if on_status is not None:
+            on_status('saved', None)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def spreadsheet_path(self):
+        return self.call('spreadsheet_path')
+
+    # --- Item counts ---
+
+    def items(self, location):
+        return [tuple(row) for row in self.call('items', location=location)]
+
+    def get_item(self, location, item):
+        row = self._fresh_rows.pop((location, item), None)
+        if row is None:
+            row = self.call('get_item', location=location, item=item)
+        return tuple(row) if row is not None else None
+
+    def update_count(self, location, item, operation, volume, timestamp=None):
+        log_index, row = self.call('update_count', location=location, item=item, operation=operation,
+                                   volume=volume, timestamp=timestamp)
+        self._own(location, [(log_index, row)])
+        return log_index, row
+
+    # --- Transaction log ---
+
+    def log_change(self, location, item, operation, san_number="", volume=1, timestamp=None):
+        log_index, row = self.call('log_change', location=location, item=item, operation=operation,
+                                   san_number=san_number, volume=volume, timestamp=timestamp)
+        self._own(location, [(log_index, row)])
+        return log_index, row
+
+    def log_count(self, location):
+        return self.call('log_count', location=location)
+
+    def log_page(self, location, start, size):
+        return [tuple(entry) for entry in self.call('log_page', location=location, start=start, size=size)]
+
+    def search_log(self, location, text, start=0, size=200):
+        return [tuple(entry) for entry in self.call('search_log', location=location, text=text, start=start,
+                                                    size=size)]
+
+    def archive_logs(self, keep_days=None, cutoff=None):
+        return self.call('archive_logs', keep_days=keep_days, cutoff=cutoff)
+
+    # --- SAN registry ---
+
+    def is_san_unique(self, san_number):
+        return self.call('is_san_unique', san_number=san_number)
+
+    def get_san(self, san_number):
+        found = self.call('get_san', san_number=san_number)
+        return tuple(found) if found is not None else None
+
+    def all_sans(self):
+        return [tuple(row) for row in self.call('all_sans')]
+
+    def refresh_san_locations(self):
+        return self.call('refresh_san_locations')
+
+    def check_sans(self, item, operation, san_numbers):
+        return self.call('check_sans', item=item, operation=operation, san_numbers=list(san_numbers))
+
+    def commit_sans(self, location, item, operation, san_numbers, timestamp=None):
+        logged = self.call('commit_sans', location=location, item=item, operation=operation,
+                           san_numbers=list(san_numbers), timestamp=timestamp)
+        return self._own(location, [tuple(entry) for entry in logged])
+
+    # --- Thresholds ---
+
+    def ensure_thresholds(self, locations=None, default=None):
+        params = {key: value for key, value in (('locations', locations), ('default', default)) if value is not None}
+        return self.call('ensure_thresholds', **params)
+
+    def set_threshold(self, location, item, threshold):
+        self.call('set_threshold', location=location, item=item, threshold=threshold)
+
+    def low_stock(self, locations=None):
+        return [tuple(row) for row in self.call('low_stock', locations=locations)]
+
+    # --- Reports ---
+
+    def movement_totals(self, start=None, end=None, location=None, item=None):
+        return [tuple(row) for row in self.call('movement_totals', start=start, end=end, location=location,
+                                                item=item)]
+
+    def movement_series(self, period='week', start=None, end=None, location=None, item=None):
+        return [tuple(row) for row in self.call('movement_series', period=period, start=start, end=end,
+                                                location=location, item=item)]
+
+    def consumption_forecast(self, window_days=None, as_of=None, locations=None):
+        import pandas as pd  # Imported on first use: it is slow to import
+
+        frame = self.call('consumption_forecast', window_days=window_days, as_of=as_of, locations=locations)
+        return pd.DataFrame(frame['data'], columns=frame['columns'])
+
+    # --- SAN returns ---
+
+    def san_returns(self):
+        return [tuple(row) for row in self.call('san_returns')]
+
+    def add_san_return(self, san, gen, returned_by, returned_to, notes="", timestamp=None):
+        self.call('add_san_return', san=san, gen=gen, returned_by=returned_by, returned_to=returned_to, notes=notes,
+                  timestamp=timestamp)
+
+
+# --- Load test ---
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+@contextmanager
+def scratch_service(rows=LOAD_TEST_ROWS, seed=0):
+    """
+    Serve a synthetic workbook of `rows` log rows in a temporary directory,
+    on any free port, for as long as the block runs. Yields (url, token).
+    """
+    from synthetic_workbook import generate_workbook  # Imported on first use: only the load test needs it
+
+    with tempfile.TemporaryDirectory(prefix='inventory-loadtest-') as directory:
+        path = Path(directory) / "loadtest.xlsx"
+        generate_workbook(path, rows, seed=seed)
+        ready = threading.Event()
+        failed = []
+
+        def run():
+            try:
+                serve(path, port=0, on_ready=lambda url: ready.set())
+            except Exception as e:
+                failed.append(e)
+                ready.set()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        if not ready.wait(SCRATCH_START_TIMEOUT) or failed:
+            raise ServiceError(f"Throwaway inventory service did not start: {failed[0] if failed else 'timed out'}")
+        service = find_service(path)
+        try:
+            yield service
+        finally:
+            with RemoteInventory(*service) as inventory:
+                inventory.connection.request('POST', '/api/shutdown', {})
+            thread.join()
+
+
+def load_test(url, clients=4, ops=2000, batch_size=1, seed=0, token=None):
+    """
+    `clients` threads, each with its own connection, make `ops` count changes
+    between them (adds and subtracts in turn), `batch_size` per request.
+    Returns ops/sec and request latencies. The changes and their log rows are
+    real: run it on a scratch_service() or a copy, never on live data.
+    """
+    probe = RemoteInventory(url, token)
+    targets = [(location, row[0]) for location in LOCATIONS for row in probe.items(location)
+               if row[0] and not is_san_item(str(row[0]))]
+    probe.close()
+    if not targets:
+        raise ValueError("No counted (non-SAN) items to change")
+
+    per_client = max(ops // clients, 1)
+    latencies, errors = [], []
+    results_lock = threading.Lock()
+    start_line = threading.Barrier(clients + 1)
+
+    def run_client(number):
+        rng = random.Random(seed * 1000 + number)
+        inventory = RemoteInventory(url, token)
+        plan = [(*rng.choice(targets), 'add' if op % 2 == 0 else 'subtract') for op in range(per_client)]
+        own_latencies, own_errors = [], 0
+        start_line.wait()
+        for first in range(0, len(plan), batch_size):
+            chunk = plan[first:first + batch_size]
+            started = time.perf_counter()
+            if batch_size == 1:
+                location, item, operation = chunk[0]
+                try:
+                    inventory.update_count(location, item, operation, 1)
+                except InventoryError:
+                    own_errors += 1  # A subtract from zero
+            else:
+                outcomes = inventory.call_batch([('update_count', {'location': location, 'item': item,
+                                                                   'operation': operation, 'volume': 1})
+                                                 for location, item, operation in chunk])
+                own_errors += sum(isinstance(outcome, InventoryError) for outcome in outcomes)
+            own_latencies.append(time.perf_counter() - started)
+        inventory.close()
+        with results_lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+
+    threads = [threading.Thread(target=run_client, args=(number,), daemon=True) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_line.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = per_client * clients
+    return {'clients': clients, 'batch_size': batch_size, 'ops': total, 'seconds': elapsed,
+            'ops_per_sec': total / elapsed if elapsed > 0 else None, 'rejected': sum(errors),
+            'p50_ms': _percentile(latencies, 0.5) * 1000, 'p95_ms': _percentile(latencies, 0.95) * 1000}
+
+
+# --- Command line ---
+
+def _print_rows(rows):
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def _run_load_tests(args, url, token):
+    print(f"{'clients':>7} {'batch':>6} {'ops/s':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for clients in (int(value) for value in args.clients.split(',')):
+        for batch_size in (int(value) for value in args.batch.split(',')):
+            result = load_test(url, clients, args.ops, batch_size, token=token)
+            print(f"{clients:>7} {batch_size:>6} {result['ops_per_sec']:>10,.0f} "
+                  f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talk to the local inventory service.")
+    parser.add_argument("--url", help="Service URL with its token, http://127.0.0.1:PORT/?token=... "
+                                      "(default: the service that has --file open)")
+    parser.add_argument("--file", help="Workbook or database the service has open (default: the GUI's last spreadsheet)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stock = commands.add_parser('stock', help="Item counts (or only the items below threshold with --low)")
+    stock.add_argument('--location', action='append', choices=LOCATIONS)
+    stock.add_argument('--low', action='store_true')
+
+    count_command = commands.add_parser('count', help="Add or subtract units of a counted item")
+    count_command.add_argument('location', choices=LOCATIONS)
+    count_command.add_argument('item')
+    count_command.add_argument('operation', choices=['add', 'subtract'])
+    count_command.add_argument('volume', type=int)
+
+    sans = commands.add_parser('sans', help="Add or remove scanned SANs of a G8/G9/G10 item")
+    sans.add_argument('location', choices=LOCATIONS)
+    sans.add_argument('item')
+    sans.add_argument('operation', choices=['add', 'subtract'])
+    sans.add_argument('san_numbers', nargs='+')
+
+    threshold = commands.add_parser('threshold', help="Set an item's restock threshold")
+    threshold.add_argument('location', choices=LOCATIONS)
+    threshold.add_argument('item')
+    threshold.add_argument('threshold', type=int)
+
+    batch = commands.add_parser('batch', help="Run a JSON list of {method, params} in one request")
+    batch.add_argument('operations_file')
+
+    loadtest = commands.add_parser('loadtest', help="Count changes per second with several clients at once, on "
+                                                    "a throwaway synthetic workbook unless --url is given")
+    loadtest.add_argument('--clients', default='1,4,16', help="Comma-separated client counts")
+    loadtest.add_argument('--batch', default='1,50', help="Comma-separated operations per request")
+    loadtest.add_argument('--ops', type=int, default=2000, help="Operations per run")
+    loadtest.add_argument('--rows', type=int, default=LOAD_TEST_ROWS, help="Log rows of the throwaway workbook")
+
+    args = parser.parse_args()
+    if args.command == 'loadtest':
+        # Never the GUI's spreadsheet: the load test makes real changes and logs them
+        try:
+            if args.url:
+                _run_load_tests(args, args.url, None)
+            else:
+                print(f"Load testing a throwaway service on a {args.rows:,}-row synthetic workbook")
+                with scratch_service(args.rows) as (url, token):
+                    _run_load_tests(args, url, token)
+        except (InventoryError, ServiceError) as e:
+            raise SystemExit(f"error: {e}")
+        return
+
+    if args.url:
+        service = (args.url, None)
+    else:
+        service = find_service(resolve_workbook_path(args.file))
+        if service is None:
+            raise SystemExit(f"error: no inventory service has {resolve_workbook_path(args.file)} open; "
+                             f"start inventory_service.py or pass --url")
+    url, token = service
+
+    try:
+        with RemoteInventory(url, token) as inventory:
+            if args.command == 'stock':
+                if args.low:
+                    _print_rows(inventory.low_stock(args.location))
+                for location in ([] if args.low else args.location or LOCATIONS):
+                    _print_rows((location, *row) for row in inventory.items(location))
+            elif args.command == 'count':
+                _print_rows([inventory.update_count(args.location, args.item, args.operation, args.volume)[1]])
+            elif args.command == 'sans':
+                _print_rows(row for _, row in inventory.commit_sans(args.location, args.item, args.operation,
+                                                                     args.san_numbers))
+            elif args.command == 'threshold':
+                inventory.set_threshold(args.location, args.item, args.threshold)
+            elif args.command == 'batch':
+                with open(args.operations_file, encoding='utf-8') as operations_file:
+                    operations = [(operation['method'], operation.get('params') or {})
+                                  for operation in json.load(operations_file)]
+                for outcome in inventory.call_batch(operations):
+                    print(f"error: {outcome}" if isinstance(outcome, InventoryError) else json.dumps(outcome, default=str))
+    except (InventoryError, ServiceError) as e:
+        raise SystemExit(f"error: {e}")
+
+
+if __name__ == '__main__':
+    main()
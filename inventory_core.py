@@ -0,0 +1,438 @@
+# Headless inventory API for the EUC asset tracker.
+#
+# Everything the GUI does to the inventory (item counts, the SAN registry,
+# the transaction log, thresholds and SAN returns) goes through Inventory,
+# which applies the tracker's rules on top of a storage backend (storage.py)
+# and keeps the restock engine (restock.py) in step with every change.
+# Nothing here imports Tk, so batch jobs, services, the plot scripts, the
+# web-app extractor and the benchmarks run the same code as the GUI.
+#
+# Usage:
+#   from inventory_core import Inventory
+#   with Inventory.open("EUC_Perth_Assets.xlsx") as inventory:
+#       inventory.update_count('4.2', 'Wired Mouse', 'add', 3)
+#       print(inventory.low_stock())
+
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+
+from inventory_model import InventoryModel
+from log_archive import DEFAULT_KEEP_DAYS, archive_logs, cutoff_for
+from restock import RestockIndex
+from san_index import is_valid_san, normalise_san
+from snapshot_cache import SheetSnapshot, read_sheet_rows
+from storage import LOCATION_SHEETS, SQLITE_SUFFIXES, check_san_batch, commit_san_batch, open_storage
+from workbook_journal import fold_path_for, journal_path_for
+
+DEFAULT_WORKBOOK = 'EUC_Perth_Assets.xlsx'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+LOCATIONS = list(LOCATION_SHEETS)
+THRESHOLD_LOCATIONS = ['4.2', 'BR', 'Darwin']  # Locations whose items get a default restock threshold
+DEFAULT_THRESHOLD = 10
+OPERATIONS = ('add', 'subtract')
+LOG_SEARCH_CHUNK = 1000  # Log rows read per page while searching
+
+SAN_GENERATIONS = ("G8", "G9", "G10")  # Items with one of these in their name are tracked by SAN
+ACTION_PATTERN = re.compile(r"^\s*(add|subtract)\b\D*(\d+)?", re.IGNORECASE)
+
+
+class InventoryError(ValueError):
+    """
+    A change the inventory rules don't allow: unknown item, SAN problems,
+    missing fields. The message is meant to be shown to the user.
+    """
+
+
+def now_text():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def is_san_item(item):
+    """
+    True for items whose units are tracked by SAN (the G8/G9/G10 laptops and desktops).
+    """
+    return any(generation in item for generation in SAN_GENERATIONS)
+
+
+def action_text(operation, volume=1, san_number=""):
+    """
+    Action column of a log row: 'add 3' for counted items, plain 'add' for a SAN row.
+    """
+    return operation if san_number else f"{operation} {volume}"
+
+
+def parse_action(text):
+    """
+    (operation, volume) of an Action cell: ('subtract', 3) for 'subtract 3',
+    volume 1 for a bare 'add'/'subtract', None for anything else. Older rows
+    sometimes have more text after the number; it is ignored.
+    """
+    match = ACTION_PATTERN.match(str(text)) if text is not None else None
+    if not match:
+        return None
+    return match.group(1).lower(), int(match.group(2)) if match.group(2) else 1
+
+
+def logged_units(item, action, san_number):
+    """
+    (operation, units) a log row moved, or None. A SAN-tracked item moves one
+    unit per row with a SAN; its SAN-less 'add N' row repeats the batch total
+    and moves nothing by itself.
+    """
+    parsed = parse_action(action)
+    if parsed is None or item is None:
+        return None
+    if is_san_item(str(item)):
+        return (parsed[0], 1) if san_number else None
+    return parsed
+
+
+def log_row_matches(row, text):
+    """
+    True if any cell of a log row contains `text`, ignoring case.
+    """
+    needle = text.strip().lower()
+    return any(needle in str(value).lower() for value in row if value is not None)
+
+
+def resolve_workbook_path(path=None):
+    """
+    The workbook or database to use: `path` if given, else the one the GUI
+    last opened (config.workbook_path), else EUC_Perth_Assets.xlsx next to
+    this module.
+    """
+    if path:
+        return str(path)
+    try:
+        from config import workbook_path
+    except ImportError:
+        workbook_path = None
+    if workbook_path and Path(workbook_path).exists():
+        return workbook_path
+    return str(Path(__file__).parent / DEFAULT_WORKBOOK)
+
+
+def readable_workbook_path(path):
+    """
+    Path of an xlsx file with the data at `path`, for readers that parse the
+    workbook layout (plot engine, web-app extractor): the path itself for a
+    workbook, or a fresh export next to it for a SQLite database
+    (storage.export_path_for()).
+    """
+    if Path(path).suffix.lower() not in SQLITE_SUFFIXES:
+        return str(path)
+    with Inventory.open(path) as inventory:
+        return inventory.spreadsheet_path()
+
+
+def preview_items(path, location):
+    """
+    (Item, LastCount, NewCount) rows of one location read straight from its
+    sheet, in milliseconds, for drawing while Inventory.open() is still
+    loading the whole workbook. None for a database (it opens at once) and for
+    a workbook whose journal holds changes not yet saved into the sheet.
+    """
+    if Path(path).suffix.lower() in SQLITE_SUFFIXES:
+        return None
+    for journal_path in (Path(journal_path_for(path)), Path(fold_path_for(path))):
+        if journal_path.exists() and journal_path.stat().st_size:
+            return None
+    sheet_name = LOCATION_SHEETS[location][0]
+    model = InventoryModel()
+    model.load_sheet(SheetSnapshot.from_rows(sheet_name, read_sheet_rows(path, sheet_name)))
+    return model.rows(sheet_name)
+
+
+class Inventory:
+    """
+    The tracker's inventory operations over one storage backend. Methods take
+    storage location codes ('4.2', 'BR', 'L17', 'B4.3', 'Darwin') and raise
+    InventoryError for changes the rules reject. `restock` holds the items
+    below threshold; subscribe to it for threshold-crossing events.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.restock = RestockIndex.from_storage(storage, LOCATIONS)
+        self._consumption = None
+        self._closed = False
+
+    @classmethod
+    def open(cls, path=None, **storage_options):
+        """
+        Open a workbook (.xlsx) or database (.db/.sqlite); see resolve_workbook_path()
+        for the default. `storage_options` go to the backend (compact_interval, save_delay).
+        """
+        return cls(open_storage(resolve_workbook_path(path), **storage_options))
+
+    # --- Lifecycle ---
+
+    @property
+    def backend(self):
+        return self.storage.backend
+
+    @property
+    def path(self):
+        return self.storage.path
+
+    def start(self, on_status=None):
+        """
+        Start background saving; `on_status(status, error)` is called from the writer thread.
+        """
+        self.storage.start(on_status=on_status)
+
+    def close(self):
+        """
+        Flush outstanding changes and release the backend. Closing again does nothing.
+        """
+        if self._closed:
+            return
+        self.storage.close()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def spreadsheet_path(self):
+        """
+        Path of an xlsx file with every change so far, for tools that read the file.
+        """
+        return self.storage.spreadsheet_path()
+
+    def batch(self):
+        """
+        Group several changes into one journal write or SQLite transaction.
+        """
+        return self.storage.batch()
+
+    # --- Item counts ---
+
+    def items(self, location):
+        """
+        (Item, LastCount, NewCount) rows of a location, in sheet order.
+        """
+        return self.storage.items(location)
+
+    def get_item(self, location, item):
+        return self.storage.get_item(location, item)
+
+    def pop_changed(self, location):
+        """
+        Items of `location` whose counts changed since the last call.
+        """
+        return self.storage.pop_changed(location)
+
+    def update_count(self, location, item, operation, volume, timestamp=None):
+        """
+        Add or subtract `volume` units of a counted (non-SAN) item and log it.
+        LastCount takes the old NewCount; counts never go below zero.
+        Returns the logged row as (chronological index, row).
+        """
+        self._check_change(location, operation, volume)
+        if is_san_item(item):
+            raise InventoryError(f"'{item}' is tracked by SAN; scan its SANs instead.")
+        timestamp = timestamp or now_text()
+        with self.storage.batch():
+            counts = self.storage.apply_count(location, item, operation, volume)
+            if counts is None:
+                raise InventoryError(f"Item '{item}' not found in {LOCATION_SHEETS[location][0]}.")
+            logged = self.log_change(location, item, operation, volume=volume, timestamp=timestamp)
+        self.restock.update_count(location, item, counts[1])
+        return logged
+
+    def _check_change(self, location, operation, volume):
+        if location not in LOCATION_SHEETS:
+            raise InventoryError(f"Unknown location '{location}'.")
+        if operation not in OPERATIONS:
+            raise InventoryError(f"Unknown operation '{operation}'.")
+        if not isinstance(volume, int) or volume < 1:
+            raise InventoryError("Enter a whole number of units (1 or more).")
+
+    # --- Transaction log ---
+
+    def log_change(self, location, item, operation, san_number="", volume=1, timestamp=None):
+        """
+        Append a row to a location's log. Returns (chronological index, row).
+        """
+        timestamp = timestamp or now_text()
+        san_number = normalise_san(san_number) if san_number else ""
+        text = action_text(operation, volume, san_number)
+        log_index = self.storage.log_change(location, item, text, san_number, timestamp)
+        logging.info(f"Logged change: Time: {timestamp}, Item: {item}, Action: {text}, SAN: {san_number}")
+        return log_index, [timestamp, item, text, san_number]
+
+    def log_count(self, location):
+        return self.storage.log_count(location)
+
+    def log_page(self, location, start, size):
+        """
+        Rows [start, start + size) of a location's log, newest first, as
+        [(chronological index, row)].
+        """
+        return self.storage.log_page(location, start, size)
+
+    def search_log(self, location, text, start=0, size=200):
+        """
+        Up to `size` rows of a location's log with `text` in any column
+        (log_row_matches()), newest first, skipping the `start` newest matches,
+        as [(chronological index, row)]. Reads past the live rows into the
+        archives until enough rows match.
+        """
+        matches, skipped, position, total = [], 0, 0, self.log_count(location)
+        while position < total and len(matches) < size:
+            page = self.log_page(location, position, LOG_SEARCH_CHUNK)
+            if not page:
+                break
+            position += len(page)
+            for log_index, row in page:
+                if not log_row_matches(row, text):
+                    continue
+                if skipped < start:
+                    skipped += 1
+                elif len(matches) < size:
+                    matches.append((log_index, row))
+        return matches
+
+    def archive_logs(self, keep_days=None, cutoff=None):
+        """
+        Move log rows logged more than `keep_days` days ago (or before the
+        `cutoff` timestamp text) into the monthly archive files next to the
+        workbook (see log_archive.py). Returns the rows moved per location.
+        """
+        return archive_logs(self.storage, cutoff or cutoff_for(keep_days or DEFAULT_KEEP_DAYS))
+
+    # --- SAN registry ---
+
+    def is_san_unique(self, san_number):
+        """
+        True if the SAN is not in stock anywhere.
+        """
+        return self.storage.is_san_unique(normalise_san(san_number))
+
+    def get_san(self, san_number):
+        """
+        (item, location) of a SAN in stock, or None.
+        """
+        return self.storage.get_san(normalise_san(san_number))
+
+    def all_sans(self):
+        """
+        (SAN Number, Item, Time, Location) of every SAN in stock.
+        """
+        return self.storage.all_sans()
+
+    def refresh_san_locations(self):
+        """
+        Set each SAN's location from the log that last recorded it. Returns the number changed.
+        """
+        changed = self.storage.refresh_san_locations()
+        if changed:
+            logging.info(f"Updated location of {changed} SANs in All_SANs")
+        return changed
+
+    def check_sans(self, item, operation, san_numbers):
+        """
+        Problems with a batch of scanned SANs, aligned with san_numbers (None = OK).
+        """
+        return check_san_batch(self.storage, item, operation, san_numbers)
+
+    def commit_sans(self, location, item, operation, san_numbers, timestamp=None):
+        """
+        Add or remove a batch of SANs of `item` together with their log rows and
+        the count change. Raises InventoryError if any SAN fails check_sans().
+        Returns the logged rows as [(chronological index, row)], oldest first.
+        """
+        self._check_change(location, operation, len(san_numbers) or 1)
+        problems = [(san_number, problem) for san_number, problem
+                    in zip(san_numbers, self.check_sans(item, operation, san_numbers)) if problem]
+        if problems:
+            raise InventoryError(f"{problems[0][0]}: {problems[0][1]}")
+        if not san_numbers:
+            return []
+        logged = commit_san_batch(self.storage, location, item, operation, san_numbers, timestamp or now_text())
+        self.restock.update_count(location, item, self.storage.get_item(location, item)[2])
+        return logged
+
+    # --- Thresholds ---
+
+    def ensure_thresholds(self, locations=THRESHOLD_LOCATIONS, default=DEFAULT_THRESHOLD):
+        """
+        Give every item of `locations` a threshold. Returns the sheets that gained the column.
+        """
+        changed = self.storage.ensure_thresholds(locations, default=default)
+        for location in locations:
+            if LOCATION_SHEETS[location][0] in changed:
+                self.restock.load_location(self.storage, location)
+        return changed
+
+    def set_threshold(self, location, item, threshold):
+        if not isinstance(threshold, int) or threshold < 0:
+            raise InventoryError("Threshold must be a whole number of 0 or more.")
+        if not self.storage.set_threshold(location, item, threshold):
+            raise InventoryError(f"Item '{item}' not found in {LOCATION_SHEETS[location][0]}.")
+        self.restock.set_threshold(location, item, threshold)
+
+    def low_stock(self, locations=None):
+        """
+        (location, item, NewCount, threshold) of every item below its threshold,
+        at `locations` (default all), from the restock engine without a scan.
+        """
+        return self.restock.low_stock(locations)
+
+    # --- Movement reports ---
+
+    def movement_totals(self, start=None, end=None, location=None, item=None):
+        """
+        (location, item, added, subtracted, net, distinct SANs) between two days
+        inclusive ('YYYY-MM-DD'; None for open-ended), for items whose name
+        contains `item`, read from the daily rollups (see rollups.py).
+        """
+        return self.storage.rollups.totals(start, end, location, item)
+
+    def movement_series(self, period='week', start=None, end=None, location=None, item=None):
+        """
+        (first day, added, subtracted, net, distinct SANs) per 'day', 'week',
+        'month' or 'year' over the rows movement_totals() would match.
+        """
+        return self.storage.rollups.series(period, start, end, location, item)
+
+    def rebuild_rollups(self):
+        """
+        Backfill the daily rollups from the whole log. Returns the rows folded in.
+        """
+        return self.storage.rollups.rebuild(self.storage, LOCATIONS)
+
+    # --- Consumption analytics ---
+
+    def consumption_forecast(self, window_days=None, as_of=None, locations=None):
+        """
+        Daily and weekly burn of every item at `locations` (default all) over
+        the last `window_days` days of its log, and the days until it reaches
+        its threshold and zero, most urgent first (see consumption.py). The
+        logs are parsed on the first call; later calls read only new rows.
+        """
+        from consumption import DEFAULT_WINDOW_DAYS, ConsumptionAnalytics  # Imported on first use: it pulls in pandas
+
+        if self._consumption is None:
+            self._consumption = ConsumptionAnalytics(LOCATIONS)
+        self._consumption.refresh(self.storage)
+        return self._consumption.forecast(self.restock.entries(locations), window_days or DEFAULT_WINDOW_DAYS, as_of)
+
+    # --- SAN returns ---
+
+    def san_returns(self):
+        """
+        (SAN, Gen, Returned By, Returned To, Notes, Timestamp) rows, oldest first.
+        """
+        return self.storage.san_returns()
+
+    def add_san_return(self, san, gen, returned_by, returned_to, notes="", timestamp=None):
+        if not san or not gen or not returned_by or not returned_to:
+            raise InventoryError("All fields except 'Notes' are required.")
+        self.storage.add_san_return(san, gen, returned_by, returned_to, notes, timestamp or now_text())
@@ -0,0 +1,88 @@
+# In-memory inventory counts for each *_Items sheet.
+#
+# Loaded once from the workbook and updated alongside the journalled cell
+# writes, so redrawing or switching locations never touches the file on disk.
+
+from metrics import timed
+
+
+class InventoryModel:
+    """
+    Per-sheet item counts: sheet -> {item: [row, last_count, new_count]}.
+    Items keep sheet order. Changes are tracked per sheet so views can
+    redraw only the rows that moved.
+    """
+
+    def __init__(self):
+        self._sheets = {}
+        self._changed = {}
+
+    @classmethod
+    @timed('scan.items')
+    def from_workbook(cls, workbook, item_sheet_names):
+        model = cls()
+        for sheet_name in item_sheet_names:
+            if sheet_name in workbook.sheetnames:
+                model.load_sheet(workbook[sheet_name])
+        return model
+
+    def load_sheet(self, sheet):
+        """
+        (Re)load the counts of one *_Items worksheet.
+        """
+        items = {}
+        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, max_col=3, values_only=True), start=2):
+            if row[0] is None:
+                continue
+            last_count = row[1] if len(row) > 1 else None
+            new_count = row[2] if len(row) > 2 else None
+            items[row[0]] = [row_idx, last_count, new_count]
+        self._sheets[sheet.title] = items
+        self._changed[sheet.title] = set()
+
+    def has_sheet(self, sheet_name):
+        return sheet_name in self._sheets
+
+    def rows(self, sheet_name):
+        """
+        Return [(item, last_count, new_count), ...] in sheet order.
+        """
+        return [(item, last, new) for item, (_, last, new) in self._sheets.get(sheet_name, {}).items()]
+
+    def get(self, sheet_name, item):
+        entry = self._sheets.get(sheet_name, {}).get(item)
+        return (item, entry[1], entry[2]) if entry else None
+
+    def row_of(self, sheet_name, item):
+        """
+        Worksheet row of an item, or None if the item is not on the sheet.
+        """
+        entry = self._sheets.get(sheet_name, {}).get(item)
+        return entry[0] if entry else None
+
+    def apply_count(self, sheet_name, item, operation, amount):
+        """
+        Move NewCount to LastCount and add/subtract `amount` (never below zero).
+        Returns (row, last_count, new_count) for writing back to the sheet,
+        or None if the item is not on the sheet.
+        """
+        entry = self._sheets.get(sheet_name, {}).get(item)
+        if entry is None:
+            return None
+        last_count = entry[2] or 0
+        if operation == 'add':
+            new_count = last_count + amount
+        else:
+            new_count = max(last_count - amount, 0)
+        entry[1] = last_count
+        entry[2] = new_count
+        self._changed[sheet_name].add(item)
+        return entry[0], last_count, new_count
+
+    def pop_changed(self, sheet_name):
+        """
+        Return and clear the items of a sheet changed since the last call.
+        """
+        changed = self._changed.get(sheet_name, set())
+        self._changed[sheet_name] = set()
+        return changed
@@ -0,0 +1,380 @@
+# Local inventory service: one process owns the workbook and serializes writes.
+#
+# Only one program may have the workbook (or database) open for writing, or
+# one instance's saves overwrite another's. The service opens it once, through
+# inventory_core.Inventory, and serves the inventory operations as HTTP/JSON
+# on 127.0.0.1 so several GUIs and scanning stations can share it
+# (inventory_client.RemoteInventory). Nothing leaves the machine.
+#
+#   POST /api/<method>   JSON object of keyword arguments -> {"result": ...}
+#   POST /api/batch      {"operations": [{"method": ..., "params": {...}}, ...]}
+#                        -> {"results": [{"result": ...} | {"error": ..., "type": ...}, ...]}
+#   GET  /api/changes?since=N   what changed after version N (see ChangeFeed)
+#   GET  /api/health
+#   POST /api/shutdown
+#
+# Every call runs under one lock, so changes apply one at a time in arrival
+# order. A batch holds the lock throughout and shares one journal write or
+# SQLite transaction; each of its operations succeeds or fails on its own, and
+# what they changed reaches the change feed once the batch is written.
+# Rejected changes come back as HTTP 400 with the InventoryError message.
+#
+# While it runs the service records its URL in <workbook>.service.json, which
+# is how the GUI finds it and connects instead of opening the file itself.
+#
+# Loopback alone does not keep out a web page open in a browser on the same
+# machine, which can POST to 127.0.0.1 without asking first. So every request
+# must carry the random token from the service file (readable only by its
+# owner) in an X-Inventory-Token header, POST bodies must be sent as
+# application/json, and requests with an Origin header (browsers) are refused.
+#
+# Usage:
+#   python inventory_service.py EUC_Perth_Assets.xlsx [--port 8765]
+
+import argparse
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from inventory_core import LOCATIONS, Inventory, InventoryError, resolve_workbook_path
+from metrics import count, timer
+
+SERVICE_HOST = '127.0.0.1'  # Loopback only: the service is never reachable from other machines
+DEFAULT_PORT = 8765
+CHANGE_FEED_SIZE = 10_000  # Changes kept for clients to catch up on; older ones ask the client to redraw
+TOKEN_HEADER = 'X-Inventory-Token'
+
+# Seconds between journal folds and of quiet before a save, as in the GUI
+JOURNAL_COMPACT_INTERVAL = 60
+SAVE_DELAY = 2.0
+
+# Inventory methods served, and which of them change the inventory
+READ_METHODS = {
+    'items', 'get_item', 'log_count', 'log_page', 'search_log', 'is_san_unique', 'get_san', 'all_sans',
+    'check_sans', 'low_stock', 'movement_totals', 'movement_series', 'consumption_forecast', 'san_returns',
+    'spreadsheet_path',
+}
+WRITE_METHODS = {
+    'update_count', 'log_change', 'commit_sans', 'set_threshold', 'ensure_thresholds', 'add_san_return',
+    'refresh_san_locations', 'archive_logs',
+}
+
+
+def service_file_for(data_path):
+    return f"{data_path}.service.json"
+
+
+def _jsonable(value):
+    """
+    json.dumps() default: DataFrames (consumption_forecast) as columns + rows,
+    sets as lists, datetimes and anything else as text.
+    """
+    if hasattr(value, 'to_dict') and hasattr(value, 'columns'):
+        return {'columns': list(value.columns), 'data': value.values.tolist()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def encode(payload):
+    return json.dumps(payload, default=_jsonable).encode('utf-8')
+
+
+class ChangeFeed:
+    """
+    Numbered record of what changed, so clients can patch their views:
+    ('item', location, item, row) for a count change, ('log', location,
+    chronological index, row) for a logged row and ('restock', event) for a
+    threshold crossing. The newest CHANGE_FEED_SIZE entries are kept.
+    """
+
+    def __init__(self, size=CHANGE_FEED_SIZE):
+        self.lock = threading.Lock()
+        self.version = 0
+        self._entries = deque(maxlen=size)
+
+    def add(self, *entry):
+        with self.lock:
+            self.version += 1
+            self._entries.append((self.version, entry))
+
+    def since(self, version):
+        """
+        {'version', 'changes'} after `version`, or {'version', 'reset': True}
+        if some of them were already dropped (or `version` is from another run).
+        """
+        with self.lock:
+            oldest = self._entries[0][0] if self._entries else self.version + 1
+            if version > self.version or version < oldest - 1:
+                return {'version': self.version, 'reset': True}
+            return {'version': self.version,
+                    'changes': [entry for entry_version, entry in self._entries if entry_version > version]}
+
+
+class InventoryService:
+    """
+    Runs Inventory methods by name, one at a time, and records what each
+    write changed in `feed`.
+    """
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self.lock = threading.Lock()
+        self.feed = ChangeFeed()
+        self.started = time.time()
+        inventory.restock.subscribe(lambda event: self.feed.add('restock', *event))
+
+    def call(self, method, params):
+        changes = []
+        with self.lock:
+            result = self._call(method, params, changes)
+            self._publish(changes)
+        return result
+
+    def call_batch(self, operations):
+        """
+        Run operations ({'method', 'params'}) in order, as one journal write or
+        SQLite transaction. Returns one {'result'} or {'error', 'type'} per operation.
+        What they changed goes into the feed once the batch is written.
+        """
+        results = []
+        changes = []
+        with self.lock:
+            with timer('service.batch'), self.inventory.batch():
+                for operation in operations:
+                    try:
+                        if not isinstance(operation, dict):
+                            raise InventoryError("Each operation must be an object with 'method' and 'params'.")
+                        result = self._call(operation.get('method'), operation.get('params') or {}, changes)
+                    except Exception as e:
+                        # One bad operation (missing key, wrong type, ...) must not abort the others
+                        if not isinstance(e, (InventoryError, TypeError)):
+                            logging.exception(f"Batch operation {operation!r} failed")
+                        results.append({'error': str(e), 'type': type(e).__name__})
+                    else:
+                        results.append({'result': result})
+            self._publish(changes)
+        count('service.batches')
+        return results
+
+    def _call(self, method, params, changes):
+        if method not in READ_METHODS and method not in WRITE_METHODS:
+            raise InventoryError(f"Unknown method '{method}'.")
+        if not isinstance(params, dict):
+            raise InventoryError("Parameters must be a JSON object.")
+        with timer(f"service.{method}"):
+            result = getattr(self.inventory, method)(**params)
+            if method in WRITE_METHODS:
+                self._record(method, params, result, changes)
+        count('service.ops')
+        return result
+
+    def _record(self, method, params, result, changes):
+        # Logged rows come back from the call; changed counts from the storage's change sets
+        if method in ('update_count', 'log_change'):
+            changes.append(('log', params['location'], *result))
+        elif method == 'commit_sans':
+            for log_index, row in result:
+                changes.append(('log', params['location'], log_index, row))
+        for location in LOCATIONS:
+            for item in self.inventory.pop_changed(location):
+                changes.append(('item', location, item, self.inventory.get_item(location, item)))
+
+    def _publish(self, changes):
+        for change in changes:
+            self.feed.add(*change)
+
+    def health(self):
+        return {'status': 'ok', 'path': str(Path(self.inventory.path).resolve()), 'backend': self.inventory.backend,
+                'pid': os.getpid(), 'version': self.feed.version, 'uptime': time.time() - self.started,
+                'low_stock': len(self.inventory.restock)}
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP/JSON front of an InventoryService (set as server.service).
+    """
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive: a scanning station reuses one connection
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; don't hold the body back
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status, payload):
+        body = encode(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _refuse(self, status, error):
+        # The body (if any) is left unread, so the connection can't carry another request
+        self.close_connection = True
+        self._send(status, {'error': error, 'type': 'Forbidden' if status == 403 else 'UnsupportedMediaType'})
+
+    def _allowed(self, with_body=False):
+        """
+        Refuse browser requests, requests without the service token and (with
+        `with_body`) bodies that aren't JSON. Returns whether to go on.
+        """
+        if 'Origin' in self.headers:
+            self._refuse(403, "Requests from web pages are not accepted.")
+            return False
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), self.server.token):
+            self._refuse(403, f"Missing or wrong {TOKEN_HEADER}; read it from the .service.json file.")
+            return False
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if with_body and content_type != 'application/json':
+            self._refuse(415, "Send the request body as application/json.")
+            return False
+        return True
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == '/api/health':
+            self._send(200, service.health())
+        elif url.path == '/api/changes':
+            try:
+                since = int(parse_qs(url.query).get('since', ['0'])[0])
+            except ValueError:
+                self._send(400, {'error': "'since' must be a number.", 'type': 'ValueError'})
+                return
+            changes = service.feed.since(since)
+            changes['low_stock'] = len(service.inventory.restock)
+            self._send(200, changes)
+        else:
+            self._send(404, {'error': f"No such resource: {url.path}", 'type': 'NotFound'})
+
+    def do_POST(self):
+        if not self._allowed(with_body=True):
+            return
+        path = urlsplit(self.path).path
+        service = self.server.service
+        try:
+            payload = self._read_json()
+        except ValueError as e:
+            self._send(400, {'error': f"Invalid JSON: {e}", 'type': 'ValueError'})
+            return
+        try:
+            with timer('service.request'):
+                if path == '/api/shutdown':
+                    self._send(200, {'result': True})
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                elif path == '/api/batch':
+                    operations = payload.get('operations') if isinstance(payload, dict) else None
+                    if not isinstance(operations, list):
+                        raise InventoryError("Expected {'operations': [...]}.")
+                    self._send(200, {'results': service.call_batch(operations)})
+                elif path.startswith('/api/'):
+                    self._send(200, {'result': service.call(path[len('/api/'):], payload)})
+                else:
+                    self._send(404, {'error': f"No such resource: {path}", 'type': 'NotFound'})
+        except (InventoryError, TypeError) as e:
+            # TypeError: missing or unexpected parameters
+            self._send(400, {'error': str(e), 'type': type(e).__name__})
+        except Exception as e:
+            logging.exception(f"Service call {path} failed")
+            self._send(500, {'error': str(e), 'type': type(e).__name__})
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, port=DEFAULT_PORT, token=None):
+        super().__init__((SERVICE_HOST, port), ServiceRequestHandler)
+        self.service = service
+        self.token = token or secrets.token_urlsafe(32)
+
+    @property
+    def url(self):
+        return f"http://{SERVICE_HOST}:{self.server_address[1]}"
+
+
+def write_service_file(data_path, url, token):
+    path = service_file_for(data_path)
+    temp_path = f"{path}.tmp"
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    # Created owner-only: the token lets whoever reads it change the inventory
+    descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as service_file:
+        json.dump({'url': url, 'token': token, 'pid': os.getpid()}, service_file)
+    os.replace(temp_path, path)
+
+
+def remove_service_file(data_path):
+    try:
+        os.remove(service_file_for(data_path))
+    except FileNotFoundError:
+        pass
+
+
+def serve(path=None, port=DEFAULT_PORT, on_ready=None):
+    """
+    Open the workbook or database and serve it until shutdown (POST
+    /api/shutdown or Ctrl+C), then save and close it. `on_ready(url)` is
+    called once requests are accepted.
+    """
+    from inventory_client import find_service  # Imported on first use: the client imports this module
+
+    path = str(Path(resolve_workbook_path(path)).resolve())
+    running = find_service(path)
+    if running:
+        raise RuntimeError(f"{path} is already served at {running[0]}")
+
+    inventory = Inventory.open(path, compact_interval=JOURNAL_COMPACT_INTERVAL, save_delay=SAVE_DELAY)
+    try:
+        inventory.start(on_status=lambda status, error: error and logging.error(f"Failed to save {path}: {error}"))
+        server = ServiceHTTPServer(InventoryService(inventory), port)
+        write_service_file(path, server.url, server.token)
+        logging.info(f"Serving {path} at {server.url}")
+        if on_ready is not None:
+            on_ready(server.url)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            remove_service_file(path)
+            server.server_close()
+    finally:
+        inventory.close()
+        logging.info(f"Closed {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the inventory to GUIs and scanning stations on this machine.")
+    parser.add_argument("file", nargs='?', help="Workbook or SQLite database (default: the GUI's last spreadsheet)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port on {SERVICE_HOST} (default {DEFAULT_PORT}, 0 = any free port)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        serve(args.file, args.port, on_ready=lambda url: print(f"Serving at {url} - Ctrl+C to stop", flush=True))
+    except RuntimeError as e:
+        raise SystemExit(f"error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+# Monthly archives of the *_Timestamps logs, so the live workbook stays small.
+#
+# archive_logs() moves log rows older than a cutoff out of the live workbook
+# (or database) into one file per month next to it,
+# EUC_Perth_Assets_archive_2025-03.xlsx, in the usual *_Timestamps layout
+# (EUC_Perth_Assets_db_archive_2025-03.xlsx for a database).
+# EUC_Perth_Assets_archive.json records, per location, the cutoff everything
+# before which is archived and the rows each month holds.
+#
+# Archived rows keep their chronological index: index 0 is the oldest archived
+# row and the live log carries on after the last one. So the log view pages
+# from the live log into the archives without noticing, and log_since()
+# markers (rollups, consumption analytics) stay valid across an archive run.
+#
+# Each step can be repeated safely after a crash. The month files are
+# rewritten first (keeping only rows from before the previous cutoff), then
+# the manifest, then the live rows are trimmed. A live row older than the
+# manifest's cutoff is already archived and is trimmed again on open.
+#
+# Usage:
+#   python log_archive.py EUC_Perth_Assets.xlsx --keep-days 180
+
+import argparse
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from log_store import _timestamp_key
+from metrics import count, timed
+from snapshot_cache import read_sheet_rows
+
+ARCHIVE_VERSION = 1
+DEFAULT_KEEP_DAYS = 180
+
+
+def _archive_prefix(data_path):
+    # EUC_Perth_Assets.xlsx -> EUC_Perth_Assets_archive; a database imported next to it gets its own,
+    # EUC_Perth_Assets.db -> EUC_Perth_Assets_db_archive
+    path = Path(data_path)
+    suffix = path.suffix.lower()
+    stem = path.stem if suffix == '.xlsx' else f"{path.stem}_{suffix.lstrip('.')}"
+    return path.with_name(f"{stem}_archive")
+
+
+def manifest_path_for(data_path):
+    return f"{_archive_prefix(data_path)}.json"
+
+
+def archive_path_for(data_path, month):
+    return f"{_archive_prefix(data_path)}_{month}.xlsx"
+
+
+def cutoff_for(keep_days, now=None):
+    """
+    Timestamp text of the start of the day `keep_days` days ago: rows logged before it get archived.
+    """
+    day = (now or datetime.now()) - timedelta(days=keep_days)
+    return day.strftime("%Y-%m-%d 00:00:00")
+
+
+def _archive_row(row):
+    # (Timestamp text, Item, Action, SAN # or None), as every row is written to an archive
+    timestamp, item, action, san_number = (tuple(row) + (None,) * 4)[:4]
+    return _timestamp_key(timestamp), item, action, san_number or None
+
+
+class LogArchive:
+    """
+    The month files and manifest next to one workbook or database. Row
+    indices are per location and chronological, 0 = oldest archived row.
+    Months are read on first use and kept in memory.
+    """
+
+    def __init__(self, data_path):
+        # Imported on first use: storage imports this module
+        from storage import LOCATION_SHEETS
+
+        self.data_path = str(data_path)
+        self.manifest_path = manifest_path_for(self.data_path)
+        self.sheets = {location: sheets[1] for location, sheets in LOCATION_SHEETS.items()}
+        self.lock = threading.RLock()
+        self._cache = {}  # (month, location) -> rows
+        self._manifest = {'version': ARCHIVE_VERSION, 'cutoffs': {}, 'months': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as manifest_file:
+                self._manifest = json.load(manifest_file)
+
+    # --- Reads ---
+
+    def cutoff(self, location):
+        """
+        Timestamp text before which the location's rows are archived, or None.
+        """
+        return self._manifest['cutoffs'].get(location)
+
+    def months(self, location):
+        """
+        Months ('YYYY-MM') holding rows of `location`, oldest first.
+        """
+        return sorted(month for month, counts in self._manifest['months'].items() if counts.get(location))
+
+    def count(self, location):
+        return sum(counts.get(location, 0) for counts in self._manifest['months'].values())
+
+    def _month_rows(self, month, location):
+        with self.lock:
+            key = (month, location)
+            rows = self._cache.get(key)
+            if rows is None:
+                expected = self._manifest['months'].get(month, {}).get(location, 0)
+                rows = [row for row in self._read_file(month, location) if row[0] < self.cutoff(location)][:expected]
+                if len(rows) != expected:
+                    logging.warning(f"{archive_path_for(self.data_path, month)} has {len(rows)} rows of "
+                                    f"{location}, expected {expected}")
+                self._cache[key] = rows
+                count('archive.months_read')
+            return rows
+
+    def _read_file(self, month, location):
+        path = archive_path_for(self.data_path, month)
+        try:
+            rows = read_sheet_rows(path, self.sheets[location])
+        except (FileNotFoundError, KeyError):
+            return []
+        return [_archive_row(row) for row in rows[1:] if row and row[0] is not None]
+
+    def rows(self, location, start=0, stop=None):
+        """
+        Archived rows [start, stop) of a location, oldest first; only the months they fall in are read.
+        """
+        stop = self.count(location) if stop is None else stop
+        rows, month_start = [], 0
+        for month in self.months(location):
+            month_stop = month_start + self._manifest['months'][month][location]
+            if month_stop > start and month_start < stop:
+                month_rows = self._month_rows(month, location)
+                rows.extend(month_rows[max(start - month_start, 0):stop - month_start])
+            month_start = month_stop
+        return rows
+
+    def page(self, location, start, size):
+        """
+        Up to `size` archived rows newest-first, skipping the `start` newest,
+        as (chronological index, row) pairs.
+        """
+        end = self.count(location) - start
+        first = max(end - size, 0)
+        if end <= 0:
+            return []
+        return [(first + offset, row) for offset, row in enumerate(self.rows(location, first, end))][::-1]
+
+    def newest_first(self, location):
+        """
+        Every archived row of a location as (chronological index, row), newest
+        first, reading one month at a time.
+        """
+        end = self.count(location)
+        for month in reversed(self.months(location)):
+            month_rows = self._month_rows(month, location)
+            end -= len(month_rows)
+            for offset in range(len(month_rows) - 1, -1, -1):
+                yield end + offset, month_rows[offset]
+
+    # --- Writes ---
+
+    @timed('archive.write')
+    def add(self, rows_by_location, cutoff):
+        """
+        Archive each location's live rows older than `cutoff`. Rows older than
+        the location's previous cutoff are already archived (left live by an
+        interrupted run) and are skipped. Returns the rows newly archived per location.
+        """
+        with self.lock:
+            manifest = json.loads(json.dumps(self._manifest))
+            added, new_rows = {}, {}  # new_rows: month -> location -> rows
+            for location, rows in rows_by_location.items():
+                previous = self.cutoff(location) or ""
+                fresh = sorted((row for row in map(_archive_row, rows) if previous <= row[0] < cutoff),
+                               key=lambda row: row[0])
+                added[location] = len(fresh)
+                for row in fresh:
+                    new_rows.setdefault(row[0][:7], {}).setdefault(location, []).append(row)
+                manifest['cutoffs'][location] = max(previous, cutoff)
+
+            for month, month_new_rows in sorted(new_rows.items()):
+                counts = self._write_month(month, month_new_rows)
+                manifest['months'][month] = counts
+
+            self._write_manifest(manifest)
+            self._manifest = manifest
+            for month in new_rows:
+                for location in self.sheets:
+                    self._cache.pop((month, location), None)
+        return added
+
+    def _write_month(self, month, new_rows):
+        """
+        Rewrite one month's file with its archived rows plus `new_rows`
+        (location -> rows). Returns the row count per location.
+        """
+        from openpyxl import Workbook  # Imported on first use: it is slow to import
+        from storage import TIMESTAMPS_HEADER
+
+        path = archive_path_for(self.data_path, month)
+        workbook = Workbook(write_only=True)
+        counts = {}
+        for location, sheet_name in self.sheets.items():
+            # Rows from before the previous cutoff are the month's archive; later ones are an interrupted run's
+            previous = self.cutoff(location) or ""
+            rows = [row for row in self._read_file(month, location) if row[0] < previous]
+            rows += new_rows.get(location, [])
+            if not rows:
+                continue
+            sheet = workbook.create_sheet(sheet_name)
+            sheet.append(TIMESTAMPS_HEADER)
+            for row in rows:
+                sheet.append(list(row))
+            counts[location] = len(rows)
+        temp_path = f"{path}.tmp"
+        workbook.save(temp_path)
+        os.replace(temp_path, path)
+        return counts
+
+    def _write_manifest(self, manifest):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(temp_path, self.manifest_path)
+
+
+def archive_logs(storage, cutoff):
+    """
+    Move every location's log rows older than `cutoff` (timestamp text) from
+    the storage backend into its LogArchive. Returns the rows moved per location.
+    """
+    rows = {location: storage.log_before(location, cutoff) for location in storage.archive.sheets}
+    moved = storage.archive.add(rows, cutoff)
+    with storage.batch():
+        for location in rows:
+            storage.trim_log(location, storage.archive.cutoff(location))
+    logging.info(f"Archived {sum(moved.values())} log rows older than {cutoff}")
+    return moved
+
+
+def main():
+    # Imported on first use: inventory_core imports storage, which imports this module
+    from inventory_core import Inventory
+
+    parser = argparse.ArgumentParser(description="Move old transaction log rows into monthly archive files.")
+    parser.add_argument("file", help="Workbook or SQLite database")
+    parser.add_argument("--keep-days", type=int, default=DEFAULT_KEEP_DAYS,
+                        help=f"Days of log to keep live (default {DEFAULT_KEEP_DAYS})")
+    args = parser.parse_args()
+
+    with Inventory.open(args.file) as inventory:
+        moved = inventory.archive_logs(args.keep_days)
+    for location, rows in moved.items():
+        print(f"{location:<8}{rows:>8} rows archived")
+
+
+if __name__ == '__main__':
+    main()
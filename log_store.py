@@ -0,0 +1,96 @@
+# In-memory transaction logs for the *_Timestamps sheets.
+#
+# Each sheet is read and sorted once, on first use. Rows are kept oldest-first
+# so log_change() appends in O(1); views walk the list backwards to page
+# through it newest-first. Chronological indices start after the rows moved
+# to the monthly archives (log_archive.py), whose number is the sheet's offset.
+
+from datetime import datetime
+
+from metrics import timer
+
+
+def _timestamp_key(value):
+    """
+    Sort key for a Timestamp cell. Cells are "%Y-%m-%d %H:%M:%S" strings (which
+    sort correctly as text) or datetimes if Excel converted them.
+    """
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def is_logged_before(value, cutoff):
+    """
+    True if a Timestamp cell holds a date earlier than `cutoff` (timestamp text).
+    Cells that don't start with a year are never counted as earlier.
+    """
+    key = _timestamp_key(value)
+    return key[:4].isdigit() and key[4:5] == '-' and key < cutoff
+
+
+class LogStore:
+    """
+    sheet -> chronological list of (Timestamp, Item, Action, SAN #) rows.
+    """
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.offsets = {}  # sheet -> rows archived before the first one held here
+        self._rows = {}
+
+    def _sheet_rows(self, sheet_name):
+        rows = self._rows.get(sheet_name)
+        if rows is None:
+            rows = []
+            if sheet_name in self.workbook.sheetnames:
+                with timer('scan.log_sort'):
+                    sheet = self.workbook[sheet_name]
+                    rows = [row for row in sheet.iter_rows(min_row=2, max_col=4, values_only=True) if row[0] is not None]
+                    # The sheet is already nearly in order, so this is close to a single linear pass
+                    rows.sort(key=lambda r: _timestamp_key(r[0]))
+            self._rows[sheet_name] = rows
+        return rows
+
+    def append(self, sheet_name, row):
+        """
+        Record a row just logged to a sheet. Returns its chronological index.
+        """
+        rows = self._sheet_rows(sheet_name)
+        rows.append(tuple(row))
+        return self.offsets.get(sheet_name, 0) + len(rows) - 1
+
+    def rows(self, sheet_name, start=0):
+        """
+        Rows held here from chronological index `start` on, oldest first.
+        """
+        return self._sheet_rows(sheet_name)[max(start - self.offsets.get(sheet_name, 0), 0):]
+
+    def rows_before(self, sheet_name, cutoff):
+        return [row for row in self._sheet_rows(sheet_name) if is_logged_before(row[0], cutoff)]
+
+    def trim(self, sheet_name, cutoff):
+        """
+        Drop the rows logged before `cutoff`. Returns how many there were.
+        """
+        rows = self._sheet_rows(sheet_name)
+        kept = [row for row in rows if not is_logged_before(row[0], cutoff)]
+        removed = len(rows) - len(kept)
+        rows[:] = kept
+        return removed
+
+    def count(self, sheet_name):
+        """
+        Rows logged to the sheet, counting the archived ones.
+        """
+        return self.offsets.get(sheet_name, 0) + len(self._sheet_rows(sheet_name))
+
+    def page(self, sheet_name, start, size):
+        """
+        Return up to `size` rows held here newest-first, skipping the `start`
+        newest, as (chronological index, row) pairs.
+        """
+        rows = self._sheet_rows(sheet_name)
+        offset = self.offsets.get(sheet_name, 0)
+        end = len(rows) - start
+        return [(offset + idx, rows[idx]) for idx in range(end - 1, max(end - size, 0) - 1, -1)]
@@ -0,0 +1,221 @@
+# In-process timing and counters for the tracker's hot paths.
+#
+# Code under measurement wraps work in `timer("name")` (or decorates a
+# function with `@timed("name")`) and bumps counters with `count("name")`.
+# Every timer keeps its totals plus a window of recent samples, from which
+# p50/p95/p99 are computed on demand. MetricsExporter writes the registry to
+# a JSON file, or a Prometheus text-format file (.prom), on a timer.
+#
+# Usage: python metrics.py metrics.json   # print a snapshot exported by the GUI
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+SAMPLE_WINDOW = 1024  # Recent samples per timer used for percentiles
+PERCENTILES = (50, 95, 99)
+PROMETHEUS_SUFFIXES = ('.prom',)
+
+
+class TimerStats:
+    """
+    Totals for one timer plus its most recent samples (seconds).
+    """
+
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """
+        {p: seconds} over the recent samples (nearest rank), or {} if none.
+        """
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {p: ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in percentiles}
+
+
+class Metrics:
+    """
+    Thread-safe registry of named timers and counters.
+    """
+
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Time the enclosed block under `name` (recorded even if it raises).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """
+        Decorator form of timer().
+        """
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                stats = self._timers[name] = TimerStats(self.window)
+            stats.add(seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+
+    def snapshot(self):
+        """
+        Plain-dict view of every timer (in milliseconds) and counter.
+        """
+        with self._lock:
+            timers = {}
+            for name, stats in sorted(self._timers.items()):
+                entry = {
+                    'count': stats.count,
+                    'total_ms': stats.total * 1000,
+                    'mean_ms': stats.total * 1000 / stats.count,
+                    'max_ms': stats.max * 1000,
+                }
+                for p, seconds in stats.percentiles().items():
+                    entry[f'p{p}_ms'] = seconds * 1000
+                timers[name] = entry
+            counters = dict(sorted(self._counters.items()))
+        return {'timestamp': time.time(), 'timers': timers, 'counters': counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='euc'):
+        """
+        Prometheus text exposition format: timers as a summary with recent-window
+        quantiles, counters as one counter family labelled by name.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_operation_seconds Time spent in instrumented operations.",
+            f"# TYPE {prefix}_operation_seconds summary",
+        ]
+        for name, entry in snapshot['timers'].items():
+            label = f'operation="{_escape_label(name)}"'
+            for p in PERCENTILES:
+                if f'p{p}_ms' in entry:
+                    lines.append(f'{prefix}_operation_seconds{{{label},quantile="{p / 100}"}} {entry[f"p{p}_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_operation_seconds_sum{{{label}}} {entry["total_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_operation_seconds_count{{{label}}} {entry["count"]}')
+        lines += [
+            f"# HELP {prefix}_events_total Instrumented event counters.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in snapshot['counters'].items():
+            lines.append(f'{prefix}_events_total{{event="{_escape_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# The registry shared by every module
+METRICS = Metrics()
+timer = METRICS.timer
+timed = METRICS.timed
+count = METRICS.count
+
+
+class MetricsExporter:
+    """
+    Writes a metrics snapshot to `path` every `interval` seconds on a daemon
+    thread, and once more on close(). Files ending in .prom get the Prometheus
+    text format, anything else JSON. Writes are atomic (temp file + replace).
+    """
+
+    def __init__(self, path, interval=30.0, metrics=METRICS):
+        self.path = Path(path)
+        self.interval = interval
+        self.metrics = metrics
+        self.format = 'prometheus' if self.path.suffix.lower() in PROMETHEUS_SUFFIXES else 'json'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def export(self):
+        text = self.metrics.to_prometheus() if self.format == 'prometheus' else self.metrics.to_json()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Failed to export metrics to {self.path}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+
+def format_table(snapshot):
+    """
+    Text table of a snapshot's timers (p50/p95/max in ms) and counters.
+    """
+    lines = [f"{'operation':<28} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}"]
+    for name, entry in snapshot['timers'].items():
+        lines.append(f"{name:<28} {entry['count']:>8} {entry.get('p50_ms', 0):>10.1f} "
+                     f"{entry.get('p95_ms', 0):>10.1f} {entry['max_ms']:>10.1f}")
+    for name, value in snapshot['counters'].items():
+        lines.append(f"{name:<28} {value:>8}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1] if len(sys.argv) > 1 else 'metrics.json', encoding='utf-8') as f:
+        print(format_table(json.load(f)))
@@ -0,0 +1,238 @@
+# Inventory plot engine shared by the GUI and the inventory-levels_*.py scripts.
+#
+# The workbook is parsed once (via the snapshot cache) into per-location
+# (Item, NewCount) frames and the charts are rendered in parallel on a process
+# pool with the Agg backend. A single chart (render_one) is drawn in the
+# calling process, off pyplot, so the GUI never starts an interpreter for it.
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_core import readable_workbook_path
+from metrics import timed
+from snapshot_cache import open_snapshot
+
+# Location -> (items sheet, chart title, output file prefix)
+LOCATIONS = {
+    '4.2': ('4.2_Items', 'Basement 4.2 - Inventory Levels (Perth)', 'Basement_4.2_inventory'),
+    'BR': ('BR_Items', 'Build Room - Inventory Levels (Perth)', 'Build_Room_inventory'),
+    'Darwin': ('Darwin_Items', 'Darwin - Inventory Levels', 'Darwin_inventory'),
+    'L17': ('L17_Items', 'Level 17 - Inventory Levels (Perth)', 'Level_17_inventory'),
+    'B4.3': ('B4.3_Items', 'Basement 4.3 - Inventory Levels (Perth)', 'Basement_4.3_inventory'),
+}
+
+# The combined chart sums these locations
+COMBINED_LOCATIONS = ['4.2', 'BR', 'Darwin']
+COMBINED_TITLE = 'Combined: B4.2, Build Room & Darwin'
+COMBINED_PREFIX = 'Combined_inventory'
+
+
+@timed('plots.load_frames')
+def load_frames(workbook_path, locations=None):
+    """
+    Read every requested *_Items sheet from one (cached) parse of the workbook.
+    Returns {location: DataFrame[Item, NewCount]} with missing counts as 0.
+    Locations whose sheet is absent are skipped. A SQLite database is read
+    through an xlsx export.
+    """
+    locations = list(locations or LOCATIONS)
+    snapshot = open_snapshot(readable_workbook_path(workbook_path))
+    frames = {}
+    for location in locations:
+        sheet_name = LOCATIONS[location][0]
+        if sheet_name not in snapshot:
+            continue
+        df_items = snapshot[sheet_name].to_frame()
+        if 'Item' not in df_items.columns:
+            raise KeyError(f"'Item' column not found in {sheet_name}.")
+        if 'NewCount' not in df_items.columns:
+            raise KeyError(f"'NewCount' column not found in {sheet_name}.")
+        df_items = df_items.dropna(subset=['Item'])[['Item', 'NewCount']].copy()
+        df_items['NewCount'] = df_items['NewCount'].fillna(0)
+        frames[location] = df_items
+    return frames
+
+
+def combined_frame(frames, locations=COMBINED_LOCATIONS):
+    """
+    Sum NewCount per item across the given locations.
+    """
+    combined_df = pd.concat([frames[loc] for loc in locations if loc in frames])
+    return combined_df.groupby('Item', as_index=False)['NewCount'].sum()
+
+
+def render_chart(items, counts, title, output_path, show=False):
+    """
+    Draw the horizontal inventory bar chart and save it to output_path. Only
+    with `show` does it go through pyplot (and its GUI backend) to display it.
+    """
+    from matplotlib.figure import Figure
+
+    items = list(items)
+    counts = [float(c) for c in counts]
+    figsize = (14 * 0.60, 10 * 0.60)
+    if show:
+        import matplotlib.pyplot as plt
+        figure = plt.figure(figsize=figsize)
+    else:
+        figure = Figure(figsize=figsize)  # Not registered with pyplot: safe inside the Tk GUI
+    try:
+        axes = figure.add_subplot()
+        bars = axes.barh(items, counts, color='#006aff', label='Volume')
+
+        # Add the text with the count at the end of each bar
+        for bar in bars:
+            width = bar.get_width()
+            axes.text(width + 1, bar.get_y() + bar.get_height() / 2, int(width), ha='left', va='center', color='black')
+
+        axes.set_ylabel('Item', fontsize=12)
+        axes.set_xlabel('Volume', fontsize=12)
+        axes.set_xlim(0, (max(counts) if counts else 0) + 20)  # Dynamically adjust x-axis limit
+        current_date = datetime.now().strftime('%d-%m-%Y')
+        axes.set_title(f'{title} - {current_date}', fontsize=14)
+        figure.tight_layout()
+
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        figure.savefig(output_path)
+
+        if show:
+            plt.show()  # This will display the plot in a GUI window
+    finally:
+        if show:
+            plt.close('all')
+    return output_path
+
+
+def _render_job(job):
+    """
+    Process-pool entry point: render one chart headlessly.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    items, counts, title, output_path = job
+    return render_chart(items, counts, title, output_path)
+
+
+def chart_data(frames, location):
+    """
+    (items, counts, title) of one chart: a key of LOCATIONS or 'combined'.
+    Raises KeyError if the location's sheet was not in the workbook.
+    """
+    if location == 'combined':
+        grouped_df = combined_frame(frames)
+        return grouped_df['Item'], grouped_df['NewCount'], COMBINED_TITLE
+    if location not in frames:
+        raise KeyError(f"Sheet '{LOCATIONS[location][0]}' not found.")
+    return frames[location]['Item'], frames[location]['NewCount'], LOCATIONS[location][1]
+
+
+def output_prefix(location):
+    return COMBINED_PREFIX if location == 'combined' else LOCATIONS[location][2]
+
+
+def chart_jobs(frames, output_dir):
+    """
+    Build (items, counts, title, output_path) jobs for every location chart
+    plus the combined chart.
+    """
+    jobs = []
+    for location, df_items in frames.items():
+        _, title, prefix = LOCATIONS[location]
+        jobs.append((df_items['Item'].tolist(), df_items['NewCount'].tolist(), title,
+                     os.path.join(output_dir, f"{prefix}.png")))
+    if any(loc in frames for loc in COMBINED_LOCATIONS):
+        grouped_df = combined_frame(frames)
+        jobs.append((grouped_df['Item'].tolist(), grouped_df['NewCount'].tolist(), COMBINED_TITLE,
+                     os.path.join(output_dir, f"{COMBINED_PREFIX}.png")))
+    return jobs
+
+
+@contextmanager
+def _spawn_safe_main():
+    """
+    Under the spawn start method (Windows) each worker re-runs the parent's
+    __main__ script, which for the GUI would build a second window. While
+    workers start, present this module as __main__ so they import it instead.
+    """
+    main_module = sys.modules['__main__']
+    sys.modules['__main__'] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main_module
+
+
+@timed('plots.render_all')
+def render_all(workbook_path, output_dir, workers=None):
+    """
+    Parse the workbook once and render every chart into output_dir in parallel.
+    Returns a list of (title, output_path, error) with error None on success.
+    """
+    jobs = chart_jobs(load_frames(workbook_path), output_dir)
+    results = []
+    if workers == 1:
+        for job in jobs:
+            try:
+                results.append((job[2], _render_job(job), None))
+            except Exception as e:
+                results.append((job[2], job[3], e))
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+        with _spawn_safe_main():
+            futures = [(job, pool.submit(_render_job, job)) for job in jobs]
+        for job, future in futures:
+            try:
+                results.append((job[2], future.result(), None))
+            except Exception as e:
+                results.append((job[2], job[3], e))
+    return results
+
+
+@timed('plots.render_one')
+def render_one(workbook_path, location, output_path):
+    """
+    Render one chart (a key of LOCATIONS or 'combined') in this process from
+    the cached parse of the workbook. Returns output_path.
+    """
+    locations = COMBINED_LOCATIONS if location == 'combined' else [location]
+    items, counts, title = chart_data(load_frames(workbook_path, locations), location)
+    return render_chart(items, counts, title, output_path)
+
+
+def run_cli(location, file_path, output_path, show=True):
+    """
+    Shared body of the inventory-levels_*.py scripts. `location` is a key of
+    LOCATIONS or 'combined'.
+    """
+    locations = COMBINED_LOCATIONS if location == 'combined' else [location]
+    try:
+        print(f"Loading spreadsheet from {file_path}")
+        frames = load_frames(file_path, locations)
+        print("Spreadsheet loaded successfully.")
+    except FileNotFoundError:
+        print(f"Error: File not found at {file_path}. Please ensure the file exists.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        sys.exit(1)
+
+    try:
+        items, counts, title = chart_data(frames, location)
+    except KeyError:
+        print(f"Error: Sheet '{LOCATIONS[location][0]}' not found in {file_path}.")
+        sys.exit(1)
+
+    try:
+        print("Generating the plot...")
+        render_chart(items, counts, title, output_path, show=show)
+        print(f"Plot saved successfully at {output_path}")
+    except Exception as e:
+        print(f"Error generating chart: {e}")
+    print("Exiting application.")
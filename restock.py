@@ -0,0 +1,158 @@
+# Restock engine: the set of items below their threshold, for every location.
+#
+# Built once from the item counts and thresholds, then kept current by
+# update_count() and set_threshold() in O(1), so "Check Restock Threshold" is
+# a read of the set instead of a scan of the *_Items sheets. An item crossing
+# its threshold in either direction is reported to listeners as an event.
+
+import logging
+import threading
+
+from metrics import timed
+
+# Event kinds
+LOW = 'low'  # The item fell below its threshold
+RESTOCKED = 'restocked'  # The item is back at or above its threshold (or no longer has one)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class RestockIndex:
+    """
+    (location, item) -> NewCount and threshold, plus the keys below threshold.
+    Listeners are called as listener((kind, location, item, count, threshold))
+    on the thread that made the change, after the change is stored.
+    """
+
+    def __init__(self, locations):
+        self.locations = list(locations)
+        self.lock = threading.Lock()
+        self._counts = {}
+        self._thresholds = {}
+        self._positions = {}  # key -> (location order, sheet order), for listing
+        self._below = set()
+        self._listeners = []
+
+    @classmethod
+    @timed('scan.restock_index')
+    def from_storage(cls, storage, locations):
+        """
+        Build the index with one pass over each location's items and thresholds.
+        """
+        index = cls(locations)
+        for location in index.locations:
+            index.load_location(storage, location)
+        return index
+
+    def load_location(self, storage, location):
+        """
+        (Re)load one location's counts and thresholds. No events are fired.
+        """
+        thresholds = storage.thresholds(location)
+        location_order = self.locations.index(location)
+        with self.lock:
+            for key in [key for key in self._counts if key[0] == location]:
+                self._counts.pop(key, None)
+                self._thresholds.pop(key, None)
+                self._positions.pop(key, None)
+                self._below.discard(key)
+            for position, (item, _, new_count) in enumerate(storage.items(location)):
+                key = (location, item)
+                self._counts[key] = new_count
+                self._positions[key] = (location_order, position)
+                if thresholds.get(item) is not None:
+                    self._thresholds[key] = thresholds[item]
+                if self._is_low(key):
+                    self._below.add(key)
+
+    # --- Listeners ---
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event):
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                # The change is already stored; a failing listener must not undo or block it
+                logging.error(f"Restock listener failed on {event}: {e}")
+
+    # --- Updates ---
+
+    def _is_low(self, key):
+        count, threshold = self._counts.get(key), self._thresholds.get(key)
+        return _is_number(count) and _is_number(threshold) and count < threshold
+
+    def _refresh(self, key):
+        # Caller holds the lock. Returns the crossing event, or None if the side didn't change.
+        is_low = self._is_low(key)
+        if is_low == (key in self._below):
+            return None
+        if is_low:
+            self._below.add(key)
+        else:
+            self._below.discard(key)
+        return LOW if is_low else RESTOCKED, key[0], key[1], self._counts.get(key), self._thresholds.get(key)
+
+    def update_count(self, location, item, new_count):
+        """
+        Record an item's new count. Returns the event fired, if it crossed its threshold.
+        """
+        key = (location, item)
+        with self.lock:
+            self._counts[key] = new_count
+            self._positions.setdefault(key, (len(self.locations), len(self._positions)))
+            event = self._refresh(key)
+        if event is not None:
+            self._notify(event)
+        return event
+
+    def set_threshold(self, location, item, threshold):
+        """
+        Record an item's threshold (None removes it). Returns the event fired, if any.
+        """
+        key = (location, item)
+        with self.lock:
+            if threshold is None:
+                self._thresholds.pop(key, None)
+            else:
+                self._thresholds[key] = threshold
+            self._positions.setdefault(key, (len(self.locations), len(self._positions)))
+            event = self._refresh(key)
+        if event is not None:
+            self._notify(event)
+        return event
+
+    # --- Reads ---
+
+    def low_stock(self, locations=None):
+        """
+        [(location, item, count, threshold)] below threshold, in location and sheet order.
+        """
+        with self.lock:
+            keys = [key for key in self._below if locations is None or key[0] in locations]
+            keys.sort(key=self._positions.get)
+            return [(key[0], key[1], self._counts[key], self._thresholds[key]) for key in keys]
+
+    def entries(self, locations=None):
+        """
+        [(location, item, count, threshold)] of every item, threshold None if it
+        has none, in location and sheet order.
+        """
+        with self.lock:
+            keys = [key for key in self._counts if locations is None or key[0] in locations]
+            keys.sort(key=self._positions.get)
+            return [(key[0], key[1], self._counts[key], self._thresholds.get(key)) for key in keys]
+
+    def is_low(self, location, item):
+        return (location, item) in self._below
+
+    def __len__(self):
+        return len(self._below)
@@ -0,0 +1,308 @@
+# Daily rollups of the *_Timestamps logs for historical reporting.
+#
+# Per (location, item, day): units added and subtracted, the rows logged and
+# the SANs moved, in a few small SQLite tables. Every log_change() folds its
+# row in as it is logged, so a report over any date range reads the rollups
+# only, however long the logs grow. Each location's marker records how far
+# into its log the rollups reach (the storage backend's log_since() marker),
+# so rows logged without log_change() (an import, a replayed journal, a crash
+# between the two writes) are folded in on the next use, and an empty rollup
+# store backfills itself from the whole log.
+#
+# The SQLite backend keeps the tables in its own database, committed with the
+# log row; the workbook backend keeps them next to the workbook in
+# <workbook stem>.rollups.db.
+#
+# Usage:
+#   python rollups.py backfill EUC_Perth_Assets.xlsx
+#   python rollups.py report EUC_Perth_Assets.xlsx --from 2025-09-01 --to 2025-09-30 --location BR --item G10
+#   python rollups.py report EUC_Perth_Assets.xlsx --period week
+
+import argparse
+import logging
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+from metrics import timed, timer
+
+# Keyed day first, so a report reads one contiguous range of each table
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    location  TEXT NOT NULL,
+    item      TEXT NOT NULL,
+    day       TEXT NOT NULL,
+    week      TEXT NOT NULL,
+    month     TEXT NOT NULL,
+    adds      INTEGER NOT NULL DEFAULT 0,
+    subtracts INTEGER NOT NULL DEFAULT 0,
+    rows      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, location, item)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_sans (
+    location TEXT NOT NULL,
+    item     TEXT NOT NULL,
+    day      TEXT NOT NULL,
+    week     TEXT NOT NULL,
+    month    TEXT NOT NULL,
+    san      TEXT NOT NULL,
+    PRIMARY KEY (day, location, item, san)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_markers (
+    location TEXT PRIMARY KEY,
+    marker   INTEGER NOT NULL
+);
+"""
+
+ROLLUP_TABLES = ('rollup_daily', 'rollup_sans', 'rollup_markers')
+
+# Report period -> SQL expression for the first day of the period containing a row's day.
+# Week (from Monday) and month starts are stored with each row so reports group on a plain column.
+PERIODS = {
+    'day': "day",
+    'week': "week",
+    'month': "month",
+    'year': "substr(month, 1, 4) || '-01-01'",
+}
+
+FIRST_DAY = '0000-01-01'
+LAST_DAY = '9999-12-31'
+
+
+def rollup_path_for(workbook_path):
+    path = Path(workbook_path)
+    return str(path.with_name(f"{path.stem}.rollups.db"))
+
+
+def _day_text(text):
+    """
+    'YYYY-MM-DD' of a Timestamp cell's text, or None if it doesn't start with a date.
+    """
+    if text is None or len(text) < 10 or text[4] != '-' or text[7] != '-':
+        return None
+    return text[:10]
+
+
+def _period_starts(day):
+    """
+    (week, month) starts of a 'YYYY-MM-DD' day, as 'YYYY-MM-DD'.
+    """
+    first = date.fromisoformat(day)
+    return (first - timedelta(days=first.weekday())).isoformat(), f"{day[:7]}-01"
+
+
+def _day_bound(value, default):
+    return default if value is None else str(value)[:10]
+
+
+class RollupStore:
+    """
+    Daily rollups in the tables of ROLLUP_SCHEMA on `conn`. `write()` returns
+    the context a change is committed in (the backend's, so a batch of log
+    rows and their rollups commit together); by default each change commits
+    on its own.
+    """
+
+    def __init__(self, conn, write=None):
+        self.conn = conn
+        self.conn.executescript(ROLLUP_SCHEMA)
+        self._write = write or (lambda: self.conn)
+        self.lock = threading.RLock()
+        self._current = False
+
+    @classmethod
+    def open_file(cls, path):
+        """
+        Rollups in their own database file (the workbook backend's sidecar).
+        """
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Losing the last commits is fine: catch_up() redoes them
+        return cls(conn)
+
+    def close(self):
+        self.conn.close()
+
+    # --- Updates ---
+
+    def markers(self):
+        return dict(self.conn.execute("SELECT location, marker FROM rollup_markers"))
+
+    def _fold(self, location, rows):
+        # Caller holds the lock and the write context. Rows are (Timestamp, Item, Action, SAN #).
+        # Imported on first use: both modules import storage, which imports this one
+        from inventory_core import logged_units
+        from storage import _timestamp_text
+
+        daily, sans, periods = {}, set(), {}
+        for timestamp, item, action, san_number in rows:
+            day = _day_text(_timestamp_text(timestamp))
+            moved = logged_units(item, action, san_number) if day is not None else None
+            if moved is None:
+                continue
+            if day not in periods:
+                try:
+                    periods[day] = _period_starts(day)
+                except ValueError:
+                    periods[day] = None  # Not a real date
+            if periods[day] is None:
+                continue
+            totals = daily.setdefault((location, item, day), [0, 0, 0])
+            totals[0 if moved[0] == 'add' else 1] += moved[1]
+            totals[2] += 1
+            if san_number:
+                sans.add((location, item, day, str(san_number)))
+        self.conn.executemany(
+            "INSERT INTO rollup_daily (location, item, day, week, month, adds, subtracts, rows) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (day, location, item) DO UPDATE SET adds = adds + excluded.adds, "
+            "subtracts = subtracts + excluded.subtracts, rows = rows + excluded.rows",
+            [(location, item, day, *periods[day], *totals) for (location, item, day), totals in daily.items()])
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO rollup_sans (location, item, day, week, month, san) VALUES (?, ?, ?, ?, ?, ?)",
+            [(location, item, day, *periods[day], san) for location, item, day, san in sans])
+
+    def _set_marker(self, location, marker):
+        self.conn.execute("INSERT INTO rollup_markers (location, marker) VALUES (?, ?) "
+                          "ON CONFLICT (location) DO UPDATE SET marker = excluded.marker", (location, marker))
+
+    def record(self, location, row, marker):
+        """
+        Fold in one row just logged to `location`; `marker` is the log_since()
+        marker just past it. Ignored until catch_up() has run, which reads it
+        from the log instead.
+        """
+        if not self._current:
+            return
+        with self.lock, timer('rollup.record'), self._write():
+            self._fold(location, [row])
+            self._set_marker(location, marker)
+
+    @timed('rollup.catch_up')
+    def catch_up(self, storage, locations):
+        """
+        Fold in the rows each location logged past its marker; all of them for a
+        new store. A log shorter than its marker (replaced or restored file)
+        is rebuilt from scratch. Returns the number of rows folded in.
+        """
+        folded = 0
+        with self.lock:
+            markers = self.markers()
+            if any(markers.get(location, 0) > storage.log_extent(location) for location in locations):
+                logging.warning("Rollups are ahead of the log; rebuilding them")
+                with self._write():
+                    for table in ROLLUP_TABLES:
+                        self.conn.execute(f"DELETE FROM {table}")
+                markers = {}
+            for location in locations:
+                rows, marker = storage.log_since(location, markers.get(location, 0))
+                with self._write():
+                    self._fold(location, rows)
+                    self._set_marker(location, marker)
+                folded += len(rows)
+            self._current = True
+        if folded:
+            logging.info(f"Folded {folded} log rows into the rollups")
+        return folded
+
+    def rebuild(self, storage, locations):
+        """
+        Drop the rollups and backfill them from the whole log. Returns the rows folded in.
+        """
+        with self.lock:
+            with self._write():
+                for table in ROLLUP_TABLES:
+                    self.conn.execute(f"DELETE FROM {table}")
+            self._current = False
+            return self.catch_up(storage, locations)
+
+    # --- Reports ---
+
+    @staticmethod
+    def _filters(start, end, location, item):
+        clauses, params = ["day BETWEEN ? AND ?"], [_day_bound(start, FIRST_DAY), _day_bound(end, LAST_DAY)]
+        if location is not None:
+            clauses.append("location = ?")
+            params.append(location)
+        if item is not None:
+            # Contains, case-insensitively; %, _ and \ in the name match only themselves
+            clauses.append("item LIKE ? ESCAPE '\\'")
+            params.append("%" + item.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        return " AND ".join(clauses), params
+
+    @timed('rollup.report')
+    def totals(self, start=None, end=None, location=None, item=None):
+        """
+        [(location, item, added, subtracted, net, distinct SANs)] between two
+        days inclusive ('YYYY-MM-DD', date or None for open-ended), optionally
+        for one location and items whose name contains `item` ('G10').
+        """
+        where, params = self._filters(start, end, location, item)
+        with self.lock:
+            totals = self.conn.execute(
+                f"SELECT location, item, SUM(adds), SUM(subtracts) FROM rollup_daily WHERE {where} "
+                f"GROUP BY location, item ORDER BY location, item", params).fetchall()
+            sans = dict(((row[0], row[1]), row[2]) for row in self.conn.execute(
+                f"SELECT location, item, COUNT(DISTINCT san) FROM rollup_sans WHERE {where} GROUP BY location, item",
+                params))
+        return [(location, item, added, subtracted, added - subtracted, sans.get((location, item), 0))
+                for location, item, added, subtracted in totals]
+
+    @timed('rollup.report')
+    def series(self, period='week', start=None, end=None, location=None, item=None):
+        """
+        [(first day of period, added, subtracted, net, distinct SANs)] per
+        'day', 'week' (from Monday), 'month' or 'year', over the rows totals()
+        would match, oldest first. Periods with nothing logged are left out.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}' (expected one of {', '.join(PERIODS)})")
+        where, params = self._filters(start, end, location, item)
+        expression = PERIODS[period]
+        with self.lock:
+            totals = self.conn.execute(
+                f"SELECT {expression} AS period, SUM(adds), SUM(subtracts) FROM rollup_daily WHERE {where} "
+                f"GROUP BY period ORDER BY period", params).fetchall()
+            sans = dict(self.conn.execute(
+                f"SELECT {expression} AS period, COUNT(DISTINCT san) FROM rollup_sans WHERE {where} GROUP BY period",
+                params))
+        return [(period_start, added, subtracted, added - subtracted, sans.get(period_start, 0))
+                for period_start, added, subtracted in totals]
+
+
+def main():
+    # Imported on first use: inventory_core imports storage, which imports this module
+    from inventory_core import Inventory, LOCATIONS
+
+    parser = argparse.ArgumentParser(description="Daily rollups of the transaction logs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="Rebuild the rollups from the whole log")
+    backfill_parser.add_argument("file", help="Workbook or SQLite database")
+    report_parser = subparsers.add_parser("report", help="Adds, subtracts, net and distinct SANs from the rollups")
+    report_parser.add_argument("file", help="Workbook or SQLite database")
+    report_parser.add_argument("--from", dest="start", help="First day, YYYY-MM-DD")
+    report_parser.add_argument("--to", dest="end", help="Last day, YYYY-MM-DD")
+    report_parser.add_argument("--location", choices=LOCATIONS)
+    report_parser.add_argument("--item", help="Only items whose name contains this")
+    report_parser.add_argument("--period", choices=list(PERIODS), help="One line per period instead of per item")
+    args = parser.parse_args()
+
+    with Inventory.open(args.file) as inventory:
+        if args.command == "backfill":
+            print(f"Folded {inventory.rebuild_rollups()} log rows into the rollups of {args.file}")
+            return
+        if args.period:
+            print(f"{'Period':<12}{'Added':>8}{'Subtracted':>12}{'Net':>8}{'SANs':>8}")
+            for period_start, added, subtracted, net, sans in inventory.movement_series(
+                    args.period, args.start, args.end, args.location, args.item):
+                print(f"{period_start:<12}{added:>8}{subtracted:>12}{net:>8}{sans:>8}")
+        else:
+            print(f"{'Location':<10}{'Item':<32}{'Added':>8}{'Subtracted':>12}{'Net':>8}{'SANs':>8}")
+            for location, item, added, subtracted, net, sans in inventory.movement_totals(
+                    args.start, args.end, args.location, args.item):
+                print(f"{location:<10}{str(item):<32}{added:>8}{subtracted:>12}{net:>8}{sans:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# In-memory indexes over the All_SANs and *_Timestamps sheets.
+#
+# Maps each SAN to its row, item and location so uniqueness checks, removals
+# and location refreshes are dictionary lookups instead of sheet scans.
+
+import re
+from bisect import bisect_left, insort
+
+from metrics import timed
+
+SAN_PATTERN = re.compile(r"^(SAN)?\d{5,6}$")
+
+
+def is_valid_san(text):
+    return bool(SAN_PATTERN.match(str(text).strip().upper()))
+
+
+def normalise_san(san_number):
+    """
+    Return the SAN with the 'SAN' prefix used in the workbook.
+    """
+    san_number = str(san_number).strip()
+    return san_number if san_number.startswith("SAN") else "SAN" + san_number
+
+
+class SANIndex:
+    """
+    SAN -> (row, item, location) for the All_SANs sheet.
+
+    Rows shift up after delete_rows(), so entries store a stable key rather than
+    the row itself. The current row is the key minus the number of deleted keys
+    below it, which is a bisect over the (short) sorted list of deletions.
+    """
+
+    def __init__(self):
+        self._entries = {}  # SAN -> [key, item, location]
+        self._deleted = []  # sorted keys of deleted rows
+
+    @classmethod
+    @timed('scan.san_index')
+    def from_sheet(cls, sheet):
+        """
+        Build the index with a single pass over an All_SANs worksheet.
+        """
+        index = cls()
+        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, max_col=4, values_only=True), start=2):
+            san_number = row[0]
+            if not san_number:
+                continue
+            item = row[1] if len(row) > 1 else None
+            location = row[3] if len(row) > 3 else None
+            index._entries[str(san_number)] = [row_idx, item, location]
+        return index
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, san_number):
+        return normalise_san(san_number) in self._entries
+
+    def is_unique(self, san_number):
+        return normalise_san(san_number) not in self._entries
+
+    def get(self, san_number):
+        """
+        Return (row, item, location) for a SAN, or None if it is not in stock.
+        """
+        entry = self._entries.get(normalise_san(san_number))
+        if entry is None:
+            return None
+        key, item, location = entry
+        return self._row_for_key(key), item, location
+
+    def row_of(self, san_number):
+        entry = self.get(san_number)
+        return entry[0] if entry else None
+
+    def add(self, san_number, item, location, row):
+        """
+        Register a SAN that was just appended to the sheet at the given row.
+        """
+        # Every deleted key sits above the last live row, so this key maps back to `row`.
+        key = row + len(self._deleted)
+        self._entries[normalise_san(san_number)] = [key, item, location]
+
+    def remove(self, san_number):
+        """
+        Forget a SAN whose row was deleted from the sheet. Returns the row it occupied.
+        """
+        key, _, _ = self._entries.pop(normalise_san(san_number))
+        row = self._row_for_key(key)
+        insort(self._deleted, key)
+        return row
+
+    def set_location(self, san_number, location):
+        entry = self._entries.get(normalise_san(san_number))
+        if entry is not None:
+            entry[2] = location
+
+    def items(self):
+        """
+        Yield (san, row, item, location) for every indexed SAN.
+        """
+        for san_number, (key, item, location) in self._entries.items():
+            yield san_number, self._row_for_key(key), item, location
+
+    def _row_for_key(self, key):
+        return key - bisect_left(self._deleted, key)
+
+
+# Timestamp sheets and the short location code written to All_SANs column D
+TIMESTAMP_SHEET_LOCATIONS = {
+    '4.2_Timestamps': '4.2',
+    'BR_Timestamps': 'BR',
+    'Darwin_Timestamps': 'Darwin',
+    'L17_Timestamps': 'L17',
+    'B4.3_Timestamps': 'B4.3',
+}
+
+
+class SANLocationIndex:
+    """
+    SAN -> location of the most recent log entry for that SAN across the
+    *_Timestamps sheets.
+    """
+
+    def __init__(self):
+        self._latest = {}  # SAN -> (timestamp, location)
+
+    @classmethod
+    @timed('scan.san_locations')
+    def from_workbook(cls, workbook):
+        """
+        Build the map with one pass over the SAN column of each timestamp sheet.
+        """
+        index = cls()
+        for sheet_name, location in TIMESTAMP_SHEET_LOCATIONS.items():
+            if sheet_name not in workbook.sheetnames:
+                continue
+            sheet = workbook[sheet_name]
+            for row in sheet.iter_rows(min_row=2, max_col=4, values_only=True):
+                if len(row) < 4 or not row[3]:
+                    continue
+                index.record(row[3], location, row[0])
+        return index
+
+    def record(self, san_number, location, timestamp):
+        """
+        Note a log entry for a SAN; the latest timestamp wins.
+        """
+        san_number = normalise_san(san_number)
+        timestamp = str(timestamp) if timestamp is not None else ""
+        current = self._latest.get(san_number)
+        if current is None or timestamp >= current[0]:
+            self._latest[san_number] = (timestamp, location)
+
+    def location_of(self, san_number):
+        entry = self._latest.get(normalise_san(san_number))
+        return entry[1] if entry else None
@@ -0,0 +1,56 @@
+# Trigram search index for the "SANs In Stock" window.
+#
+# Each All_SANs row is indexed once by the lowercase trigrams of its SAN, item
+# and location. A query intersects the posting sets of its own trigrams and
+# only verifies the substring match on that short candidate list.
+
+NGRAM = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class SANSearchIndex:
+    """
+    Substring search over (SAN Number, Item, Time, Location) rows, matching on
+    SAN, item and location.
+    """
+
+    def __init__(self, rows):
+        self.rows = []
+        self._text = []
+        self._postings = {}
+        for row in rows:
+            if not row or row[0] is None:
+                continue
+            row = tuple(row[:4]) + (None,) * (4 - len(row[:4]))
+            san_number, item, _, location = row
+            text = " ".join(str(v) for v in (san_number, item, location) if v is not None).lower()
+            row_id = len(self.rows)
+            self.rows.append(row)
+            self._text.append(text)
+            for gram in _ngrams(text):
+                self._postings.setdefault(gram, []).append(row_id)
+
+    def search(self, query):
+        """
+        Return matching rows in sheet order. An empty query matches everything.
+        """
+        query = query.strip().lower()
+        if not query:
+            return list(self.rows)
+        if len(query) < NGRAM:
+            # Too short for a trigram; a scan of the prebuilt lowercase text is still cheap
+            return [self.rows[i] for i, text in enumerate(self._text) if query in text]
+
+        # Intersect the smallest posting lists first
+        postings = sorted((self._postings.get(gram, []) for gram in _ngrams(query)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [self.rows[i] for i in sorted(candidates) if query in self._text[i]]
@@ -0,0 +1,351 @@
+# Columnar snapshot cache of EUC_Perth_Assets.xlsx for read-only consumers.
+#
+# The first read parses the workbook once with openpyxl and writes every sheet
+# as a pickled list of columns under .snapshot_cache/ next to the workbook.
+# Later reads load those pickles directly while the workbook's mtime/size (or,
+# if only the mtime moved, its SHA-256) still match the manifest.
+#
+# read_sheet_rows() reads a single sheet straight from the xlsx archive, for
+# callers that need one small sheet before the whole workbook is parsed.
+#
+# Usage: python snapshot_cache.py [workbook.xlsx]   # reports cold vs warm load
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+from metrics import METRICS
+
+CACHE_DIR_NAME = ".snapshot_cache"
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_VERSION = 1
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SheetSnapshot:
+    """
+    One worksheet stored column by column. Offers the small part of the
+    openpyxl worksheet API the read-only consumers use.
+    """
+
+    def __init__(self, title, columns, n_rows):
+        self.title = title
+        self.columns = columns
+        self.max_row = n_rows
+        self.max_column = len(columns)
+
+    @classmethod
+    def from_rows(cls, title, rows):
+        rows = list(rows)
+        width = max((len(r) for r in rows), default=0)
+        columns = [[r[c] if c < len(r) else None for r in rows] for c in range(width)]
+        return cls(title, columns, len(rows))
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        """
+        Yield rows as tuples of values (1-based, inclusive bounds, like openpyxl).
+        """
+        columns = self.columns[:max_col] if max_col else self.columns
+        last_row = min(max_row, self.max_row) if max_row is not None else self.max_row
+        for r in range(min_row - 1, last_row):
+            yield tuple(col[r] for col in columns)
+
+    def to_frame(self):
+        """
+        DataFrame with the first row as the header, like pd.ExcelFile.parse().
+        """
+        import pandas as pd
+
+        if not self.max_row:
+            return pd.DataFrame()
+        header = [col[0] for col in self.columns]
+        data = {}
+        for idx, (name, col) in enumerate(zip(header, self.columns)):
+            data[name if name is not None else f"Unnamed: {idx}"] = col[1:]
+        df = pd.DataFrame(data)
+        # Excel reads skip rows with no values at all
+        return df.dropna(how='all').reset_index(drop=True)
+
+
+class WorkbookSnapshot:
+    """
+    Cached, read-only view of a workbook's sheets. `sheetnames` and
+    `snapshot[sheet_name]` mirror openpyxl, so consumers can swap it in for
+    load_workbook(..., data_only=True).
+    """
+
+    def __init__(self, workbook_path, cache_dir=None):
+        self.workbook_path = Path(workbook_path)
+        self.cache_dir = Path(cache_dir) if cache_dir else \
+            self.workbook_path.parent / CACHE_DIR_NAME / self.workbook_path.stem
+        self.manifest_path = self.cache_dir / MANIFEST_NAME
+        self.last_load = None  # ('cold' | 'warm', seconds)
+        self._sheets = {}
+        self._manifest = None
+
+    # --- Freshness ---
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get("version") == SNAPSHOT_VERSION else None
+
+    def is_fresh(self):
+        """
+        True if the cached sheets match the workbook currently on disk.
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            return False
+        stat = self.workbook_path.stat()
+        if manifest["mtime_ns"] == stat.st_mtime_ns and manifest["size"] == stat.st_size:
+            self._manifest = manifest
+            return True
+        # Touched but possibly unchanged (copied, synced, re-saved): compare content
+        if manifest["size"] != stat.st_size or manifest["sha256"] != file_sha256(self.workbook_path):
+            return False
+        manifest["mtime_ns"] = stat.st_mtime_ns
+        self._write_json(self.manifest_path, manifest)
+        self._manifest = manifest
+        return True
+
+    # --- Build / load ---
+
+    def build(self):
+        """
+        Parse the workbook once and write a snapshot of every sheet.
+        """
+        from openpyxl import load_workbook  # Imported on first use: it is slow to import
+
+        stat = self.workbook_path.stat()
+        sha256 = file_sha256(self.workbook_path)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        workbook = load_workbook(self.workbook_path, read_only=True, data_only=True)
+        sheets = {}
+        try:
+            for idx, sheet in enumerate(workbook.worksheets):
+                snapshot = SheetSnapshot.from_rows(sheet.title, sheet.iter_rows(values_only=True))
+                file_name = f"sheet_{idx:02d}.pkl"
+                tmp_path = self.cache_dir / (file_name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    pickle.dump((snapshot.columns, snapshot.max_row), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.cache_dir / file_name)
+                sheets[sheet.title] = file_name
+                self._sheets[sheet.title] = snapshot
+        finally:
+            workbook.close()
+
+        self._manifest = {
+            "version": SNAPSHOT_VERSION,
+            "workbook": str(self.workbook_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "sheets": sheets,
+        }
+        # Written last: a half-built cache never looks fresh
+        self._write_json(self.manifest_path, self._manifest)
+
+    def load(self):
+        """
+        Make the snapshot current, rebuilding it if the workbook changed.
+        Returns self.
+        """
+        start = time.perf_counter()
+        if self.is_fresh():
+            self._sheets = {}  # Sheets are read lazily from the cache
+            mode = "warm"
+        else:
+            self.build()
+            mode = "cold"
+        self.last_load = (mode, time.perf_counter() - start)
+        METRICS.observe(f"snapshot.load_{mode}", self.last_load[1])
+        logging.info(f"Workbook snapshot ({mode}) ready in {self.last_load[1] * 1000:.1f} ms")
+        return self
+
+    @property
+    def sheetnames(self):
+        return list(self._manifest["sheets"])
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self._manifest["sheets"]
+
+    def __getitem__(self, sheet_name):
+        snapshot = self._sheets.get(sheet_name)
+        if snapshot is None:
+            file_name = self._manifest["sheets"][sheet_name]
+            with open(self.cache_dir / file_name, "rb") as f:
+                columns, n_rows = pickle.load(f)
+            snapshot = SheetSnapshot(sheet_name, columns, n_rows)
+            self._sheets[sheet_name] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp_path = Path(str(path) + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+# --- Single-sheet reads ---
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def _column_index(cell_ref):
+    # 'AB12' -> 27
+    idx = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        idx = idx * 26 + ord(ch.upper()) - 64
+    return idx - 1
+
+
+def _text(element):
+    # Plain or rich text of an <is>/<si> element (phonetic runs are skipped)
+    if element is None:
+        return None
+    parts = [t.text or "" for t in element.findall(f"{_MAIN_NS}t")]
+    parts += [t.text or "" for t in element.findall(f"{_MAIN_NS}r/{_MAIN_NS}t")]
+    return "".join(parts)
+
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _sheet_member(archive, sheet_name):
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rel_id = next((sheet.get(f"{_REL_NS}id") for sheet in workbook.iter(f"{_MAIN_NS}sheet")
+                   if sheet.get("name") == sheet_name), None)
+    if rel_id is None:
+        raise KeyError(f"Worksheet {sheet_name} does not exist.")
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    target = next(rel.get("Target") for rel in rels if rel.get("Id") == rel_id)
+    return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+
+def _shared_strings(archive, wanted):
+    # Only as far into sharedStrings.xml as the largest index wanted
+    strings = {}
+    if not wanted or "xl/sharedStrings.xml" not in archive.namelist():
+        return strings
+    last = max(wanted)
+    with archive.open("xl/sharedStrings.xml") as f:
+        for idx, (_, element) in enumerate(
+                (event for event in ElementTree.iterparse(f) if event[1].tag == f"{_MAIN_NS}si")):
+            if idx in wanted:
+                strings[idx] = _text(element)
+            element.clear()
+            if idx >= last:
+                break
+    return strings
+
+
+def read_sheet_rows(workbook_path, sheet_name):
+    """
+    Rows of one sheet as value tuples (header first, padded to the widest row),
+    parsed straight from the xlsx archive without loading the other sheets.
+    Cells come back as text, int/float or bool; dates stay serial numbers and
+    formulas give their cached value. Raises KeyError if the sheet is missing.
+    """
+    with zipfile.ZipFile(workbook_path) as archive:
+        cells = {}  # row -> {column: (type, value)}
+        wanted = set()
+        with archive.open(_sheet_member(archive, sheet_name)) as f:
+            row_no = 0
+            for _, element in ElementTree.iterparse(f):
+                if element.tag != f"{_MAIN_NS}row":
+                    continue
+                row_no = int(element.get("r") or row_no + 1)
+                row = {}
+                col = -1
+                for cell in element.iter(f"{_MAIN_NS}c"):
+                    col = _column_index(cell.get("r")) if cell.get("r") else col + 1
+                    cell_type = cell.get("t", "n")
+                    if cell_type == "inlineStr":
+                        row[col] = ("str", _text(cell.find(f"{_MAIN_NS}is")))
+                        continue
+                    value = cell.findtext(f"{_MAIN_NS}v")
+                    if value is None:
+                        continue
+                    if cell_type == "s":
+                        wanted.add(int(value))
+                    row[col] = (cell_type, value)
+                if row:  # Formatting-only rows (often out at row 1048576) don't count
+                    cells[row_no] = row
+                element.clear()
+        strings = _shared_strings(archive, wanted)
+
+    def convert(cell_type, value):
+        if cell_type == "s":
+            return strings.get(int(value))
+        if cell_type == "n":
+            return _number(value)
+        if cell_type == "b":
+            return value == "1"
+        return value
+
+    width = max((max(row) + 1 for row in cells.values() if row), default=0)
+    return [tuple(convert(*cells[r][c]) if c in cells.get(r, {}) else None for c in range(width))
+            for r in range(1, max(cells, default=0) + 1)]
+
+
+def open_snapshot(workbook_path, cache_dir=None):
+    """
+    Return a fresh WorkbookSnapshot for the workbook, regenerating it if stale.
+    """
+    return WorkbookSnapshot(workbook_path, cache_dir).load()
+
+
+def report(workbook_path):
+    """
+    Time a cold build against a warm load and print both.
+    """
+    snapshot = WorkbookSnapshot(workbook_path)
+
+    start = time.perf_counter()
+    snapshot.build()
+    for sheet_name in snapshot.sheetnames:
+        list(snapshot[sheet_name].iter_rows())
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm_snapshot = open_snapshot(workbook_path)
+    for sheet_name in warm_snapshot.sheetnames:
+        list(warm_snapshot[sheet_name].iter_rows())
+    warm = time.perf_counter() - start
+
+    print(f"Workbook: {workbook_path}")
+    print(f"  Cold (parse xlsx + write snapshot): {cold * 1000:.1f} ms")
+    print(f"  Warm (load snapshot):               {warm * 1000:.1f} ms")
+    if warm > 0:
+        print(f"  Speedup: {cold / warm:.1f}x")
+
+
+if __name__ == '__main__':
+    report(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'EUC_Perth_Assets.xlsx'))
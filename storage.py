@@ -0,0 +1,893 @@
+# Storage backends for the EUC asset tracker.
+#
+# The GUI talks to one of these instead of to openpyxl directly:
+#   XlsxStorage   - EUC_Perth_Assets.xlsx, journalled (the original layout)
+#   SqliteStorage - an indexed SQLite database with the same data
+# open_storage() picks the backend from the file extension.
+#
+# Usage:
+#   python storage.py import EUC_Perth_Assets.xlsx EUC_Perth_Assets.db
+#   python storage.py export EUC_Perth_Assets.db EUC_Perth_Assets_export.xlsx
+
+import argparse
+import logging
+import sqlite3
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from background_writer import BackgroundWriter, SAVED
+from inventory_model import InventoryModel
+from log_archive import LogArchive
+from log_store import LogStore
+from metrics import count, timed, timer
+from rollups import RollupStore, rollup_path_for
+from san_index import SANIndex, SANLocationIndex, is_valid_san, normalise_san
+from workbook_journal import WorkbookJournal
+
+# Location code -> (items sheet, timestamps sheet)
+LOCATION_SHEETS = {
+    '4.2': ('4.2_Items', '4.2_Timestamps'),
+    'BR': ('BR_Items', 'BR_Timestamps'),
+    'L17': ('L17_Items', 'L17_Timestamps'),
+    'B4.3': ('B4.3_Items', 'B4.3_Timestamps'),
+    'Darwin': ('Darwin_Items', 'Darwin_Timestamps'),
+}
+
+ITEMS_HEADER = ["Item", "LastCount", "NewCount", "Threshold"]
+TIMESTAMPS_HEADER = ["Timestamp", "Item", "Action", "SAN #"]
+ALL_SANS_HEADER = ["SAN Number", "Item", "Time", "Location"]
+SAN_RETURNS_HEADER = ["SAN", "Gen", "Returned By", "Returned To", "Notes", "Timestamp"]
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+# SQL for log_store.is_logged_before(): a timestamp starting with a year, earlier than the parameter
+DATED_BEFORE = "timestamp GLOB '[0-9][0-9][0-9][0-9]-*' AND timestamp < ?"
+
+
+def open_storage(path, **kwargs):
+    """
+    Open the storage backend for a workbook (.xlsx) or database (.db/.sqlite) path.
+    """
+    if Path(path).suffix.lower() in SQLITE_SUFFIXES:
+        return SqliteStorage(path)
+    return XlsxStorage(path, **kwargs)
+
+
+def _timestamp_text(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return None if value is None else str(value)
+
+
+def _header_index(header, name):
+    """
+    0-based index of a header cell, matching case-insensitively and ignoring a
+    trailing ':' (the SAN_Returns sheet has 'Gen:'). None if absent.
+    """
+    for idx, cell in enumerate(header):
+        if cell is not None and str(cell).strip().rstrip(':').lower() == name.lower():
+            return idx
+    return None
+
+
+class XlsxStorage:
+    """
+    The workbook backend. Mutations go through the WorkbookJournal; reads are
+    served from in-memory indexes built once at open. Once started, the
+    workbook is saved by a BackgroundWriter: bursts of changes are coalesced
+    into one save (at most `compact_interval` seconds after the first change,
+    or `save_delay` seconds after the last).
+    """
+
+    backend = 'xlsx'
+
+    def __init__(self, workbook_path, compact_interval=60, save_delay=2.0):
+        from openpyxl import load_workbook  # Imported on first use: it is slow to import
+
+        self.path = str(workbook_path)
+        with timer('workbook.load'):
+            self.workbook = load_workbook(self.path)
+        self.writer = BackgroundWriter(self._save, coalesce_delay=save_delay, max_delay=compact_interval,
+                                       name="workbook-writer")
+
+        # Recover any changes journalled since the last compaction
+        self.journal = WorkbookJournal(self.workbook, self.path, on_record=self.writer.request_save)
+        self.journal.replay()
+
+        self.journal.create_sheet('All_SANs', ALL_SANS_HEADER)
+        self.san_index = SANIndex.from_sheet(self.workbook['All_SANs'])
+        self.san_locations = SANLocationIndex.from_workbook(self.workbook)
+        self.inventory = InventoryModel.from_workbook(self.workbook, [items for items, _ in LOCATION_SHEETS.values()])
+        self.logs = LogStore(self.workbook)
+        self.archive = LogArchive(self.path)
+        for location, (_, timestamps_sheet) in LOCATION_SHEETS.items():
+            self.logs.offsets[timestamps_sheet] = self.archive.count(location)
+            if self.archive.cutoff(location):
+                self.trim_log(location, self.archive.cutoff(location))  # Left live by an interrupted archive run
+        self.rollups = RollupStore.open_file(rollup_path_for(self.path))
+        self.rollups.catch_up(self, LOCATION_SHEETS)
+
+    # --- Lifecycle ---
+
+    def start(self, on_status=None):
+        """
+        Start the background writer. `on_status(status, error)` is called from
+        the writer thread on every dirty/saving/saved/error transition.
+        """
+        self.writer.on_status = on_status
+        self.writer.start()
+        if self.journal.pending:
+            self.writer.request_save()  # Fold in entries recovered by replay()
+
+    def close(self):
+        """
+        Flush outstanding changes to the workbook. Raises if the save fails; the
+        journal still holds the changes and they are replayed on next open.
+        """
+        try:
+            self.writer.close()
+            self.journal.close()
+        finally:
+            self.rollups.close()
+
+    def batch(self):
+        """
+        Group several changes into one journal write (and so one save).
+        """
+        return self.journal.batch()
+
+    def spreadsheet_path(self):
+        """
+        Path of an xlsx file with every change so far, for tools that read the file.
+        """
+        self.writer.flush()
+        return self.path
+
+    def _save(self):
+        self.journal.compact()
+
+    # --- Items ---
+
+    def items(self, location):
+        return self.inventory.rows(LOCATION_SHEETS[location][0])
+
+    def get_item(self, location, item):
+        return self.inventory.get(LOCATION_SHEETS[location][0], item)
+
+    def pop_changed(self, location):
+        return self.inventory.pop_changed(LOCATION_SHEETS[location][0])
+
+    def apply_count(self, location, item, operation, amount):
+        """
+        Move NewCount to LastCount and add/subtract `amount`. Returns
+        (last_count, new_count), or None if the item is unknown.
+        """
+        sheet_name = LOCATION_SHEETS[location][0]
+        count_change = self.inventory.apply_count(sheet_name, item, operation, amount)
+        if count_change is None:
+            return None
+        item_row, last_count, new_count = count_change
+        self.journal.set_cell(sheet_name, item_row, 2, last_count)
+        self.journal.set_cell(sheet_name, item_row, 3, new_count)
+        return last_count, new_count
+
+    # --- Thresholds ---
+
+    def _threshold_column(self, sheet, create=False):
+        header = [cell.value for cell in sheet[1]]
+        idx = _header_index(header, 'Threshold')
+        if idx is not None:
+            return idx + 1
+        if not create:
+            return None
+        column = sheet.max_column + 1
+        self.journal.set_cell(sheet.title, 1, column, 'Threshold')
+        return column
+
+    def ensure_thresholds(self, locations, default=10):
+        """
+        Add a Threshold column (filled with `default`) to item sheets without one.
+        Returns the sheets that were changed.
+        """
+        changed = []
+        for location in locations:
+            sheet_name = LOCATION_SHEETS[location][0]
+            if sheet_name not in self.workbook.sheetnames:
+                continue
+            sheet = self.workbook[sheet_name]
+            if self._threshold_column(sheet) is not None:
+                continue
+            column = self._threshold_column(sheet, create=True)
+            for row in range(2, sheet.max_row + 1):
+                self.journal.set_cell(sheet_name, row, column, default)
+            changed.append(sheet_name)
+        return changed
+
+    def set_threshold(self, location, item, threshold):
+        sheet_name = LOCATION_SHEETS[location][0]
+        item_row = self.inventory.row_of(sheet_name, item)
+        if item_row is None:
+            return False
+        column = self._threshold_column(self.workbook[sheet_name], create=True)
+        self.journal.set_cell(sheet_name, item_row, column, threshold)
+        return True
+
+    def thresholds(self, location):
+        """
+        {item: threshold} for the items of a location that have one.
+        """
+        sheet_name = LOCATION_SHEETS[location][0]
+        if sheet_name not in self.workbook.sheetnames:
+            return {}
+        sheet = self.workbook[sheet_name]
+        column = self._threshold_column(sheet)
+        if column is None:
+            return {}
+        return {row[0]: row[column - 1] for row in sheet.iter_rows(min_row=2, max_col=column, values_only=True)
+                if row[0] is not None and row[column - 1] is not None}
+
+    @timed('scan.low_stock')
+    def low_stock(self, locations):
+        """
+        Return [(location, item, new_count, threshold)] for items below threshold.
+        """
+        low_stock_items = []
+        for location in locations:
+            sheet_name = LOCATION_SHEETS[location][0]
+            if sheet_name not in self.workbook.sheetnames:
+                continue
+            sheet = self.workbook[sheet_name]
+            column = self._threshold_column(sheet)
+            if column is None:
+                continue
+            for row in sheet.iter_rows(min_row=2, max_col=max(column, 3), values_only=True):
+                item, new_count, item_threshold = row[0], row[2], row[column - 1]
+                if item is not None and new_count is not None and item_threshold is not None and new_count < item_threshold:
+                    low_stock_items.append((location, item, new_count, item_threshold))
+        return low_stock_items
+
+    # --- Transaction log ---
+
+    def log_change(self, location, item, action_text, san_number, timestamp):
+        """
+        Append a row to the location's log. Returns its chronological index.
+        """
+        sheet_name = LOCATION_SHEETS[location][1]
+        log_row = [timestamp, item, action_text, san_number]
+        self.journal.append_row(sheet_name, log_row)
+        if san_number:
+            self.san_locations.record(san_number, location, timestamp)
+        log_index = self.logs.append(sheet_name, log_row)
+        self.rollups.record(location, log_row, log_index + 1)
+        return log_index
+
+    def log_count(self, location):
+        """
+        Rows in the location's log, archived ones included.
+        """
+        return self.logs.count(LOCATION_SHEETS[location][1])
+
+    def log_page(self, location, start, size):
+        """
+        Up to `size` rows newest-first, skipping the `start` newest, as
+        (chronological index, row); continues into the archives past the live rows.
+        """
+        page = self.logs.page(LOCATION_SHEETS[location][1], start, size)
+        if len(page) < size:
+            live = self.log_count(location) - self.archive.count(location)
+            page += self.archive.page(location, max(start - live, 0), size - len(page))
+        return page
+
+    def log_since(self, location, marker=0):
+        """
+        Rows logged to a location after `marker` (0 = all of them), as
+        (Timestamp, Item, Action, SAN #), and the marker to pass next time.
+        """
+        sheet_name = LOCATION_SHEETS[location][1]
+        offset = self.logs.offsets.get(sheet_name, 0)
+        rows = self.archive.rows(location, marker, offset) if marker < offset else []
+        rows += self.logs.rows(sheet_name, marker)
+        return rows, marker + len(rows)
+
+    def log_extent(self, location):
+        """
+        The marker log_since() would return after reading the whole log.
+        """
+        return self.log_count(location)
+
+    def log_before(self, location, cutoff):
+        """
+        Live rows logged before `cutoff` (timestamp text), oldest first.
+        """
+        return self.logs.rows_before(LOCATION_SHEETS[location][1], cutoff)
+
+    def trim_log(self, location, cutoff):
+        """
+        Drop the live rows logged before `cutoff`, once they are in the archive.
+        Returns the number dropped.
+        """
+        sheet_name = LOCATION_SHEETS[location][1]
+        removed = self.logs.trim(sheet_name, cutoff)
+        if removed:
+            self.journal.trim_rows(sheet_name, cutoff)
+        self.logs.offsets[sheet_name] = self.archive.count(location)
+        return removed
+
+    # --- SANs ---
+
+    def is_san_unique(self, san_number):
+        return self.san_index.is_unique(san_number)
+
+    def get_san(self, san_number):
+        """
+        Return (item, location) for a SAN in stock, or None.
+        """
+        entry = self.san_index.get(san_number)
+        return (entry[1], entry[2]) if entry else None
+
+    def add_san(self, san_number, item, location, timestamp):
+        san_row = self.journal.append_row('All_SANs', [san_number, item, timestamp, location])
+        self.san_index.add(san_number, item, location, san_row)
+
+    def remove_san(self, san_number):
+        self.journal.delete_row('All_SANs', self.san_index.remove(san_number))
+
+    @timed('scan.refresh_san_locations')
+    def refresh_san_locations(self):
+        """
+        Set each SAN's Location to where it was last logged, writing only
+        changed cells. Returns the number of SANs updated.
+        """
+        if self.workbook['All_SANs'].max_column < 4:
+            self.journal.set_cell('All_SANs', 1, 4, "Location")
+
+        changed = []
+        for san_number, row_idx, _, location in self.san_index.items():
+            logged_location = self.san_locations.location_of(san_number)
+            if logged_location is not None and logged_location != location:
+                changed.append((san_number, row_idx, logged_location))
+
+        for san_number, row_idx, location in changed:
+            self.journal.set_cell('All_SANs', row_idx, 4, location)
+            self.san_index.set_location(san_number, location)
+        return len(changed)
+
+    @timed('scan.all_sans')
+    def all_sans(self):
+        """
+        (SAN Number, Item, Time, Location) rows in sheet order.
+        """
+        return [row for row in self.workbook['All_SANs'].iter_rows(min_row=2, max_col=4, values_only=True)
+                if row[0] is not None]
+
+    # --- Returns ---
+
+    def san_returns(self):
+        if 'SAN_Returns' not in self.workbook.sheetnames:
+            return []
+        return list(self.workbook['SAN_Returns'].iter_rows(min_row=2, values_only=True))
+
+    def add_san_return(self, san, gen, returned_by, returned_to, notes, timestamp):
+        self.journal.create_sheet('SAN_Returns', SAN_RETURNS_HEADER)
+        self.journal.append_row('SAN_Returns', [san, gen, returned_by, returned_to, notes, timestamp])
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    location   TEXT NOT NULL,
+    item       TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    last_count INTEGER,
+    new_count  INTEGER,
+    PRIMARY KEY (location, item)
+);
+CREATE TABLE IF NOT EXISTS thresholds (
+    location  TEXT NOT NULL,
+    item      TEXT NOT NULL,
+    threshold INTEGER NOT NULL,
+    PRIMARY KEY (location, item)
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    location  TEXT NOT NULL,
+    timestamp TEXT,
+    item      TEXT,
+    action    TEXT,
+    san       TEXT
+);
+CREATE TABLE IF NOT EXISTS sans (
+    san       TEXT PRIMARY KEY,
+    item      TEXT,
+    timestamp TEXT,
+    location  TEXT
+);
+CREATE TABLE IF NOT EXISTS san_returns (
+    id          INTEGER PRIMARY KEY,
+    san         TEXT,
+    gen         TEXT,
+    returned_by TEXT,
+    returned_to TEXT,
+    notes       TEXT,
+    timestamp   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_items_location ON items (location, position);
+CREATE INDEX IF NOT EXISTS idx_transactions_location_time ON transactions (location, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_item ON transactions (item);
+CREATE INDEX IF NOT EXISTS idx_transactions_san ON transactions (san);
+CREATE INDEX IF NOT EXISTS idx_sans_item ON sans (item);
+CREATE INDEX IF NOT EXISTS idx_sans_location ON sans (location);
+CREATE INDEX IF NOT EXISTS idx_san_returns_san ON san_returns (san);
+"""
+
+
+class SqliteStorage:
+    """
+    The SQLite backend. Same interface as XlsxStorage; every change is its
+    own small committed transaction instead of a workbook rewrite.
+
+    The connection is shared between threads (check_same_thread=False) but
+    has no lock here: callers must use it from one thread at a time. The GUI
+    hands it from the loader thread to the Tk thread through load_queue and
+    then only uses it on the Tk thread; the inventory service runs every
+    call under InventoryService.lock.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path):
+        self.path = str(db_path)
+        # Opened on one thread, used on another: see the class docstring for what serializes access
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_transaction_ids()
+        self._changed = {location: set() for location in LOCATION_SHEETS}
+        self._batch_depth = 0
+        self._live_counts = {}  # location -> rows in transactions, counted once and then kept up to date
+        self.archive = LogArchive(self.path)
+        for location in LOCATION_SHEETS:
+            if self.archive.cutoff(location):
+                self.trim_log(location, self.archive.cutoff(location))  # Left live by an interrupted archive run
+        self.rollups = RollupStore(self.conn, write=self._write)
+        self.rollups.catch_up(self, LOCATION_SHEETS)
+
+    # --- Lifecycle ---
+
+    def _migrate_transaction_ids(self):
+        """
+        Databases made before transactions.id was AUTOINCREMENT reuse the ids
+        of deleted (archived) rows, which log_since() markers can't tell apart
+        from new ones. Copy the table into the current schema, keeping the ids.
+        """
+        sql = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone()[0]
+        if 'AUTOINCREMENT' in sql.upper():
+            return
+        logging.info(f"Migrating the transactions table of {self.path} to AUTOINCREMENT ids")
+        try:
+            # SCHEMA creates the new table; the old one's indexes go with it and are recreated below
+            self.conn.executescript(
+                "BEGIN; ALTER TABLE transactions RENAME TO transactions_old;" + SCHEMA +
+                "INSERT INTO transactions (id, location, timestamp, item, action, san) "
+                "SELECT id, location, timestamp, item, action, san FROM transactions_old; "
+                "DROP TABLE transactions_old; COMMIT;")
+        except sqlite3.Error:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            raise
+        self.conn.executescript(SCHEMA)
+
+    def start(self, on_status=None):
+        # Each change is committed as it is made; there is never a pending save
+        if on_status is not None:
+            on_status(SAVED, None)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def batch(self):
+        """
+        Run several changes as one SQLite transaction.
+        """
+        self._batch_depth += 1
+        try:
+            with self.conn if self._batch_depth == 1 else nullcontext():
+                yield self
+        except BaseException:
+            self._live_counts.clear()  # The inserts may have been rolled back; count again
+            raise
+        finally:
+            self._batch_depth -= 1
+
+    def _write(self):
+        # Commit each change on its own unless it is part of a batch
+        return nullcontext() if self._batch_depth else self.conn
+
+    def spreadsheet_path(self):
+        """
+        Export the database to its own .xlsx next to it (see export_path_for())
+        and return that path.
+        """
+        xlsx_path = export_path_for(self.path)
+        export_xlsx(self, xlsx_path)
+        return xlsx_path
+
+    # --- Items ---
+
+    def items(self, location):
+        return self.conn.execute(
+            "SELECT item, last_count, new_count FROM items WHERE location = ? ORDER BY position",
+            (location,)).fetchall()
+
+    def get_item(self, location, item):
+        return self.conn.execute(
+            "SELECT item, last_count, new_count FROM items WHERE location = ? AND item = ?",
+            (location, item)).fetchone()
+
+    def pop_changed(self, location):
+        changed = self._changed.get(location, set())
+        self._changed[location] = set()
+        return changed
+
+    def apply_count(self, location, item, operation, amount):
+        row = self.get_item(location, item)
+        if row is None:
+            return None
+        last_count = row[2] or 0
+        new_count = last_count + amount if operation == 'add' else max(last_count - amount, 0)
+        with self._write():
+            self.conn.execute(
+                "UPDATE items SET last_count = ?, new_count = ? WHERE location = ? AND item = ?",
+                (last_count, new_count, location, item))
+        self._changed.setdefault(location, set()).add(item)
+        return last_count, new_count
+
+    # --- Thresholds ---
+
+    def ensure_thresholds(self, locations, default=10):
+        changed = []
+        with self._write():
+            for location in locations:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO thresholds (location, item, threshold) "
+                    "SELECT location, item, ? FROM items WHERE location = ?", (default, location))
+                if cursor.rowcount:
+                    changed.append(LOCATION_SHEETS[location][0])
+        return changed
+
+    def set_threshold(self, location, item, threshold):
+        if self.get_item(location, item) is None:
+            return False
+        with self._write():
+            self.conn.execute(
+                "INSERT INTO thresholds (location, item, threshold) VALUES (?, ?, ?) "
+                "ON CONFLICT (location, item) DO UPDATE SET threshold = excluded.threshold",
+                (location, item, threshold))
+        return True
+
+    def thresholds(self, location):
+        return dict(self.conn.execute(
+            "SELECT item, threshold FROM thresholds WHERE location = ? AND threshold IS NOT NULL", (location,)))
+
+    @timed('scan.low_stock')
+    def low_stock(self, locations):
+        placeholders = ", ".join("?" for _ in locations)
+        return self.conn.execute(
+            f"SELECT i.location, i.item, i.new_count, t.threshold FROM items i "
+            f"JOIN thresholds t ON t.location = i.location AND t.item = i.item "
+            f"WHERE i.location IN ({placeholders}) AND i.new_count < t.threshold "
+            f"ORDER BY i.location, i.position", list(locations)).fetchall()
+
+    # --- Transaction log ---
+
+    def log_change(self, location, item, action_text, san_number, timestamp):
+        live = self._live_count(location)
+        with self._write():
+            cursor = self.conn.execute(
+                "INSERT INTO transactions (location, timestamp, item, action, san) VALUES (?, ?, ?, ?, ?)",
+                (location, timestamp, item, action_text, san_number or None))
+            self.rollups.record(location, (timestamp, item, action_text, san_number), cursor.lastrowid)
+        self._live_counts[location] = live + 1
+        return self.archive.count(location) + live
+
+    def _live_count(self, location):
+        live = self._live_counts.get(location)
+        if live is None:
+            live = self.conn.execute("SELECT COUNT(*) FROM transactions WHERE location = ?",
+                                     (location,)).fetchone()[0]
+            self._live_counts[location] = live
+        return live
+
+    def log_count(self, location):
+        return self.archive.count(location) + self._live_count(location)
+
+    def log_page(self, location, start, size):
+        rows = self.conn.execute(
+            "SELECT timestamp, item, action, san FROM transactions WHERE location = ? "
+            "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?", (location, size, start)).fetchall()
+        archived = self.archive.count(location)
+        live = self.log_count(location) - archived
+        newest = archived + live - 1 - start
+        page = [(newest - offset, row) for offset, row in enumerate(rows)]
+        if len(page) < size:
+            page += self.archive.page(location, max(start - live, 0), size - len(page))
+        return page
+
+    def log_since(self, location, marker=0):
+        # The marker is the last id seen, so archived rows only come with marker 0. The unary +
+        # keeps SQLite on the rowid range instead of the location index, so a refresh reads only new rows.
+        archived = self.archive.rows(location) if marker == 0 else []
+        rows = self.conn.execute(
+            "SELECT id, timestamp, item, action, san FROM transactions WHERE +location = ? AND id > ? ORDER BY id",
+            (location, marker)).fetchall()
+        if rows:
+            return archived + [row[1:] for row in rows], rows[-1][0]
+        if archived:
+            # Archived only: every row with an id handed out so far is archived, so the next new one is past it
+            return archived, self._last_id()
+        return archived, marker
+
+    def log_extent(self, location):
+        # AUTOINCREMENT never hands out an id twice, so a marker past the last one means the rows were replaced.
+        # (The whole table's, not the location's: archiving may have emptied the location.)
+        return self._last_id()
+
+    def _last_id(self):
+        found = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+        return found[0] if found else 0
+
+    def log_before(self, location, cutoff):
+        return self.conn.execute(
+            f"SELECT timestamp, item, action, san FROM transactions WHERE location = ? AND {DATED_BEFORE} "
+            f"ORDER BY timestamp, id", (location, cutoff)).fetchall()
+
+    def trim_log(self, location, cutoff):
+        with self._write():
+            cursor = self.conn.execute(f"DELETE FROM transactions WHERE location = ? AND {DATED_BEFORE}",
+                                       (location, cutoff))
+        self._live_counts.pop(location, None)
+        return cursor.rowcount
+
+    # --- SANs ---
+
+    def is_san_unique(self, san_number):
+        return self.get_san(san_number) is None
+
+    def get_san(self, san_number):
+        return self.conn.execute("SELECT item, location FROM sans WHERE san = ?",
+                                 (normalise_san(san_number),)).fetchone()
+
+    def add_san(self, san_number, item, location, timestamp):
+        with self._write():
+            self.conn.execute("INSERT INTO sans (san, item, timestamp, location) VALUES (?, ?, ?, ?)",
+                              (normalise_san(san_number), item, timestamp, location))
+
+    def remove_san(self, san_number):
+        with self._write():
+            self.conn.execute("DELETE FROM sans WHERE san = ?", (normalise_san(san_number),))
+
+    @timed('scan.refresh_san_locations')
+    def refresh_san_locations(self):
+        latest = ("(SELECT t.location FROM transactions t WHERE t.san = sans.san "
+                  "ORDER BY t.timestamp DESC, t.id DESC LIMIT 1)")
+        with self._write():
+            cursor = self.conn.execute(
+                f"UPDATE sans SET location = {latest} "
+                f"WHERE {latest} IS NOT NULL AND location IS NOT {latest}")
+        return cursor.rowcount
+
+    @timed('scan.all_sans')
+    def all_sans(self):
+        return self.conn.execute("SELECT san, item, timestamp, location FROM sans ORDER BY rowid").fetchall()
+
+    # --- Returns ---
+
+    def san_returns(self):
+        return self.conn.execute(
+            "SELECT san, gen, returned_by, returned_to, notes, timestamp FROM san_returns ORDER BY id").fetchall()
+
+    def add_san_return(self, san, gen, returned_by, returned_to, notes, timestamp):
+        with self._write():
+            self.conn.execute(
+                "INSERT INTO san_returns (san, gen, returned_by, returned_to, notes, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (san, gen, returned_by, returned_to, notes, timestamp))
+
+
+@timed('san.check_batch')
+def check_san_batch(storage, item, operation, san_numbers):
+    """
+    Validate a batch of scanned SANs for adding to or removing from `item` in
+    one pass. Returns a list aligned with san_numbers holding None for SANs
+    that can be committed, or a short description of the problem.
+    """
+    problems = []
+    seen = set()
+    for san_number in san_numbers:
+        if not is_valid_san(san_number):
+            problems.append("Not a valid SAN number")
+            continue
+        san_number = normalise_san(san_number)
+        entry = storage.get_san(san_number)
+        if san_number in seen:
+            problems.append("Duplicate in this batch")
+        elif operation == 'add' and entry is not None:
+            problems.append(f"Already in stock ({entry[0]} at {entry[1]})" if entry[1] else f"Already in stock ({entry[0]})")
+        elif operation == 'subtract' and entry is None:
+            problems.append("Not in stock")
+        elif operation == 'subtract' and entry[0] != item:
+            problems.append(f"Belongs to {entry[0]}")
+        else:
+            problems.append(None)
+        seen.add(san_number)
+    return problems
+
+
+@timed('san.commit_batch')
+def commit_san_batch(storage, location, item, operation, san_numbers, timestamp):
+    """
+    Add or remove a validated batch of SANs as one storage batch: the All_SANs
+    changes, a log row per SAN, the count change and the volume log row.
+    Returns the logged rows as [(chronological index, row)], oldest first.
+    """
+    san_numbers = [normalise_san(san_number) for san_number in san_numbers]
+    logged = []
+    with storage.batch():
+        for san_number in san_numbers:
+            if operation == 'add':
+                storage.add_san(san_number, item, location, timestamp)
+            else:
+                storage.remove_san(san_number)
+            log_index = storage.log_change(location, item, operation, san_number, timestamp)
+            logged.append((log_index, [timestamp, item, operation, san_number]))
+        storage.apply_count(location, item, operation, len(san_numbers))
+        action_text = f"{operation} {len(san_numbers)}"
+        log_index = storage.log_change(location, item, action_text, "", timestamp)
+        logged.append((log_index, [timestamp, item, action_text, ""]))
+    count('san.committed', len(san_numbers))
+    return logged
+
+
+def import_workbook(xlsx_path, db_path):
+    """
+    Create (or replace the contents of) a SQLite database from a workbook in
+    the EUC_Perth_Assets.xlsx layout. Returns the opened SqliteStorage.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    storage = SqliteStorage(db_path)
+    conn = storage.conn
+    try:
+        with conn:
+            for table in ('items', 'thresholds', 'transactions', 'sans', 'san_returns'):
+                conn.execute(f"DELETE FROM {table}")
+
+            for location, (items_sheet, timestamps_sheet) in LOCATION_SHEETS.items():
+                if items_sheet in workbook.sheetnames:
+                    rows = workbook[items_sheet].iter_rows(values_only=True)
+                    header = next(rows, ())
+                    threshold_idx = _header_index(header, 'Threshold')
+                    for position, row in enumerate(rows):
+                        if not row or row[0] is None:
+                            continue
+                        last_count = row[1] if len(row) > 1 else None
+                        new_count = row[2] if len(row) > 2 else None
+                        conn.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)",
+                                     (location, row[0], position, last_count, new_count))
+                        if threshold_idx is not None and len(row) > threshold_idx and row[threshold_idx] is not None:
+                            conn.execute("INSERT OR REPLACE INTO thresholds VALUES (?, ?, ?)",
+                                         (location, row[0], row[threshold_idx]))
+
+                if timestamps_sheet in workbook.sheetnames:
+                    conn.executemany(
+                        "INSERT INTO transactions (location, timestamp, item, action, san) VALUES (?, ?, ?, ?, ?)",
+                        ((location, _timestamp_text(row[0]), row[1] if len(row) > 1 else None,
+                          row[2] if len(row) > 2 else None, (row[3] if len(row) > 3 else None) or None)
+                         for row in workbook[timestamps_sheet].iter_rows(min_row=2, max_col=4, values_only=True)
+                         if row and row[0] is not None))
+
+            if 'All_SANs' in workbook.sheetnames:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sans (san, item, timestamp, location) VALUES (?, ?, ?, ?)",
+                    ((str(row[0]), row[1], _timestamp_text(row[2]), row[3])
+                     for row in workbook['All_SANs'].iter_rows(min_row=2, max_col=4, values_only=True)
+                     if row and row[0] is not None))
+
+            if 'SAN_Returns' in workbook.sheetnames:
+                rows = workbook['SAN_Returns'].iter_rows(values_only=True)
+                header = next(rows, ())
+                columns = [_header_index(header, name) for name in SAN_RETURNS_HEADER]
+                for row in rows:
+                    if not row or row[0] is None:
+                        continue
+                    values = [row[idx] if idx is not None and idx < len(row) else None for idx in columns]
+                    values[-1] = _timestamp_text(values[-1])
+                    conn.execute(
+                        "INSERT INTO san_returns (san, gen, returned_by, returned_to, notes, timestamp) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", values)
+    finally:
+        workbook.close()
+    storage._live_counts.clear()  # Rows were inserted behind its back
+    storage.rollups.rebuild(storage, LOCATION_SHEETS)
+    logging.info(f"Imported {xlsx_path} into {db_path}")
+    return storage
+
+
+def export_path_for(db_path):
+    """
+    Where spreadsheet_path() exports a database: EUC_Perth_Assets.db ->
+    EUC_Perth_Assets_db_export.xlsx. Never the name of the workbook it was
+    imported from (EUC_Perth_Assets.xlsx), which the export would overwrite.
+    """
+    path = Path(db_path)
+    return str(path.with_name(f"{path.stem}_{path.suffix.lower().lstrip('.')}_export.xlsx"))
+
+
+@timed('sqlite.export_xlsx')
+def export_xlsx(storage, xlsx_path):
+    """
+    Write a SqliteStorage out as a workbook in the EUC_Perth_Assets.xlsx layout.
+    """
+    from openpyxl import Workbook
+
+    conn = storage.conn
+    workbook = Workbook(write_only=True)
+
+    all_sans = workbook.create_sheet('All_SANs')
+    all_sans.append(ALL_SANS_HEADER)
+    for row in storage.all_sans():
+        all_sans.append(list(row))
+
+    for location, (items_sheet, timestamps_sheet) in LOCATION_SHEETS.items():
+        sheet = workbook.create_sheet(items_sheet)
+        sheet.append(ITEMS_HEADER)
+        for row in conn.execute(
+                "SELECT i.item, i.last_count, i.new_count, t.threshold FROM items i "
+                "LEFT JOIN thresholds t ON t.location = i.location AND t.item = i.item "
+                "WHERE i.location = ? ORDER BY i.position", (location,)):
+            sheet.append(list(row))
+
+        sheet = workbook.create_sheet(timestamps_sheet)
+        sheet.append(TIMESTAMPS_HEADER)
+        for row in conn.execute(
+                "SELECT timestamp, item, action, san FROM transactions WHERE location = ? ORDER BY id",
+                (location,)):
+            sheet.append(list(row))
+
+    returns_sheet = workbook.create_sheet('SAN_Returns')
+    returns_sheet.append(SAN_RETURNS_HEADER)
+    for row in storage.san_returns():
+        returns_sheet.append(list(row))
+
+    workbook.save(xlsx_path)
+    logging.info(f"Exported {storage.path} to {xlsx_path}")
+    return xlsx_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move EUC asset data between the workbook and SQLite.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Create a SQLite database from a workbook")
+    import_parser.add_argument("xlsx")
+    import_parser.add_argument("db")
+    export_parser = subparsers.add_parser("export", help="Write a SQLite database out as a workbook")
+    export_parser.add_argument("db")
+    export_parser.add_argument("xlsx")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_workbook(args.xlsx, args.db).close()
+        print(f"Imported {args.xlsx} into {args.db}")
+    else:
+        storage = SqliteStorage(args.db)
+        try:
+            export_xlsx(storage, args.xlsx)
+        finally:
+            storage.close()
+        print(f"Exported {args.db} to {args.xlsx}")
+
+
+if __name__ == '__main__':
+    main()
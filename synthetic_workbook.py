@@ -0,0 +1,203 @@
+# Synthetic EUC_Perth_Assets.xlsx workbooks for benchmarking.
+#
+# Writes the real sheet layout (*_Items, *_Timestamps, All_SANs, SAN_Returns)
+# with a given number of transaction rows spread over the five locations.
+# SAN-tracked items (G8/G9/G10) are added with new SANs and removed from the
+# SANs in stock, so All_SANs holds exactly the SANs still in stock. Output is
+# deterministic for a given size and seed.
+#
+# Usage: python synthetic_workbook.py 1k 10k 100k 1M [--out-dir benchmarks/workbooks] [--seed 0]
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from inventory_core import is_san_item
+from storage import ALL_SANS_HEADER, ITEMS_HEADER, LOCATION_SHEETS, SAN_RETURNS_HEADER, TIMESTAMPS_HEADER
+
+DEFAULT_OUT_DIR = Path(__file__).parent / "benchmarks" / "workbooks"
+STANDARD_SIZES = ['1k', '10k', '100k', '1M']
+GENERATOR_VERSION = 1
+
+ITEMS = [
+    'Desktop Mini G9', 'Dock Thunderbolt Slim', 'Dock Thunderbolt G2', 'Dock Thunderbolt G4', 'Laptop 840 G10',
+    'Laptop 840 G9', 'Laptop Bag', 'Laptop Charger\xa0', 'Laptop x360 G8', 'Monitor 24”\xa0',
+    'Monitor 34” Ultrawide', 'USB DVD-RW Drive', 'Wired Headset Poly', 'Wired Keyboard', 'Wired Mouse',
+    'Wireless Headset\xa0Poly ', 'Wireless KB & Mouse',
+]
+SMALL_SITE_ITEMS = ['Laptop 840 G6', 'Monitor 24”\xa0', 'Monitor 34” Ultrawide']
+
+# Location -> (share of transaction rows, items stocked, has a Threshold column)
+LOCATION_PROFILES = {
+    '4.2': (0.35, ITEMS, True),
+    'BR': (0.25, ITEMS, True),
+    'L17': (0.10, SMALL_SITE_ITEMS, False),
+    'B4.3': (0.10, SMALL_SITE_ITEMS[:1], False),
+    'Darwin': (0.20, ITEMS, True),
+}
+
+START_TIME = datetime(2024, 1, 1, 8, 0, 0)
+SAN_SPACE = 900_000  # Six-digit SAN numbers
+SAN_STRIDE = 7919  # Coprime with SAN_SPACE, so SAN numbers never repeat
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1M' -> 1000000, '250' -> 250."""
+    text = str(text).strip()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:].lower(), 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def workbook_name(label, seed=0):
+    return f"synthetic_{label}_seed{seed}_v{GENERATOR_VERSION}.xlsx"
+
+
+class _SANPool:
+    """SANs in stock per item: new SAN numbers on add, random removal on subtract."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.issued = 0
+        self.in_stock = {}  # item -> [(san, added_at, location)]
+
+    def add(self, item, timestamp, location):
+        if self.issued >= SAN_SPACE:
+            raise ValueError("Ran out of six-digit SAN numbers")
+        san = f"SAN{100000 + (self.issued * SAN_STRIDE) % SAN_SPACE}"
+        self.issued += 1
+        self.in_stock.setdefault(item, []).append((san, timestamp, location))
+        return san
+
+    def remove(self, item):
+        stock = self.in_stock.get(item)
+        if not stock:
+            return None
+        idx = self.rng.randrange(len(stock))
+        stock[idx], stock[-1] = stock[-1], stock[idx]
+        return stock.pop()[0]
+
+
+def _timestamp_rows(rng, location, items, n_rows, sans):
+    timestamp = START_TIME
+    pending = None
+    for _ in range(n_rows):
+        timestamp += timedelta(seconds=rng.randint(5, 900))
+        text = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        item = rng.choice(items)
+        if is_san_item(item):
+            san = sans.remove(item) if rng.random() < 0.3 else None
+            if san is None:
+                row = (text, item, 'add', sans.add(item, text, location))
+            else:
+                row = (text, item, 'subtract', san)
+        else:
+            volume = rng.choice([1, 1, 1, 2, 3, 4, 5, 10, 30])
+            action = rng.choice(['add', 'add', 'subtract'])
+            row = (text, item, action if volume == 1 and rng.random() < 0.5 else f"{action} {volume}", None)
+        # A few rows land out of order, as when entries are edited by hand
+        if pending is None and rng.random() < 0.01:
+            pending = row
+            continue
+        yield row
+        if pending is not None:
+            yield pending
+            pending = None
+    if pending is not None:
+        yield pending
+
+
+def generate_workbook(path, n_rows, seed=0):
+    """
+    Write a synthetic workbook with `n_rows` transaction rows to `path`.
+    Returns a summary dict of row counts per sheet.
+    """
+    rng = random.Random(seed)
+    sans = _SANPool(rng)
+    workbook = Workbook(write_only=True)
+    summary = {}
+
+    shares = {location: profile[0] for location, profile in LOCATION_PROFILES.items()}
+    row_counts = {location: int(n_rows * share) for location, share in shares.items()}
+    row_counts['4.2'] += n_rows - sum(row_counts.values())
+
+    for location, (items_sheet, timestamps_sheet) in LOCATION_SHEETS.items():
+        _, items, has_threshold = LOCATION_PROFILES[location]
+
+        sheet = workbook.create_sheet(items_sheet)
+        sheet.append(ITEMS_HEADER if has_threshold else ITEMS_HEADER[:3])
+        for item in items:
+            new_count = rng.randint(0, 60)
+            row = [item, max(0, new_count + rng.randint(-5, 5)), new_count]
+            if has_threshold:
+                row.append(rng.choice([0, 0, 5, 10, 15, 20]))
+            sheet.append(row)
+        summary[items_sheet] = len(items)
+
+        sheet = workbook.create_sheet(timestamps_sheet)
+        sheet.append(TIMESTAMPS_HEADER)
+        for row in _timestamp_rows(rng, location, items, row_counts[location], sans):
+            sheet.append(row)
+        summary[timestamps_sheet] = row_counts[location]
+
+    # SANs still in stock; some have no Location yet, like SANs added before the column existed
+    sheet = workbook.create_sheet('All_SANs')
+    sheet.append(ALL_SANS_HEADER)
+    in_stock = sorted(((san, item, added_at, location)
+                       for item, stock in sans.in_stock.items() for san, added_at, location in stock),
+                      key=lambda entry: entry[2])
+    for san, item, added_at, location in in_stock:
+        sheet.append([san, item, added_at, None if rng.random() < 0.1 else location])
+    summary['All_SANs'] = len(in_stock)
+
+    sheet = workbook.create_sheet('SAN_Returns')
+    sheet.append(SAN_RETURNS_HEADER[:4] + [None] + SAN_RETURNS_HEADER[4:])
+    n_returns = max(1, n_rows // 100)
+    for idx in range(n_returns):
+        returned_at = START_TIME + timedelta(minutes=idx * 37)
+        sheet.append([str(100000 + rng.randrange(SAN_SPACE)), rng.choice(['G8', 'G9', 'G10', None]),
+                      f"user{rng.randrange(500)}", f"tech{rng.randrange(20)}", None,
+                      rng.choice([None, 'Screen cracked', 'Battery swollen', 'Returned on exit']),
+                      returned_at.strftime("%Y-%m-%d %H:%M:%S")])
+    summary['SAN_Returns'] = n_returns
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+    return summary
+
+
+def ensure_workbook(size, out_dir=DEFAULT_OUT_DIR, seed=0):
+    """
+    Path of the synthetic workbook for a size label such as '10k',
+    generating it first if it doesn't exist yet.
+    """
+    path = Path(out_dir) / workbook_name(size, seed)
+    if not path.exists():
+        tmp_path = path.with_name(path.stem + ".tmp.xlsx")
+        generate_workbook(tmp_path, parse_size(size), seed)
+        tmp_path.replace(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic EUC asset workbooks for benchmarking.")
+    parser.add_argument("sizes", nargs="*", default=STANDARD_SIZES,
+                        help=f"Transaction row counts, e.g. 1k 10k 100k 1M (default: {' '.join(STANDARD_SIZES)})")
+    parser.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="Directory to write workbooks to")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        path = Path(args.out_dir) / workbook_name(size, args.seed)
+        start = time.perf_counter()
+        summary = generate_workbook(path, parse_size(size), args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {parse_size(size):,} transactions, {summary['All_SANs']:,} SANs in stock, "
+              f"{path.stat().st_size / (1024 * 1024):.1f} MB in {elapsed:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
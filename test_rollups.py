@@ -0,0 +1,47 @@
+# Rollup reports: item filters match names containing the text, with LIKE's
+# wildcards in it taken literally.
+#
+# Usage:
+#   python -m pytest test_rollups.py
+
+import sqlite3
+
+import pytest
+
+from rollups import RollupStore
+
+LOCATION = '4.2'
+ITEMS = ['USB-C Cable 50%', 'USB-C Cable 50cm', 'Dock_G4', 'Dock G4', 'Adapter A\\B', 'Adapter AB', 'Wired Keyboard']
+
+
+class ListLog:
+    """A storage backend's log_since()/log_extent() over one list of rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def log_extent(self, location):
+        return len(self.rows)
+
+    def log_since(self, location, marker=0):
+        return self.rows[marker:], len(self.rows)
+
+
+@pytest.fixture
+def store():
+    store = RollupStore(sqlite3.connect(':memory:'))
+    store.catch_up(ListLog([('2025-03-03 09:00:00', item, 'add 1', None) for item in ITEMS]), [LOCATION])
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('50%', ['USB-C Cable 50%']),
+    ('_', ['Dock_G4']),
+    ('Dock_', ['Dock_G4']),
+    ('A\\B', ['Adapter A\\B']),
+    ('keyboard', ['Wired Keyboard']),
+    ('Cable', ['USB-C Cable 50%', 'USB-C Cable 50cm']),
+])
+def test_item_filter_takes_wildcards_literally(store, text, expected):
+    assert sorted(row[1] for row in store.totals(item=text)) == expected
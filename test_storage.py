@@ -0,0 +1,114 @@
+# SQLite backend: log markers across archive runs (log_since() must hand each
+# row out once, and ids must not be reused once archiving deletes rows) and
+# SAN batch checks.
+#
+# Usage:
+#   python -m pytest test_storage.py
+
+import sqlite3
+
+import pytest
+
+from inventory_core import Inventory, InventoryError, is_san_item
+from log_archive import archive_logs
+from storage import LOCATION_SHEETS, SqliteStorage, import_workbook
+from synthetic_workbook import generate_workbook
+
+EVERYTHING = '9999-12-31 00:00:00'  # An archive cutoff after every row
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    path = tmp_path_factory.mktemp('workbook') / 'synthetic.xlsx'
+    generate_workbook(path, 300)
+    return path
+
+
+@pytest.fixture
+def db_path(workbook, tmp_path):
+    path = tmp_path / 'synthetic.db'
+    import_workbook(workbook, path).close()
+    return path
+
+
+def test_log_since_after_archiving_everything(db_path):
+    storage = SqliteStorage(db_path)
+    try:
+        archive_logs(storage, EVERYTHING)
+        for location in LOCATION_SHEETS:
+            rows, marker = storage.log_since(location)
+            assert len(rows) == storage.archive.count(location)
+            # Nothing new, however often it is asked
+            assert storage.log_since(location, marker) == ([], marker)
+            assert storage.log_since(location, marker) == ([], marker)
+            assert marker <= storage.log_extent(location)
+
+        location = next(iter(LOCATION_SHEETS))
+        _, marker = storage.log_since(location)
+        item = storage.items(location)[0][0]
+        storage.log_change(location, item, 'add 1', '', '2030-01-01 09:00:00')
+        rows, marker = storage.log_since(location, marker)
+        assert rows == [('2030-01-01 09:00:00', item, 'add 1', None)]
+        assert storage.log_since(location, marker) == ([], marker)
+    finally:
+        storage.close()
+
+
+def test_rollups_unchanged_by_reopening_after_archiving_everything(db_path, caplog):
+    with Inventory.open(db_path) as inventory:
+        totals = inventory.movement_totals()
+        inventory.archive_logs(cutoff=EVERYTHING)
+    for _ in range(2):
+        with Inventory.open(db_path) as inventory:
+            assert inventory.movement_totals() == totals
+    assert "Rollups are ahead of the log" not in caplog.text
+
+
+def test_ids_not_reused_after_archiving(db_path):
+    storage = SqliteStorage(db_path)
+    try:
+        location = next(iter(LOCATION_SHEETS))
+        item = storage.items(location)[0][0]
+        storage.log_change(location, item, 'add 1', '', '2030-01-01 09:00:00')
+        last_id = storage.conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+        archive_logs(storage, EVERYTHING)
+        storage.log_change(location, item, 'add 1', '', '2030-01-02 09:00:00')
+        assert storage.conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0] > last_id
+    finally:
+        storage.close()
+
+
+def test_transactions_table_without_autoincrement_is_migrated(db_path):
+    # Rebuild the table as databases made before AUTOINCREMENT have it
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT * FROM transactions ORDER BY id").fetchall()
+    conn.executescript(
+        "DROP TABLE transactions; "
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, location TEXT NOT NULL, timestamp TEXT, item TEXT, "
+        "action TEXT, san TEXT);")
+    conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    storage = SqliteStorage(db_path)
+    try:
+        sql = storage.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'transactions'").fetchone()[0]
+        assert 'AUTOINCREMENT' in sql
+        assert storage.conn.execute("SELECT * FROM transactions ORDER BY id").fetchall() == rows
+        indexes = {name for (name,) in storage.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'transactions'")}
+        assert {'idx_transactions_location_time', 'idx_transactions_item', 'idx_transactions_san'} <= indexes
+        assert storage.log_extent(next(iter(LOCATION_SHEETS))) == rows[-1][0]
+    finally:
+        storage.close()
+
+
+def test_check_sans_flags_invalid_sans(db_path):
+    with Inventory.open(db_path) as inventory:
+        location = next(iter(LOCATION_SHEETS))
+        item = next(row[0] for row in inventory.items(location) if is_san_item(row[0]))
+        problems = inventory.check_sans(item, 'add', ['SAN1234567', 'SAN98765', 'G10-LAPTOP', '98766'])
+        assert problems == ["Not a valid SAN number", None, "Not a valid SAN number", None]
+        with pytest.raises(InventoryError, match="SAN1234567: Not a valid SAN number"):
+            inventory.commit_sans(location, item, 'add', ['SAN98765', 'SAN1234567'])
+        assert inventory.get_san('SAN98765') is None
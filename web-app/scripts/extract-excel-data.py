@@ -1,11 +1,34 @@
 # Extract EUC Perth Assets from Excel and generate TypeScript seed data.
+#
+# Usage:
+#   python extract-excel-data.py [--input EUC_Perth_Assets.xlsx] [--output src/data/seed.ts]
+#   python extract-excel-data.py --sharded [--output public/seed]   # columnar JSON shards + manifest
+#   python extract-excel-data.py --stream --stats   # read-only, flat memory, per-sheet stats
+#   python extract-excel-data.py --full             # ignore the per-sheet record cache
+#   python extract-excel-data.py --workers 4        # parse sheets on 4 processes
+#   python extract-excel-data.py --bench-workers 1,2,4 --input big.xlsx
+#   python extract-excel-data.py --verify-parsers   # check the fast parsers against the reference ones
 
+import argparse
+import hashlib
+import heapq
 import json
+import os
+import pickle
 import re
+import sys
+import tempfile
+import time
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 
-import openpyxl
+# The snapshot cache lives with the desktop app at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from inventory_core import readable_workbook_path  # noqa: E402
+from snapshot_cache import open_snapshot  # noqa: E402
 
 EXCEL_PATH = r"C:\Users\Hard-Worker\Downloads\EUC_Perth_Assets.xlsx"
 OUTPUT_PATH = Path(__file__).parent.parent / "src" / "data" / "seed.ts"
@@ -94,163 +117,631 @@ def parse_action(action_str):
 def map_location(loc_str):
     if loc_str is None:
         return 'basement-4.2'  # default
-    s = clean_str(loc_str)
+    s = fast_clean_str(loc_str)
     return LOCATION_MAP.get(s, 'basement-4.2')
 
 
-def extract_data():
-    wb = openpyxl.load_workbook(EXCEL_PATH, data_only=True)
+# --- Fast paths ---
+# clean_str(), parse_timestamp() and parse_action() above are the reference
+# implementations; the functions below return identical results faster and are
+# what the sheet parsers use. --verify-parsers compares the two on a workbook;
+# test_extract_excel_data.py on fixed edge cases.
+
+_CLEAN_STR_TRANSLATION = str.maketrans({
+    '\xa0': ' ',
+    '\ufffd': '"',
+    '\u2033': '"',
+    '\u201d': '"',
+})
+
+
+def fast_clean_str(val):
+    """clean_str() with one translate() pass and str.split() instead of a regex."""
+    if val is None:
+        return ''
+    return ' '.join(str(val).translate(_CLEAN_STR_TRANSLATION).split())
+
+
+# Action cells are a handful of distinct strings ('add 3', 'subtract 1', ...)
+parse_action_cached = lru_cache(maxsize=4096)(parse_action)
+
+
+def _fixed_width(pattern):
+    # D is any digit, H an hour 00-23 (strptime's %H range)
+    pattern = pattern.replace('HH', '(?:[01][0-9]|2[0-3])').replace('D', '[0-9]')
+    return re.compile(pattern).fullmatch
+
+
+_fromisoformat = datetime.fromisoformat
+
+
+def _checked_iso(iso):
+    # fromisoformat() range-checks every field like strptime(); the text it
+    # accepted is already what .isoformat() would print
+    _fromisoformat(iso)
+    return iso
+
+
+# Fixed-width layouts of the parse_timestamp() formats, in the same order, each
+# with a direct conversion to the ISO text. The layouts are structurally
+# distinct, so a value matching one can only be parsed by that format in the
+# reference loop; out-of-range fields raise ValueError and fall back.
+_TIMESTAMP_LAYOUTS = [
+    (_fixed_width(r'DDDD-DD-DD HH:DD:DD'),
+     lambda s: _checked_iso(s[0:10] + 'T' + s[11:19])),
+    (_fixed_width(r'DD/DD/DDDD HH:DD:DD'),
+     lambda s: _checked_iso(s[6:10] + '-' + s[3:5] + '-' + s[0:2] + 'T' + s[11:19])),
+    (_fixed_width(r'DD/DD/DDDD HH:DD'),
+     lambda s: _checked_iso(s[6:10] + '-' + s[3:5] + '-' + s[0:2] + 'T' + s[11:16] + ':00')),
+    (_fixed_width(r'DDDD-DD-DD HH:DD'),
+     lambda s: _checked_iso(s[0:10] + 'T' + s[11:16] + ':00')),
+    (_fixed_width(r'DD/DD/DDDD'),
+     lambda s: _checked_iso(s[6:10] + '-' + s[3:5] + '-' + s[0:2] + 'T00:00:00')),
+    (_fixed_width(r'DDDD-DD-DD'),
+     lambda s: _checked_iso(s[0:10] + 'T00:00:00')),
+]
+
+
+class TimestampColumn:
+    """
+    parse_timestamp() for one column. The layout is sniffed from the first
+    text value and tried directly on every later value; values in any other
+    shape (and out-of-range dates) fall back to parse_timestamp().
+    """
+
+    def __init__(self):
+        self.layout = None
+        self.fallbacks = 0
+
+    def _sniff(self, s):
+        for layout in _TIMESTAMP_LAYOUTS:
+            if layout[0](s):
+                self.layout = layout
+                return
+
+    def parse(self, val):
+        if val is None:
+            return ''
+        if isinstance(val, datetime):
+            return val.isoformat()
+        s = str(val).strip()
+        if self.layout is None:
+            self._sniff(s)
+        if self.layout is not None and self.layout[0](s):
+            try:
+                return self.layout[1](s)
+            except ValueError:
+                pass
+        self.fallbacks += 1
+        return parse_timestamp(val)
+
+    def parse_all(self, values):
+        """Bulk path over a whole column of values."""
+        parse = self.parse
+        return [parse(val) for val in values]
+
+
+VALID_GENERATIONS = ['G5', 'G6', 'G7', 'G8', 'G9', 'G10', 'G11']
+
+# Transactions held in memory per sorted run when streaming
+STREAM_RUN_SIZE = 50_000
+
+# Bump when the record parsers change their output, to invalidate cached records
+EXTRACT_CACHE_VERSION = 1
+
+
+# --- Per-sheet row parsers ---
+# Each takes an iterator of row tuples (header first) and yields records
+# without ids; ids are assigned in sheet order by the caller.
+
+def parse_items_rows(rows, location_id):
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [fast_clean_str(h).lower() for h in header]
+    has_threshold = 'threshold' in header
+
+    for row in rows:
+        if not row or not row[0]:
+            continue
+        item_name = fast_clean_str(row[0])
+        if not item_name:
+            continue
+
+        raw_threshold = to_int(row[3] if has_threshold and len(row) > 3 else None, default=0)
+        new_count = to_int(row[2] if len(row) > 2 else None)
+
+        # Smart threshold: if Excel has 0, derive from stock level
+        if raw_threshold == 0 and new_count > 0:
+            threshold = max(3, round(new_count * 0.2))
+        elif raw_threshold == 0:
+            threshold = 5  # minimal default for zero-stock items
+        else:
+            threshold = raw_threshold
+
+        yield {
+            'item': item_name,
+            'lastCount': to_int(row[1] if len(row) > 1 else None),
+            'newCount': new_count,
+            'threshold': threshold,
+            'location': location_id,
+        }
+
+
+def parse_timestamps_rows(rows, location_id):
+    rows = iter(rows)
+    next(rows, None)  # header
+    timestamps = TimestampColumn()
+    for row in rows:
+        if not row or not row[0]:
+            continue
+        timestamp = timestamps.parse(row[0])
+        item_name = fast_clean_str(row[1]) if len(row) > 1 else ''
+        action_str = fast_clean_str(row[2]) if len(row) > 2 else ''
+        san_number = fast_clean_str(row[3]) if len(row) > 3 else ''
+
+        if not item_name:
+            continue
+
+        action, volume = parse_action_cached(action_str)
+
+        txn = {
+            'timestamp': timestamp,
+            'item': item_name,
+            'action': action,
+            'volume': volume,
+            'location': location_id,
+        }
+        if san_number:
+            txn['sanNumber'] = san_number
+        yield txn
+
+
+def parse_all_sans_rows(rows):
+    rows = iter(rows)
+    next(rows, None)  # header
+    timestamps = TimestampColumn()
+    for row in rows:
+        if not row or not row[0]:
+            continue
+        san_number = fast_clean_str(row[0])
+        item = fast_clean_str(row[1]) if len(row) > 1 else ''
+        timestamp = timestamps.parse(row[2] if len(row) > 2 else None)
+        location = map_location(row[3] if len(row) > 3 else None)
+
+        if not san_number:
+            continue
+
+        yield {
+            'sanNumber': san_number,
+            'item': item,
+            'timestamp': timestamp,
+            'location': location,
+        }
+
+
+def parse_san_returns_rows(rows):
+    rows = iter(rows)
+    next(rows, None)  # header
+    timestamps = TimestampColumn()
+    for row in rows:
+        if not row or not row[0]:
+            continue
+        san = fast_clean_str(row[0])
+        gen = fast_clean_str(row[1]) if len(row) > 1 else 'G10'
+        returned_by = fast_clean_str(row[2]) if len(row) > 2 else ''
+        returned_to = fast_clean_str(row[3]) if len(row) > 3 else ''
+        # row[4] is blank column
+        notes = fast_clean_str(row[5]) if len(row) > 5 else ''
+        timestamp = timestamps.parse(row[6] if len(row) > 6 else None)
+
+        if not san:
+            continue
+
+        # Validate generation value
+        if gen not in VALID_GENERATIONS:
+            gen = 'G10'
+
+        yield {
+            'sanNumber': san,
+            'generation': gen,
+            'returnedBy': returned_by,
+            'returnedTo': returned_to,
+            'notes': notes,
+            'timestamp': timestamp,
+        }
+
+
+def with_ids(prefix, records, start=0):
+    """Prefix each record with a sequential id (make_id(prefix, start + 1), ...)."""
+    for idx, record in enumerate(records, start=start + 1):
+        yield {'id': make_id(prefix, idx), **record}
+
+
+def txn_sort_key(txn):
+    return txn.get('timestamp', '')
+
+
+# --- Stats ---
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class SheetStats:
+    """Counts rows per sheet as they are consumed and reports rows/sec and peak RSS."""
+
+    def __init__(self):
+        self.sheets = []
+
+    def track(self, sheet_name, rows):
+        start = time.perf_counter()
+        count = 0
+        for row in rows:
+            count += 1
+            yield row
+        elapsed = time.perf_counter() - start
+        self.sheets.append((sheet_name, count, elapsed, peak_rss_mb()))
+
+    def report(self):
+        print("\nPer-sheet stats:")
+        for sheet_name, count, elapsed, peak in self.sheets:
+            rate = count / elapsed if elapsed > 0 else float('inf')
+            peak_text = f"{peak:.1f} MB" if peak is not None else "n/a"
+            print(f"  {sheet_name:<20} {count:>9,} rows  {elapsed * 1000:>9.1f} ms  "
+                  f"{rate:>12,.0f} rows/s  peak RSS {peak_text}")
+
+
+def sheet_rows(wb, sheet_name, stats=None):
+    """Rows of a sheet as value tuples, or None if the sheet is missing."""
+    if sheet_name not in wb.sheetnames:
+        print(f"  Skipping missing sheet: {sheet_name}")
+        return None
+    rows = wb[sheet_name].iter_rows(min_row=1, values_only=True)
+    return stats.track(sheet_name, rows) if stats else rows
+
+
+# --- Incremental record cache ---
+
+def _update_rows_digest(hasher, rows):
+    # repr() keeps types apart (e.g. a datetime vs. the same text)
+    hasher.update("".join(f"{row!r}\n" for row in rows).encode('utf-8', 'surrogatepass'))
+
+
+class ExtractCache:
+    """
+    Parsed records per sheet, stored with the row count and a SHA-256 of the
+    rows they were parsed from. An unchanged sheet is served from the cache;
+    an append-only sheet whose previously seen rows are unchanged only has
+    its new tail parsed. Records are cached without ids, which are assigned
+    after merging, so ids match a full run.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.summary = Counter()
+
+    def _path(self, sheet_name):
+        return self.cache_dir / f"{sheet_name}.pkl"
+
+    def _load(self, sheet_name):
+        try:
+            with open(self._path(sheet_name), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return entry if entry.get('version') == EXTRACT_CACHE_VERSION else None
+
+    def _store(self, sheet_name, n_rows, digest, records):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(sheet_name)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': EXTRACT_CACHE_VERSION, 'n_rows': n_rows, 'digest': digest, 'records': records},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def records(self, sheet, parse, append_only=False, stats=None):
+        """
+        Records for a snapshot sheet. `parse(rows)` takes rows header-first.
+        """
+        def track(rows):
+            return stats.track(sheet.title, rows) if stats else rows
+
+        n_rows = sheet.max_row
+        cached = self._load(sheet.title)
+        hasher = hashlib.sha256()
+        if cached is not None and cached['n_rows'] <= n_rows:
+            _update_rows_digest(hasher, sheet.iter_rows(max_row=cached['n_rows']))
+            if hasher.hexdigest() == cached['digest']:
+                if cached['n_rows'] == n_rows:
+                    self.summary['unchanged'] += 1
+                    return cached['records']
+                if append_only and cached['n_rows'] > 0:
+                    tail_rows = list(sheet.iter_rows(min_row=cached['n_rows'] + 1))
+                    tail = list(parse(chain(sheet.iter_rows(max_row=1), track(tail_rows))))
+                    _update_rows_digest(hasher, tail_rows)
+                    records = cached['records'] + tail
+                    self._store(sheet.title, n_rows, hasher.hexdigest(), records)
+                    self.summary['tail'] += 1
+                    self.summary['tail_rows'] += len(tail_rows)
+                    return records
+            hasher = hashlib.sha256()
+
+        records = list(parse(track(sheet.iter_rows())))
+        _update_rows_digest(hasher, sheet.iter_rows())
+        self._store(sheet.title, n_rows, hasher.hexdigest(), records)
+        self.summary['parsed'] += 1
+        return records
+
+    def report(self):
+        print(f"  Record cache: {self.summary['unchanged']} sheets unchanged, "
+              f"{self.summary['tail']} appended (+{self.summary['tail_rows']} rows), "
+              f"{self.summary['parsed']} parsed in full")
+
+
+# --- In-memory extraction ---
+
+def sheet_jobs():
+    """(sheet name, kind, location id) for every sheet, in merge (id) order."""
+    jobs = [(f"{prefix}_Items", 'items', location_id) for prefix, location_id in SHEET_LOCATION_MAP.items()]
+    jobs += [(f"{prefix}_Timestamps", 'timestamps', location_id)
+             for prefix, location_id in SHEET_LOCATION_MAP.items()]
+    jobs += [('All_SANs', 'sans', None), ('SAN_Returns', 'returns', None)]
+    return jobs
+
+
+def sheet_parser(kind, location_id):
+    if kind == 'items':
+        return lambda rows: parse_items_rows(rows, location_id)
+    if kind == 'timestamps':
+        return lambda rows: parse_timestamps_rows(rows, location_id)
+    return parse_all_sans_rows if kind == 'sans' else parse_san_returns_rows
+
+
+def extract_sheet(wb, cache, sheet_name, kind, location_id, stats=None):
+    """Records of one sheet (without ids), through the record cache if given."""
+    parse = sheet_parser(kind, location_id)
+    if cache is None:
+        rows = sheet_rows(wb, sheet_name, stats)
+        return [] if rows is None else list(parse(rows))
+    if sheet_name not in wb.sheetnames:
+        print(f"  Skipping missing sheet: {sheet_name}")
+        return []
+    # *_Timestamps sheets are append-only: only new rows are parsed
+    return cache.records(wb[sheet_name], parse, append_only=kind == 'timestamps', stats=stats)
+
+
+def _extract_sheet_job(job):
+    """
+    Process-pool entry point: parse one sheet from the (already fresh)
+    snapshot. Returns (records, per-sheet stats, record cache summary).
+    """
+    excel_path, sheet_name, kind, location_id, use_cache, track_stats = job
+    wb = open_snapshot(excel_path)
+    cache = ExtractCache(wb.cache_dir / "extract") if use_cache else None
+    stats = SheetStats() if track_stats else None
+    records = extract_sheet(wb, cache, sheet_name, kind, location_id, stats)
+    return records, stats.sheets if stats else [], cache.summary if cache else Counter()
+
+
+def extract_sheets(wb, excel_path, cache, stats=None, workers=1):
+    """
+    Records of every sheet job, in sheet_jobs() order. With workers > 1 the
+    sheets are parsed on a process pool and collected back
+    in job order, so ids assigned afterwards match a serial run.
+    """
+    jobs = sheet_jobs()
+    if workers <= 1:
+        return [extract_sheet(wb, cache, *job, stats=stats) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = {}
+        # The growing *_Timestamps sheets go first so they don't end up last on a busy pool
+        for idx in sorted(range(len(jobs)), key=lambda i: jobs[i][1] != 'timestamps'):
+            job = (excel_path,) + jobs[idx] + (cache is not None, stats is not None)
+            futures[idx] = pool.submit(_extract_sheet_job, job)
+        for idx, future in futures.items():
+            records, sheet_stats, summary = future.result()
+            results[idx] = records
+            if stats is not None:
+                stats.sheets.extend(sheet_stats)
+            if cache is not None:
+                cache.summary.update(summary)
+    if stats is not None:
+        order = {job[0]: idx for idx, job in enumerate(jobs)}
+        stats.sheets.sort(key=lambda entry: order.get(entry[0], len(order)))
+    return results
+
+
+def extract_data(excel_path=None, stats=None, use_cache=True, workers=1):
+    # Served from the columnar snapshot when the workbook hasn't changed since the last run
+    excel_path = readable_workbook_path(excel_path or EXCEL_PATH)
+    wb = open_snapshot(excel_path)
+    print(f"  Workbook loaded ({wb.last_load[0]}) in {wb.last_load[1] * 1000:.1f} ms")
+    cache = ExtractCache(wb.cache_dir / "extract") if use_cache else None
 
     assets = []
     transactions = []
     san_records = []
     san_returns = []
 
-    asset_id = 0
-    txn_id = 0
-    ret_id = 0
+    for (sheet_name, kind, _), records in zip(sheet_jobs(), extract_sheets(wb, excel_path, cache, stats, workers)):
+        if kind == 'items':
+            assets.extend(with_ids('asset', records, start=len(assets)))
+        elif kind == 'timestamps':
+            transactions.extend(with_ids('txn', records, start=len(transactions)))
+        elif kind == 'sans':
+            san_records.extend(records)
+        else:
+            san_returns.extend(with_ids('ret', records))
 
-    # --- Extract Items from each location sheet ---
-    for sheet_prefix, location_id in SHEET_LOCATION_MAP.items():
-        sheet_name = f"{sheet_prefix}_Items"
-        if sheet_name not in wb.sheetnames:
-            print(f"  Skipping missing sheet: {sheet_name}")
-            continue
+    if cache is not None:
+        cache.report()
 
-        ws = wb[sheet_name]
-        rows = list(ws.iter_rows(min_row=1, values_only=True))
-        if not rows:
-            continue
+    # Sort transactions by timestamp (newest first)
+    transactions.sort(key=txn_sort_key, reverse=True)
 
-        header = [clean_str(h).lower() for h in rows[0]]
-        has_threshold = 'threshold' in header
+    return assets, san_records, san_returns, transactions
 
-        for row in rows[1:]:
-            if not row or not row[0]:
-                continue
-            item_name = clean_str(row[0])
-            if not item_name:
-                continue
 
-            raw_threshold = to_int(row[3] if has_threshold and len(row) > 3 else None, default=0)
-            new_count = to_int(row[2] if len(row) > 2 else None)
+def benchmark_workers(excel_path, worker_counts):
+    """
+    Time a full (uncached) in-memory extraction at each worker count and
+    check that every run produces the same records as the first.
+    """
+    open_snapshot(excel_path)  # Build the snapshot up front so it isn't timed
+    baseline = None
+    timings = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        result = extract_data(excel_path, use_cache=False, workers=workers)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = result
+        elif result != baseline:
+            raise RuntimeError(f"Extraction with {workers} workers differs from {worker_counts[0]} workers")
+        timings.append((workers, elapsed))
 
-            # Smart threshold: if Excel has 0, derive from stock level
-            if raw_threshold == 0 and new_count > 0:
-                threshold = max(3, round(new_count * 0.2))
-            elif raw_threshold == 0:
-                threshold = 5  # minimal default for zero-stock items
-            else:
-                threshold = raw_threshold
-
-            asset_id += 1
-            assets.append({
-                'id': make_id('asset', asset_id),
-                'item': item_name,
-                'lastCount': to_int(row[1] if len(row) > 1 else None),
-                'newCount': new_count,
-                'threshold': threshold,
-                'location': location_id,
-            })
-
-    # --- Extract Transactions from Timestamps sheets ---
+    print(f"\nFull extraction of {excel_path} ({sum(len(part) for part in baseline):,} records):")
+    for workers, elapsed in timings:
+        print(f"  {workers:>3} worker(s): {elapsed:8.2f} s  ({timings[0][1] / elapsed:.2f}x)")
+    return timings
+
+
+# --- Streaming extraction ---
+
+def _spill_run(records, run_dir, run_no):
+    """Sort a run newest-first (stable, like list.sort) and pickle it record by record."""
+    records.sort(key=txn_sort_key, reverse=True)
+    path = Path(run_dir) / f"run_{run_no:05d}.pkl"
+    with open(path, 'wb') as f:
+        for record in records:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def stream_transactions(wb, run_dir, stats=None, run_size=STREAM_RUN_SIZE):
+    """
+    Parse every *_Timestamps sheet into sorted runs on disk, then return
+    (count, iterator) over all transactions newest-first. The k-way merge is
+    stable, so the order matches extract_data()'s single sort.
+    """
+    runs = []
+    buffer = []
+    txn_count = 0
     for sheet_prefix, location_id in SHEET_LOCATION_MAP.items():
-        sheet_name = f"{sheet_prefix}_Timestamps"
-        if sheet_name not in wb.sheetnames:
-            print(f"  Skipping missing sheet: {sheet_name}")
+        rows = sheet_rows(wb, f"{sheet_prefix}_Timestamps", stats)
+        if rows is None:
             continue
+        for txn in with_ids('txn', parse_timestamps_rows(rows, location_id), start=txn_count):
+            buffer.append(txn)
+            txn_count += 1
+            if len(buffer) >= run_size:
+                runs.append(_spill_run(buffer, run_dir, len(runs)))
+                buffer = []
+    if buffer:
+        runs.append(_spill_run(buffer, run_dir, len(runs)))
+    merged = heapq.merge(*(_read_run(path) for path in runs), key=txn_sort_key, reverse=True)
+    return txn_count, merged
 
-        ws = wb[sheet_name]
-        rows = list(ws.iter_rows(min_row=1, values_only=True))
-        if len(rows) < 2:
-            continue
 
-        for row in rows[1:]:
-            if not row or not row[0]:
-                continue
-            timestamp = parse_timestamp(row[0])
-            item_name = clean_str(row[1]) if len(row) > 1 else ''
-            action_str = clean_str(row[2]) if len(row) > 2 else ''
-            san_number = clean_str(row[3]) if len(row) > 3 else ''
+def extract_stream(excel_path, output_path, stats=None, sharded=False):
+    """
+    Read the workbook in openpyxl read-only mode and write seed.ts (or, with
+    sharded, the shards) while the rows are parsed. Only one sorted run
+    of transactions is held in memory. Returns the record counts.
+    """
+    from openpyxl import load_workbook
 
-            if not item_name:
-                continue
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    counts = {}
 
-            action, volume = parse_action(action_str)
-
-            txn_id += 1
-            txn = {
-                'id': make_id('txn', txn_id),
-                'timestamp': timestamp,
-                'item': item_name,
-                'action': action,
-                'volume': volume,
-                'location': location_id,
-            }
-            if san_number:
-                txn['sanNumber'] = san_number
-            transactions.append(txn)
-
-    # --- Extract All SANs ---
-    if 'All_SANs' in wb.sheetnames:
-        ws = wb['All_SANs']
-        rows = list(ws.iter_rows(min_row=1, values_only=True))
-        for row in rows[1:]:
-            if not row or not row[0]:
-                continue
-            san_number = clean_str(row[0])
-            item = clean_str(row[1]) if len(row) > 1 else ''
-            timestamp = parse_timestamp(row[2] if len(row) > 2 else None)
-            location = map_location(row[3] if len(row) > 3 else None)
+    def counted(name, records):
+        counts[name] = 0
+        for record in records:
+            counts[name] += 1
+            yield record
 
-            if not san_number:
+    def assets():
+        asset_count = 0
+        for sheet_prefix, location_id in SHEET_LOCATION_MAP.items():
+            rows = sheet_rows(wb, f"{sheet_prefix}_Items", stats)
+            if rows is None:
                 continue
+            for asset in with_ids('asset', parse_items_rows(rows, location_id), start=asset_count):
+                asset_count += 1
+                counts.setdefault('locations', {}).setdefault(location_id, 0)
+                counts['locations'][location_id] += 1
+                yield asset
 
-            san_records.append({
-                'sanNumber': san_number,
-                'item': item,
-                'timestamp': timestamp,
-                'location': location,
-            })
-
-    # --- Extract SAN Returns ---
-    if 'SAN_Returns' in wb.sheetnames:
-        ws = wb['SAN_Returns']
-        rows = list(ws.iter_rows(min_row=1, values_only=True))
-        for row in rows[1:]:
-            if not row or not row[0]:
-                continue
-            san = clean_str(row[0])
-            gen = clean_str(row[1]) if len(row) > 1 else 'G10'
-            returned_by = clean_str(row[2]) if len(row) > 2 else ''
-            returned_to = clean_str(row[3]) if len(row) > 3 else ''
-            # row[4] is blank column
-            notes = clean_str(row[5]) if len(row) > 5 else ''
-            timestamp = parse_timestamp(row[6] if len(row) > 6 else None)
-
-            if not san:
-                continue
+    def sheet_records(sheet_name, parse, prefix=None):
+        if sheet_name not in wb.sheetnames:
+            return iter(())
+        records = parse(sheet_rows(wb, sheet_name, stats))
+        return with_ids(prefix, records) if prefix else records
+
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    try:
+        with tempfile.TemporaryDirectory(prefix='seed-runs-') as run_dir:
+            # Transactions are written last but must be sorted first
+            txn_count, transactions = stream_transactions(wb, run_dir, stats)
+            sections = [
+                ('assets', counted('assets', assets())),
+                ('sans', counted('sans', sheet_records('All_SANs', parse_all_sans_rows))),
+                ('returns', counted('returns', sheet_records('SAN_Returns', parse_san_returns_rows, 'ret'))),
+                ('transactions', counted('transactions', transactions)),
+            ]
+            if sharded:
+                write_shards(output_path, *(records for _, records in sections))
+            else:
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as out:
+                    write_typescript(out, sections)
+                os.replace(tmp_path, output_path)
+    finally:
+        wb.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return counts
 
-            # Validate generation value
-            valid_gens = ['G5', 'G6', 'G7', 'G8', 'G9', 'G10', 'G11']
-            if gen not in valid_gens:
-                gen = 'G10'
-
-            ret_id += 1
-            san_returns.append({
-                'id': make_id('ret', ret_id),
-                'sanNumber': san,
-                'generation': gen,
-                'returnedBy': returned_by,
-                'returnedTo': returned_to,
-                'notes': notes,
-                'timestamp': timestamp,
-            })
 
-    # Sort transactions by timestamp (newest first)
-    transactions.sort(key=lambda t: t.get('timestamp', ''), reverse=True)
+TS_HEADER = """import type { Asset, SANRecord, SANReturn, TransactionLog } from '@/types';
 
-    return assets, san_records, san_returns, transactions
+interface SeedData {
+  assets: Asset[];
+  sans: SANRecord[];
+  returns: SANReturn[];
+  transactions: TransactionLog[];
+}
+
+export const seedData: SeedData = """
 
 
 def generate_typescript(assets, san_records, san_returns, transactions):
@@ -265,42 +756,332 @@ def generate_typescript(assets, san_records, san_returns, transactions):
     # Pretty-print JSON for readability
     json_str = json.dumps(data, indent=2, ensure_ascii=False)
 
-    ts_content = f"""import type {{ Asset, SANRecord, SANReturn, TransactionLog }} from '@/types';
+    return f"{TS_HEADER}{json_str};\n"
 
-interface SeedData {{
-  assets: Asset[];
-  sans: SANRecord[];
-  returns: SANReturn[];
-  transactions: TransactionLog[];
-}}
 
-export const seedData: SeedData = {json_str};
-"""
-    return ts_content
+def write_typescript(out, sections):
+    """
+    Write the same module as generate_typescript() to a text file while
+    consuming (key, records iterable) sections one record at a time.
+    """
+    out.write(TS_HEADER + "{")
+    for section_no, (key, records) in enumerate(sections):
+        out.write(("," if section_no else "") + f"\n  {json.dumps(key)}: [")
+        empty = True
+        for record in records:
+            # json.dumps(indent=2) output, shifted in by the two enclosing levels
+            body = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+            out.write(("\n    " if empty else ",\n    ") + body)
+            empty = False
+        out.write("]" if empty else "\n  ]")
+    out.write("\n};\n")
 
 
-def main():
-    print("Extracting data from Excel...")
-    assets, san_records, san_returns, transactions = extract_data()
+# --- Sharded output ---
+# The default output is a directory of compact columnar JSON shards, served
+# as static files by the web app:
+#
+#   manifest.json                            # shard list, content hashes, counts
+#   assets/assets-<location>.<hash>.json     # one per location
+#   sans/sans-<location>.<hash>.json         # one per location
+#   returns/returns.<hash>.json
+#   transactions/transactions-<location>-<YYYY-MM>.<hash>.json
+#
+# A shard is {"rows": n, "fields": [...], "constant": {...}, "columns": {...}}:
+# record i is {field: columns[field][i] or constant[field]} in `fields` order,
+# with null meaning the field is absent (e.g. a transaction without a SAN).
+# File names carry the first 12 hex digits of the shard's SHA-256, so a shard
+# whose content is unchanged keeps its URL and can be cached indefinitely;
+# only manifest.json has to be re-fetched.
+
+SHARD_FORMAT_VERSION = 1
+SHARD_KINDS = ('assets', 'sans', 'returns', 'transactions')
+SHARD_PATH = Path(__file__).parent.parent / "public" / "seed"
+UNDATED_MONTH = 'undated'
+
+_MONTH_PREFIX = re.compile(r'[0-9]{4}-[0-9]{2}-')
+_SHARD_FILE = re.compile(r'.+\.[0-9a-f]{12}\.json')
+
+
+def encode_shard(records):
+    """Compact columnar JSON (UTF-8 bytes) for a list of records."""
+    fields = list(dict.fromkeys(key for record in records for key in record))
+    columns = {field: [record.get(field) for record in records] for field in fields}
+    constant = {}
+    for field, values in list(columns.items()):
+        # Hoist columns with a single value (e.g. `location` in per-location shards)
+        if values[0] is not None and values.count(values[0]) == len(values):
+            constant[field] = values[0]
+            del columns[field]
+    shard = {'rows': len(records), 'fields': fields, 'constant': constant, 'columns': columns}
+    return json.dumps(shard, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_shard(shard):
+    """Records from a parsed shard (the inverse of encode_shard)."""
+    fields, constant, columns = shard['fields'], shard['constant'], shard['columns']
+    records = []
+    for i in range(shard['rows']):
+        record = {}
+        for field in fields:
+            value = constant[field] if field in constant else columns[field][i]
+            if value is not None:
+                record[field] = value
+        records.append(record)
+    return records
+
+
+def txn_month(txn):
+    """'YYYY-MM' of a transaction, or UNDATED_MONTH if its timestamp isn't ISO text."""
+    timestamp = txn.get('timestamp', '')
+    return timestamp[:7] if _MONTH_PREFIX.match(timestamp) else UNDATED_MONTH
+
+
+def _shard_slug(text):
+    return re.sub(r'[^A-Za-z0-9.]+', '-', text).strip('-') or 'none'
+
+
+class ShardWriter:
+    """
+    Writes shards into out_dir and, on finish(), manifest.json. Shards whose
+    hashed file already exists are left untouched; files no longer listed
+    in the manifest are removed afterwards.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.shards = {}
+        self.summary = Counter()
+
+    def add(self, kind, records, location=None, month=None):
+        records = list(records)
+        if not records:
+            return
+        key = (kind, location, month)
+        if key in self.shards:
+            raise ValueError(f"Shard written twice: {key}")
+        body = encode_shard(records)
+        sha256 = hashlib.sha256(body).hexdigest()
+        name = '-'.join([kind] + [_shard_slug(part) for part in (location, month) if part is not None])
+        rel_path = f"{kind}/{name}.{sha256[:12]}.json"
+        path = self.out_dir / rel_path
+        if path.exists() and path.stat().st_size == len(body):
+            self.summary['unchanged'] += 1
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + '.tmp')
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+            self.summary['written'] += 1
+        entry = {'kind': kind}
+        if location is not None:
+            entry['location'] = location
+        if month is not None:
+            entry['month'] = month
+        entry.update({'file': rel_path, 'sha256': sha256, 'rows': len(records), 'bytes': len(body)})
+        self.shards[key] = entry
+
+    def finish(self):
+        """Write manifest.json (last, atomically), drop stale shards and return the manifest."""
+        entries = sorted(self.shards.values(),
+                         key=lambda e: (SHARD_KINDS.index(e['kind']), e.get('location', ''), e.get('month', '')))
+        counts = Counter()
+        for entry in entries:
+            counts[entry['kind']] += entry['rows']
+        manifest = {
+            'version': SHARD_FORMAT_VERSION,
+            'counts': {kind: counts[kind] for kind in SHARD_KINDS},
+            'shards': entries,
+        }
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.out_dir / 'manifest.json'
+        tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding='utf-8')
+        os.replace(tmp_path, manifest_path)
+
+        listed = {entry['file'] for entry in entries}
+        for kind in SHARD_KINDS:
+            kind_dir = self.out_dir / kind
+            if not kind_dir.is_dir():
+                continue
+            for path in kind_dir.iterdir():
+                if _SHARD_FILE.fullmatch(path.name) and f"{kind}/{path.name}" not in listed:
+                    path.unlink()
+                    self.summary['removed'] += 1
+        return manifest
+
+    def report(self):
+        total = sum(entry['bytes'] for entry in self.shards.values())
+        print(f"  Shards: {len(self.shards)} ({total / 1024:.1f} KB), {self.summary['written']} written, "
+              f"{self.summary['unchanged']} unchanged, {self.summary['removed']} stale removed")
+
+
+def write_shards(out_dir, assets, san_records, san_returns, transactions):
+    """
+    Shard the four record streams into out_dir and return the manifest.
+    `assets` must come grouped by location and `transactions` newest-first
+    (as both extraction modes produce them); then only one month of
+    transactions is held at a time.
+    """
+    writer = ShardWriter(out_dir)
 
-    print(f"  Assets: {len(assets)}")
-    print(f"  SAN Records: {len(san_records)}")
-    print(f"  SAN Returns: {len(san_returns)}")
-    print(f"  Transactions: {len(transactions)}")
+    location = None
+    group = []
+    for asset in assets:
+        if asset['location'] != location:
+            writer.add('assets', group, location=location)
+            location, group = asset['location'], []
+        group.append(asset)
+    writer.add('assets', group, location=location)
+
+    by_location = {}
+    for san in san_records:
+        by_location.setdefault(san['location'], []).append(san)
+    for location, group in by_location.items():
+        writer.add('sans', group, location=location)
+
+    writer.add('returns', san_returns)
+
+    # Newest-first text order keeps each YYYY-MM prefix contiguous
+    def flush_month(month, groups):
+        for location, group in groups.items():
+            writer.add('transactions', group, location=location, month=month)
+
+    month = None
+    month_groups = {}
+    undated = {}
+    for txn in transactions:
+        txn_key = txn_month(txn)
+        if txn_key == UNDATED_MONTH:
+            undated.setdefault(txn['location'], []).append(txn)
+            continue
+        if txn_key != month:
+            flush_month(month, month_groups)
+            month, month_groups = txn_key, {}
+        month_groups.setdefault(txn['location'], []).append(txn)
+    flush_month(month, month_groups)
+    flush_month(UNDATED_MONTH, undated)
+
+    manifest = writer.finish()
+    writer.report()
+    return manifest
+
+
+def verify_parsers(excel_path):
+    """
+    Run every cell of the workbook through the fast parsers and the reference
+    ones and report any difference. Returns the number of mismatches.
+    """
+    wb = open_snapshot(excel_path)
+    mismatches = 0
+    checked = Counter()
+
+    def compare(kind, sheet_name, value, expected, actual):
+        nonlocal mismatches
+        checked[kind] += 1
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 20:
+                print(f"  MISMATCH {kind} {sheet_name}: {value!r} -> {expected!r} (reference) vs {actual!r}")
+
+    timestamp_columns = {'All_SANs': 2, 'SAN_Returns': 6}
+    timestamp_columns.update({f"{prefix}_Timestamps": 0 for prefix in SHEET_LOCATION_MAP})
+    for sheet_name in wb.sheetnames:
+        columns = wb[sheet_name].columns
+        for column in columns:
+            for value in column[1:]:
+                compare('clean_str', sheet_name, value, clean_str(value), fast_clean_str(value))
+        ts_col = timestamp_columns.get(sheet_name)
+        if ts_col is not None and ts_col < len(columns):
+            values = columns[ts_col][1:]
+            for value, actual in zip(values, TimestampColumn().parse_all(values)):
+                compare('parse_timestamp', sheet_name, value, parse_timestamp(value), actual)
+        if sheet_name.endswith('_Timestamps') and len(columns) > 2:
+            for value in columns[2][1:]:
+                action_str = clean_str(value)
+                compare('parse_action', sheet_name, value, parse_action(action_str), parse_action_cached(action_str))
+
+    for kind, count in sorted(checked.items()):
+        print(f"  {kind}: {count:,} values checked")
+    print(f"  {mismatches} mismatches")
+    return mismatches
+
+
+def print_counts(asset_count, san_count, return_count, txn_count, loc_counts):
+    print(f"  Assets: {asset_count}")
+    print(f"  SAN Records: {san_count}")
+    print(f"  SAN Returns: {return_count}")
+    print(f"  Transactions: {txn_count}")
 
     # Show location breakdown
-    from collections import Counter
-    loc_counts = Counter(a['location'] for a in assets)
     for loc, count in sorted(loc_counts.items()):
         print(f"    {loc}: {count} items")
 
-    print(f"\nGenerating TypeScript seed data...")
-    ts_content = generate_typescript(assets, san_records, san_returns, transactions)
 
-    OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    OUTPUT_PATH.write_text(ts_content, encoding='utf-8')
-    print(f"Written to: {OUTPUT_PATH}")
-    print(f"File size: {OUTPUT_PATH.stat().st_size / 1024:.1f} KB")
+def main():
+    parser = argparse.ArgumentParser(description="Generate web-app seed data from the EUC assets workbook.")
+    parser.add_argument("--input", default=EXCEL_PATH, help="Workbook (.xlsx) or SQLite database to read")
+    parser.add_argument("--output",
+                        help=f"seed.ts to write (default {OUTPUT_PATH}), or with --sharded "
+                             f"the shard directory to write (default {SHARD_PATH})")
+    parser.add_argument("--sharded", action="store_true",
+                        help="Write columnar JSON shards and a manifest instead of the seed.ts module")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read-only streaming mode: flat memory, output written while parsing")
+    parser.add_argument("--stats", action="store_true", help="Print rows/sec and peak RSS for each sheet")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-parse every sheet instead of reusing cached records of unchanged sheets")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parse sheets on this many processes (0 = one per CPU); in-memory mode only")
+    parser.add_argument("--bench-workers", metavar="N,N,...",
+                        help="Time full extractions at each worker count (e.g. 1,2,4) and exit")
+    parser.add_argument("--verify-parsers", action="store_true",
+                        help="Compare the fast cell parsers with the reference ones on the workbook and exit")
+    args = parser.parse_args()
+    args.input = readable_workbook_path(args.input)  # A database is read through an xlsx export
+
+    if args.verify_parsers:
+        print("Verifying fast parsers against the reference implementations...")
+        sys.exit(1 if verify_parsers(args.input) else 0)
+
+    if args.bench_workers:
+        benchmark_workers(args.input, [int(n) for n in args.bench_workers.split(',')])
+        return
+
+    stats = SheetStats() if args.stats else None
+    workers = args.workers or os.cpu_count() or 1
+    output_path = Path(args.output or (SHARD_PATH if args.sharded else OUTPUT_PATH))
+
+    if args.stream:
+        print("Extracting data from Excel (streaming)...")
+        counts = extract_stream(args.input, output_path, stats, sharded=args.sharded)
+        print_counts(counts['assets'], counts['sans'], counts['returns'], counts['transactions'],
+                     counts.get('locations', {}))
+    else:
+        print("Extracting data from Excel...")
+        assets, san_records, san_returns, transactions = extract_data(
+            args.input, stats, use_cache=not args.full, workers=workers)
+
+        print_counts(len(assets), len(san_records), len(san_returns), len(transactions),
+                     Counter(a['location'] for a in assets))
+
+        if args.sharded:
+            print(f"\nWriting seed shards...")
+            write_shards(output_path, assets, san_records, san_returns, transactions)
+        else:
+            print(f"\nGenerating TypeScript seed data...")
+            ts_content = generate_typescript(assets, san_records, san_returns, transactions)
+
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_text(ts_content, encoding='utf-8')
+
+    if args.sharded:
+        print(f"Written to: {output_path / 'manifest.json'}")
+    else:
+        print(f"Written to: {output_path}")
+        print(f"File size: {output_path.stat().st_size / 1024:.1f} KB")
+    if stats:
+        stats.report()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,138 @@
+# Edge cases for the extractor's fast cell parsers: each must return what the
+# reference implementation (clean_str, parse_timestamp, parse_action) returns,
+# row for row. --verify-parsers does the same on a real workbook.
+#
+# Usage:
+#   python -m pytest web-app/scripts/test_extract_excel_data.py
+
+import importlib.util
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    'extract_excel_data', Path(__file__).with_name('extract-excel-data.py'))
+extract = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(extract)
+
+
+# --- Cell values ---
+
+CELL_STRINGS = [
+    None, '', ' ', '\t\n', 'Dell 24" Monitor', '  Dell   24\xa0Monitor  ', 'Dock\u2033', 'Cable\ufffd',
+    '\u201cQuoted\u201d', 'Line\nbreak\r\nand\ttab', 'Em\u2003space', 'Ideographic\u3000space',
+    'Separators\x1c\x1d\x1e\x1f', 'Zero\u200bwidth', 0, 12, 3.5, True, datetime(2024, 1, 5, 10, 30),
+]
+
+TIMESTAMPS = [
+    # One per supported layout
+    '2024-01-05 10:30:15', '05/01/2024 10:30:15', '05/01/2024 10:30', '2024-01-05 10:30', '05/01/2024', '2024-01-05',
+    # Cell types other than text
+    None, datetime(2024, 1, 5, 10, 30), datetime(2024, 1, 5, 10, 30, 15, 250000), date(2024, 1, 5), 45296, 45296.4375,
+    # Blank and odd text
+    '', '   ', 'N/A', 'unknown', '  2024-01-05 10:30:15  ', '2024-01-05T10:30:15', '2024-01-05 10:30:15.5',
+    '2024/01/05', '5/1/2024', '2024-1-5', '2024-01-05 7:05', '05/01/2024 7:05:00',
+    # Right shape, out of range: the fast path must fall back, not guess
+    '31/02/2024', '29/02/2023', '29/02/2024', '2024-13-01', '2024-00-10', '0000-01-01', '2024-01-05 24:00',
+    '2024-01-05 23:60', '2024-01-05 23:59:60', '2024-01-05 23:59:61', '32/01/2024 10:00',
+    # Non-ASCII digits are accepted by strptime but not by the fixed-width layouts
+    '\u0662\u0660\u0662\u0664-01-05', '\uff12\uff10\uff12\uff14-01-05',
+]
+
+ACTIONS = [
+    None, '', ' ', 'add', 'Add', 'ADD 3', 'add 3', 'add3', 'add  12', 'subtract', 'Subtract 1', 'subtract 25',
+    'sub', 'sub 2', 'SUB\xa04', 'added 5 units', 'subtracted 2', 'remove 2', 'taken 1', 'x', 'add 2.5',
+    'subtract -2', 'add -1', 'Add 3 (returned)', '3 add', '  add\n7  ', 'addsubtract 2', 'sub-total 9', 12, 0,
+]
+
+
+@pytest.mark.parametrize('value', CELL_STRINGS)
+def test_fast_clean_str_matches_reference(value):
+    assert extract.fast_clean_str(value) == extract.clean_str(value)
+
+
+@pytest.mark.parametrize('value', ACTIONS)
+def test_cached_parse_action_matches_reference(value):
+    # The row parser cleans the cell with fast_clean_str() before parsing it
+    assert extract.parse_action_cached(extract.fast_clean_str(value)) == extract.parse_action(extract.clean_str(value))
+
+
+@pytest.mark.parametrize('value', TIMESTAMPS)
+def test_timestamp_column_matches_reference_per_value(value):
+    assert extract.TimestampColumn().parse(value) == extract.parse_timestamp(value)
+
+
+# --- Timestamp columns ---
+# The layout is sniffed from the first text value, so what comes first matters
+
+def _columns():
+    text = [value for value in TIMESTAMPS if isinstance(value, str)]
+    yield 'every case', TIMESTAMPS
+    yield 'every case reversed', TIMESTAMPS[::-1]
+    yield 'blank', [None, None, '', '   ']
+    yield 'datetimes then text', [datetime(2024, 1, 5), None, '05/01/2024 10:30', '2024-01-05 10:30']
+    yield 'odd text first', ['N/A', '05/01/2024 10:30', '06/01/2024 11:45', '2024-01-07']
+    yield 'mixed layouts', ['2024-01-05 10:30:15', '05/01/2024', '2024-01-06 09:00:00', '06/01/2024 09:00',
+                            '2024-01-06', '2024-01-07 08:15:00']
+    for first in extract._TIMESTAMP_LAYOUTS:
+        # Each layout sniffed first, followed by every other case
+        sample = next(value for value in text if first[0](value))
+        yield f"sniffed {sample}", [sample] + TIMESTAMPS
+
+
+@pytest.mark.parametrize('name, values', list(_columns()), ids=[name for name, _ in _columns()])
+def test_timestamp_column_matches_reference_row_for_row(name, values):
+    expected = [extract.parse_timestamp(value) for value in values]
+    assert extract.TimestampColumn().parse_all(values) == expected
+
+
+def test_outlier_rows_fall_back_per_row():
+    column = extract.TimestampColumn()
+    values = ['05/01/2024 10:30', '06/01/2024 11:45', '31/02/2024 10:00', '2024-01-07 10:00', '5/1/2024',
+              '07/01/2024 12:00']
+    assert column.parse_all(values) == [extract.parse_timestamp(value) for value in values]
+    # Only the rows that don't fit the sniffed layout (or are out of range) went through parse_timestamp()
+    assert column.fallbacks == 3
+
+
+# --- Whole rows ---
+
+def reference_timestamps_rows(rows, location_id):
+    """parse_timestamps_rows() written with the reference parsers only."""
+    rows = iter(rows)
+    next(rows, None)
+    for row in rows:
+        if not row or not row[0]:
+            continue
+        item_name = extract.clean_str(row[1]) if len(row) > 1 else ''
+        if not item_name:
+            continue
+        action, volume = extract.parse_action(extract.clean_str(row[2]) if len(row) > 2 else '')
+        txn = {
+            'timestamp': extract.parse_timestamp(row[0]),
+            'item': item_name,
+            'action': action,
+            'volume': volume,
+            'location': location_id,
+        }
+        san_number = extract.clean_str(row[3]) if len(row) > 3 else ''
+        if san_number:
+            txn['sanNumber'] = san_number
+        yield txn
+
+
+def _timestamp_rows():
+    rows = [('Timestamp', 'Item', 'Action', 'SAN')]
+    items = [value for value in CELL_STRINGS if value]
+    for i, timestamp in enumerate(TIMESTAMPS):
+        rows.append((timestamp, items[i % len(items)], ACTIONS[i % len(ACTIONS)], f" SAN{i:05d} " if i % 3 else None))
+    # Short rows, blank items and blank rows are skipped or padded the same way
+    rows += [(), (None,), ('2024-01-05',), ('2024-01-05', '  '), ('2024-01-05', 'Mouse'),
+             ('2024-01-05', 'Mouse', 'subtract 2'), ('05/01/2024 10:30', 'Mouse', None, '\xa0')]
+    return rows
+
+
+def test_parse_timestamps_rows_matches_reference():
+    rows = _timestamp_rows()
+    assert list(extract.parse_timestamps_rows(rows, 'level-17')) == list(reference_timestamps_rows(rows, 'level-17'))
@@ -0,0 +1,360 @@
+# Append-only write-ahead journal for EUC_Perth_Assets.xlsx.
+#
+# Every mutation is applied to the in-memory workbook and appended as one JSON
+# line to "<workbook>.journal" (fsync'd), so a count change costs a few hundred
+# bytes of I/O instead of an openpyxl rewrite of the whole zip. A background
+# compactor folds the journal back into the xlsx on an interval and on exit.
+#
+# Folding never holds the lock the mutations take. The journal is renamed to
+# "<workbook>.journal.fold" under the lock (new entries start a fresh journal),
+# and the fold file is replayed onto a separate copy of the workbook loaded
+# from disk, which is saved while the live one keeps changing. Only the final
+# fold on exit saves the live workbook itself.
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from log_store import is_logged_before
+from metrics import count, timer
+
+# Custom document property recording the last journal entry folded into the xlsx.
+# Replay skips anything at or below it, so a crash between save and truncate
+# never applies an entry twice.
+JOURNAL_SEQ_PROPERTY = "JournalSeq"
+
+
+def journal_path_for(workbook_path):
+    """
+    Return the journal file that sits next to the given workbook.
+    """
+    return f"{workbook_path}.journal"
+
+
+def fold_path_for(workbook_path):
+    """
+    Return the file holding journal entries being folded into the workbook.
+    """
+    return f"{journal_path_for(workbook_path)}.fold"
+
+
+class WorkbookJournal:
+    """
+    Applies mutations to an openpyxl workbook and records them in an append-only
+    journal. Call replay() once after load_workbook() and start() to begin
+    background compaction, or pass `on_record` to be told of every new entry
+    and compact from your own writer instead.
+    """
+
+    def __init__(self, workbook, workbook_path, compact_interval=60, on_record=None):
+        self.workbook = workbook
+        self.workbook_path = str(workbook_path)
+        self.journal_path = journal_path_for(self.workbook_path)
+        self.fold_path = fold_path_for(self.workbook_path)
+        self.compact_interval = compact_interval
+        self.on_record = on_record
+        self.lock = threading.RLock()
+        self._fold_lock = threading.Lock()  # One fold at a time; never taken while holding `lock`
+        self.seq = self._saved_seq()
+        self.pending = 0
+        self._batch_depth = 0
+        self._batch_unsynced = False
+        self._next_rows = {}  # sheet -> first free row, found once with max_row (an O(n) scan)
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+
+    # --- Mutations ---
+
+    def create_sheet(self, sheet_name, header=None):
+        """
+        Create a sheet (optionally with a header row) if it does not exist yet.
+        """
+        with self.lock:
+            if sheet_name in self.workbook.sheetnames:
+                return self.workbook[sheet_name]
+            self._apply_create_sheet(sheet_name, header)
+            self._record({"op": "create_sheet", "sheet": sheet_name, "header": header})
+            return self.workbook[sheet_name]
+
+    def set_cell(self, sheet_name, row, column, value):
+        with self.lock:
+            self._write_cell(self.workbook[sheet_name], row, column, value)
+            self._record({"op": "set", "sheet": sheet_name, "row": row, "col": column, "value": value})
+
+    def append_row(self, sheet_name, values):
+        """
+        Append a row and return the row number it was written to.
+        """
+        with self.lock:
+            sheet = self.workbook[sheet_name]
+            row = self._next_row(sheet)
+            self._write_row(sheet, row, values)
+            self._record({"op": "append", "sheet": sheet_name, "row": row, "values": list(values)})
+            return row
+
+    def delete_row(self, sheet_name, row):
+        with self.lock:
+            self._delete_rows(self.workbook[sheet_name], row)
+            self._record({"op": "delete", "sheet": sheet_name, "row": row})
+
+    def trim_rows(self, sheet_name, cutoff):
+        """
+        Delete the rows of a *_Timestamps sheet logged before `cutoff`, keeping
+        the others in order. Recorded as one entry, so replay trims the saved
+        sheet the same way before re-applying the appends that follow.
+        """
+        with self.lock:
+            self._apply_trim(sheet_name, cutoff)
+            self._record({"op": "trim", "sheet": sheet_name, "before": cutoff})
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several mutations: their entries are written together with a
+        single fsync, and on_record fires once, when the outermost batch ends.
+        Holds the lock throughout so a compaction never saves half a batch.
+        """
+        with self.lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._batch_unsynced:
+                    self._batch_unsynced = False
+                    self._sync()
+
+    # --- Replay / compaction ---
+
+    def replay(self):
+        """
+        Re-apply journal entries that were not yet folded into the workbook
+        (an interrupted fold's first). Returns the number of entries applied.
+        """
+        with self.lock:
+            applied = self._replay_file(self.fold_path) + self._replay_file(self.journal_path)
+        if applied:
+            logging.info(f"Replayed {applied} journal entries from {self.journal_path}")
+        return applied
+
+    def _replay_file(self, path):
+        if not os.path.exists(path):
+            return 0
+        applied = 0
+        with open(path, "r", encoding="utf-8") as journal_file:
+            for line_no, line in enumerate(journal_file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact.
+                    logging.warning(f"Ignoring unreadable journal line {line_no} in {path}")
+                    continue
+                if entry["seq"] <= self.seq:
+                    continue
+                self._apply(entry)
+                self.seq = entry["seq"]
+                self.pending += 1
+                applied += 1
+        return applied
+
+    def compact(self):
+        """
+        Fold every journalled change into the workbook file without blocking
+        mutations: the journal is set aside under the lock, then replayed onto
+        a copy of the workbook from disk, which is saved in its place.
+        """
+        with self._fold_lock:
+            with self.lock:
+                if self.pending:
+                    folding = self.pending
+                    self._set_journal_aside()
+                elif os.path.exists(self.fold_path):
+                    folding = 0  # Left by a fold that failed; retry it
+                else:
+                    return False
+
+            from openpyxl import load_workbook  # Imported on first use: it is slow to import
+
+            with timer('journal.fold_load'):
+                workbook = load_workbook(self.workbook_path)
+            fold = WorkbookJournal(workbook, self.workbook_path, compact_interval=0)
+            fold._replay_file(self.fold_path)
+            fold._set_saved_seq(fold.seq)
+            temp_path = f"{self.workbook_path}.tmp"
+            with timer('workbook.save'):
+                workbook.save(temp_path)
+            os.replace(temp_path, self.workbook_path)
+            os.remove(self.fold_path)
+            logging.info(f"Compacted {folding} journal entries into {self.workbook_path}")
+            return True
+
+    def _set_journal_aside(self):
+        # Under the lock: move the journal's entries to the fold file, so new ones start a fresh journal
+        self._close_file()
+        if not os.path.exists(self.journal_path):
+            pass  # Everything pending was replayed from the fold file
+        elif os.path.exists(self.fold_path):
+            with open(self.journal_path, "r", encoding="utf-8") as journal_file, \
+                    open(self.fold_path, "a", encoding="utf-8") as fold_file:
+                fold_file.write(journal_file.read())
+                fold_file.flush()
+                os.fsync(fold_file.fileno())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.fold_path)
+        self.pending = 0
+
+    def _save_in_place(self):
+        """
+        Save the live workbook, which holds every journalled change, and clear
+        both journal files. Blocks mutations for the whole save.
+        """
+        with self._fold_lock, self.lock:
+            if not self.pending and not os.path.exists(self.fold_path):
+                return False
+            self._set_saved_seq(self.seq)
+            with timer('workbook.save'):
+                self.workbook.save(self.workbook_path)
+            self._close_file()
+            with open(self.journal_path, "w", encoding="utf-8") as journal_file:
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            if os.path.exists(self.fold_path):
+                os.remove(self.fold_path)
+            logging.info(f"Compacted {self.pending} journal entries into {self.workbook_path}")
+            self.pending = 0
+            return True
+
+    def start(self):
+        """
+        Start the background compactor thread.
+        """
+        if self._thread is None and self.compact_interval:
+            self._thread = threading.Thread(target=self._run, name="journal-compactor", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """
+        Stop the compactor and fold any outstanding entries into the workbook.
+        Nothing changes it any more, so the live workbook is saved directly.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self._save_in_place()
+        finally:
+            self._close_file()
+
+    # --- Internals ---
+
+    def _run(self):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                # Leave the journal in place; the next interval (or exit) retries.
+                logging.error(f"Journal compaction failed: {e}")
+
+    def _record(self, entry):
+        self.seq += 1
+        entry["seq"] = self.seq
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self.pending += 1
+        count('journal.records')
+        if self._batch_depth:
+            self._batch_unsynced = True
+        else:
+            self._sync()
+
+    def _sync(self):
+        with timer('journal.fsync'):
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        if self.on_record is not None:
+            self.on_record()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _apply(self, entry):
+        op = entry["op"]
+        if op == "create_sheet":
+            if entry["sheet"] not in self.workbook.sheetnames:
+                self._apply_create_sheet(entry["sheet"], entry.get("header"))
+        elif op == "set":
+            self._write_cell(self.workbook[entry["sheet"]], entry["row"], entry["col"], entry["value"])
+        elif op == "append":
+            self._write_row(self.workbook[entry["sheet"]], entry["row"], entry["values"])
+        elif op == "delete":
+            self._delete_rows(self.workbook[entry["sheet"]], entry["row"])
+        elif op == "trim":
+            self._apply_trim(entry["sheet"], entry["before"])
+        else:
+            logging.warning(f"Unknown journal operation '{op}' (seq {entry.get('seq')})")
+
+    def _apply_trim(self, sheet_name, cutoff):
+        sheet = self.workbook[sheet_name]
+        kept = [row for row in sheet.iter_rows(min_row=2, values_only=True)
+                if any(value is not None for value in row) and not is_logged_before(row[0], cutoff)]
+        self._delete_rows(sheet, 2, sheet.max_row)
+        for row_number, row in enumerate(kept, start=2):
+            self._write_row(sheet, row_number, row)
+
+    def _apply_create_sheet(self, sheet_name, header):
+        sheet = self.workbook.create_sheet(sheet_name)
+        if header:
+            self._write_row(sheet, 1, header)
+
+    # Rows are written cell by cell at explicit row numbers (never with
+    # Worksheet.append(), whose cursor delete_rows() doesn't move back), so
+    # the row an append went to is known without openpyxl internals.
+
+    def _next_row(self, sheet):
+        row = self._next_rows.get(sheet.title)
+        if row is None:
+            # max_row is 1 for an empty sheet; only a header-less empty sheet starts at row 1
+            first_row = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            row = sheet.max_row + 1 if sheet.max_row > 1 or any(value is not None for value in first_row) else 1
+            self._next_rows[sheet.title] = row
+        return row
+
+    def _write_cell(self, sheet, row, column, value):
+        sheet.cell(row=row, column=column, value=value)
+        if sheet.title in self._next_rows and row >= self._next_rows[sheet.title]:
+            self._next_rows[sheet.title] = row + 1
+
+    def _write_row(self, sheet, row, values):
+        for column, value in enumerate(values, start=1):
+            sheet.cell(row=row, column=column, value=value)
+        if sheet.title in self._next_rows and row >= self._next_rows[sheet.title]:
+            self._next_rows[sheet.title] = row + 1
+
+    def _delete_rows(self, sheet, row, amount=1):
+        sheet.delete_rows(row, amount)
+        self._next_rows.pop(sheet.title, None)  # Found again from max_row on the next append
+
+    def _saved_seq(self):
+        try:
+            return int(self.workbook.custom_doc_props[JOURNAL_SEQ_PROPERTY].value)
+        except KeyError:
+            return 0
+
+    def _set_saved_seq(self, seq):
+        from openpyxl.packaging.custom import IntProperty
+
+        props = self.workbook.custom_doc_props
+        if JOURNAL_SEQ_PROPERTY in props.names:
+            del props[JOURNAL_SEQ_PROPERTY]
+        props.append(IntProperty(name=JOURNAL_SEQ_PROPERTY, value=seq))